@@ -0,0 +1 @@
+"""Offline benchmarks for the FinOps pages and the chat pipeline."""
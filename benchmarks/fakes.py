@@ -0,0 +1,280 @@
+"""Local stand-ins for AWS and OpenAI so the benchmarks run offline.
+
+``FakeAWS`` answers the boto3 calls the pages make (STS, Cost Explorer, RDS,
+CloudWatch, SES and resource tagging) for a synthetic account of a chosen size. Responses are
+deterministic and paginated the way the real services paginate them, and an
+optional per-call latency stands in for the network round trip. Patch it in
+with ``mock.patch("boto3.session.Session", FakeAWS(...).session)``, which is
+what ``finops.aws_clients`` creates its clients from.
+"""
+import random
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+
+ACCOUNT_ID = "123456789012"
+CE_SERVICES = {
+    "AmazonEC2": "Amazon Elastic Compute Cloud - Compute",
+    "AmazonRDS": "Amazon Relational Database Service",
+}
+# The first types are in the bundled offer fixture, so some rows get reserved prices
+KNOWN_TYPES = ["db.r5.large", "db.r5.2xlarge", "m5.large", "m5.xlarge"]
+FAMILIES = ["m5", "m6i", "c5", "c6g", "r5", "r6g", "t3", "x2idn"]
+SIZES = ["large", "xlarge", "2xlarge", "4xlarge", "8xlarge", "12xlarge", "16xlarge", "24xlarge"]
+
+
+def instance_types(count):
+    """Return ``count`` distinct RDS and EC2 instance types, known ones first"""
+    types = list(KNOWN_TYPES)
+    seen = set(types)
+    generation = 0
+    while len(types) < count:
+        for family in FAMILIES:
+            for size in SIZES:
+                name = f"{family}.{size}" if not generation else f"{family}-{generation}.{size}"
+                for candidate in (name, f"db.{name}"):
+                    if candidate not in seen:
+                        seen.add(candidate)
+                        types.append(candidate)
+        generation += 1
+    return types[:count]
+
+
+class FakeAccount:
+    """Synthetic account contents, generated once and shared by every client"""
+
+    def __init__(self, db_instances=100, instance_types_count=20, idle_every=5, seed=0):
+        rng = random.Random(seed)
+        self.account_id = ACCOUNT_ID
+        self.db_instances = [
+            {
+                "DBInstanceIdentifier": f"db-{i:06d}",
+                "DBInstanceArn": f"arn:aws:rds:eu-west-2:{ACCOUNT_ID}:db:db-{i:06d}",
+                "DBInstanceClass": "db.r5.large",
+                "MasterUsername": f"user{i % 97}",
+                "TagList": [{"Key": "CreatorEmail", "Value": f"owner{i % 97}@example.com"}],
+            }
+            for i in range(db_instances)
+        ]
+        self.by_id = {instance["DBInstanceIdentifier"]: instance for instance in self.db_instances}
+        self.templates = {}  # SES templates by name
+        # Every ``idle_every``th instance has had no connections
+        self.idle = {
+            instance["DBInstanceIdentifier"]
+            for i, instance in enumerate(self.db_instances)
+            if idle_every and i % idle_every == 0
+        }
+        self.instance_types = [
+            (CE_SERVICES["AmazonRDS"] if name.startswith("db.") else CE_SERVICES["AmazonEC2"],
+             name, rng.uniform(1, 500))
+            for name in instance_types(instance_types_count)
+        ]
+
+
+class _Paginator:
+    def __init__(self, method):
+        self.method = method
+
+    def paginate(self, **kwargs):
+        marker = None
+        while True:
+            page = self.method(**kwargs, **({"Marker": marker} if marker else {}))
+            yield page
+            marker = page.get("Marker")
+            if not marker:
+                return
+
+
+class _Events:
+    # Event hooks registered on the fakes (e.g. by tracing) are never fired
+    def register(self, *args, **kwargs):
+        pass
+
+
+class _FakeClient:
+    def __init__(self, aws, account):
+        self._aws = aws
+        self._account = account
+        self.meta = SimpleNamespace(events=_Events())
+
+    def _call(self):
+        self._aws.record_call(type(self).__name__)
+
+
+class FakeSTS(_FakeClient):
+    def get_caller_identity(self):
+        self._call()
+        return {"Account": self._account.account_id}
+
+    def assume_role(self, RoleArn, RoleSessionName, DurationSeconds=3600):
+        self._call()
+        account_id = RoleArn.split(":")[4]
+        return {"Credentials": {
+            "AccessKeyId": f"ASIA{account_id}",
+            "SecretAccessKey": "fake-secret",
+            "SessionToken": f"fake-token-{account_id}",
+        }}
+
+
+class FakeCostExplorer(_FakeClient):
+    PAGE_SIZE = 5000  # groups per page, so larger accounts need NextPageToken
+
+    def get_cost_and_usage(self, TimePeriod, Granularity, Metrics, GroupBy=None, Filter=None, NextPageToken=None):
+        self._call()
+        start = date.fromisoformat(TimePeriod["Start"])
+        end = date.fromisoformat(TimePeriod["End"])
+        metric = Metrics[0]
+        types = self._account.instance_types
+        days = (end - start).days
+        offset = int(NextPageToken or 0)
+        stop = min(offset + self.PAGE_SIZE, days * len(types))
+
+        results = {}
+        for position in range(offset, stop):
+            day_index, type_index = divmod(position, len(types))
+            service, instance_type, daily_cost = types[type_index]
+            day = start + timedelta(days=day_index)
+            # A little day-to-day variation, the same on every call
+            amount = daily_cost * (0.8 + 0.4 * ((day.toordinal() * 31 + type_index) % 97) / 97)
+            result = results.setdefault(day, {
+                "TimePeriod": {"Start": day.isoformat(), "End": (day + timedelta(days=1)).isoformat()},
+                "Groups": [],
+            })
+            result["Groups"].append({
+                "Keys": [service, instance_type],
+                "Metrics": {metric: {"Amount": f"{amount:.6f}", "Unit": "USD"}},
+            })
+        response = {"ResultsByTime": list(results.values())}
+        if stop < days * len(types):
+            response["NextPageToken"] = str(stop)
+        return response
+
+
+class FakeRDS(_FakeClient):
+    MAX_RECORDS = 100
+
+    def get_paginator(self, operation_name):
+        return _Paginator(getattr(self, operation_name))
+
+    def describe_db_instances(self, Marker=None, MaxRecords=MAX_RECORDS):
+        self._call()
+        offset = int(Marker or 0)
+        page = self._account.db_instances[offset:offset + MaxRecords]
+        response = {"DBInstances": page}
+        if offset + MaxRecords < len(self._account.db_instances):
+            response["Marker"] = str(offset + MaxRecords)
+        return response
+
+    def list_tags_for_resource(self, ResourceName):
+        self._call()
+        db_instance_id = ResourceName.rsplit(":", 1)[-1]
+        instance = self._account.by_id.get(db_instance_id)
+        return {"TagList": instance["TagList"] if instance else []}
+
+    def add_tags_to_resource(self, ResourceName, Tags):
+        self._call()
+        return {}
+
+
+class FakeCloudWatch(_FakeClient):
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, NextToken=None):
+        self._call()
+        days = max(1, (EndTime - StartTime).days)
+        results = []
+        for query in MetricDataQueries:
+            instance_id = query["MetricStat"]["Metric"]["Dimensions"][0]["Value"]
+            value = 0.0 if instance_id in self._account.idle else float(zlib.crc32(instance_id.encode()) % 50 + 1)
+            results.append({"Id": query["Id"], "StatusCode": "Complete", "Values": [value] * days})
+        return {"MetricDataResults": results}
+
+
+class FakeTagging(_FakeClient):
+    def tag_resources(self, ResourceARNList, Tags):
+        self._call()
+        if len(ResourceARNList) > 20:
+            raise ValueError("TagResources takes at most 20 ARNs")
+        for arn in ResourceARNList:
+            instance = self._account.by_id.get(arn.rsplit(":", 1)[-1])
+            if instance is not None:
+                tags = {tag["Key"]: tag["Value"] for tag in instance["TagList"]}
+                tags.update(Tags)
+                instance["TagList"] = [{"Key": key, "Value": value} for key, value in tags.items()]
+        return {"FailedResourcesMap": {}}
+
+
+class FakeSES(_FakeClient):
+    MAX_SEND_RATE = 14.0  # the default SES production quota
+
+    def send_email(self, Source, Destination, Message):
+        self._call()
+        return {"MessageId": f"fake-{zlib.crc32(repr(Destination).encode()):08x}"}
+
+    def get_send_quota(self):
+        self._call()
+        return {"Max24HourSend": 50000.0, "MaxSendRate": self.MAX_SEND_RATE, "SentLast24Hours": 0.0}
+
+    def get_template(self, TemplateName):
+        self._call()
+        if TemplateName not in self._account.templates:
+            raise ClientError(
+                {"Error": {"Code": "TemplateDoesNotExist", "Message": TemplateName}}, "GetTemplate"
+            )
+        return {"Template": self._account.templates[TemplateName]}
+
+    def create_template(self, Template):
+        self._call()
+        self._account.templates[Template["TemplateName"]] = dict(Template)
+        return {}
+
+    update_template = create_template
+
+    def send_bulk_templated_email(self, Source, Template, DefaultTemplateData, Destinations):
+        self._call()
+        if len(Destinations) > 50:
+            raise ValueError("SendBulkTemplatedEmail takes at most 50 destinations")
+        return {"Status": [
+            {"Status": "Success", "MessageId": f"fake-{zlib.crc32(repr(destination).encode()):08x}"}
+            for destination in Destinations
+        ]}
+
+
+class FakeAWS:
+    """boto3 Session replacement serving one synthetic account.
+
+    ``latency`` seconds are slept on every call, like a network round trip.
+    ``calls`` counts the calls made per client, which is handy for checking
+    that caches and batching actually avoid requests.
+    """
+
+    CLIENTS = {
+        "sts": FakeSTS,
+        "ce": FakeCostExplorer,
+        "rds": FakeRDS,
+        "cloudwatch": FakeCloudWatch,
+        "ses": FakeSES,
+        "resourcegroupstaggingapi": FakeTagging,
+    }
+
+    def __init__(self, account, latency=0.0):
+        self.account = account
+        self.latency = latency
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def session(self, *args, **kwargs):
+        return self
+
+    def client(self, service_name, *args, **kwargs):
+        if service_name not in self.CLIENTS:
+            raise ValueError(f"No fake client for '{service_name}'")
+        return self.CLIENTS[service_name](self, self.account)
+
+    def record_call(self, client_name):
+        with self._lock:
+            self.calls[client_name] = self.calls.get(client_name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
@@ -0,0 +1,612 @@
+"""Offline benchmark suite for the pages and the chat pipeline.
+
+Every benchmark runs against ``FakeAWS`` and a fake LLM and embedder, at a
+few data volumes, and the timings are written to a JSON file:
+
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes small medium --output storage/benchmarks/latest.json
+    python -m benchmarks.run --baseline storage/benchmarks/baseline.json
+
+With ``--baseline`` the run exits non-zero when a benchmark got more than
+``--tolerance`` slower than in the baseline file. The suite works in a
+temporary directory, so the real ``storage/`` is never read or written.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import runpy
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from benchmarks.fakes import FakeAccount, FakeAWS, instance_types
+from finops.aws_clients import clear_clients
+from finops.embeddings import get_embed_model
+from finops.startup import PAGES, page_imports
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT_PATH = "storage/benchmarks/results.json"
+DEFAULT_TOLERANCE = 0.25
+MIN_REGRESSION = 0.01  # seconds; smaller differences are noise
+
+Size = namedtuple(
+    "Size", ["db_instances", "instance_types", "documents", "usage_hours", "usage_types", "vectors", "cost_series"],
+)
+
+SIZES = {
+    "small": Size(db_instances=200, instance_types=20, documents=10, usage_hours=744, usage_types=10,
+                  vectors=5000, cost_series=2000),
+    "medium": Size(db_instances=2000, instance_types=200, documents=100, usage_hours=8760, usage_types=200,
+                   vectors=20000, cost_series=20000),
+    "large": Size(db_instances=10000, instance_types=1000, documents=400, usage_hours=8760, usage_types=2000,
+                  vectors=50000, cost_series=50000),
+}
+VECTOR_DIM = 384  # bge-small-en-v1.5
+
+QUESTIONS = [
+    "What is FinOps?",
+    "How should reserved instance commitments be sized?",
+    "Which persona owns cloud cost allocation?",
+    "How do we report unit economics to the business?",
+]
+# One conversation: standalone questions mixed with follow-ups that need condensing
+CONVERSATION = [
+    "Which teams take part in cloud cost governance?",
+    "What does each of them own?",
+    "How are savings plan commitments tracked against budget?",
+    "Why does that matter?",
+    "What tagging policy supports showback and chargeback?",
+    "And how is it enforced?",
+    "Which anomaly detection thresholds suit engineering teams?",
+    "How often should rightsizing recommendations be reviewed?",
+]
+VOCABULARY = (
+    "cloud cost allocation tagging showback chargeback forecast budget commitment reservation "
+    "savings plan rightsizing utilisation anomaly unit economics engineering finance procurement "
+    "executive persona accountability optimisation rate usage spend variance team product"
+).split()
+
+
+def _timings(fn, repeat=1, setup=None):
+    """Run ``fn`` ``repeat`` times and return the wall-clock seconds of each run"""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _record(results, benchmark, size, timings, **details):
+    result = {
+        "benchmark": benchmark,
+        "size": size,
+        "seconds": statistics.median(timings),
+        "min_seconds": min(timings),
+        "repeat": len(timings),
+    }
+    result.update(details)
+    results.append(result)
+    print(f"{size or '-':<8} {benchmark:<40} {result['seconds'] * 1000:10.1f} ms")
+
+
+def _load_page(path, aws):
+    """Execute a page outside a Streamlit session and return its namespace.
+
+    The widgets are inert there, so this only defines the page's functions
+    (and creates its AWS clients from ``aws``).
+    """
+    try:
+        with mock.patch("boto3.session.Session", aws.session):
+            return runpy.run_path(os.path.join(REPO_ROOT, path), run_name="__page__")
+    finally:
+        # Without a session ``st.form`` marks the main container itself as the
+        # form, which would put the AppTest runs that follow inside it
+        st._main._form_data = None
+
+
+def bench_cold_start(results, repeat):
+    """Time each page's imports in a fresh interpreter"""
+    for page in PAGES:
+        script = (
+            "import time\n_start = time.perf_counter()\n"
+            + page_imports(page)
+            + "\nprint(time.perf_counter() - _start)\n"
+        )
+        name = f"cold_start.{os.path.splitext(os.path.basename(page))[0]}"
+        timings = []
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, "-c", script], cwd=REPO_ROOT, capture_output=True, text=True,
+            )
+            if output.returncode:
+                error = output.stderr.strip().splitlines()[-1]
+                print(f"{'-':<8} {name:<40} skipped: {error}")
+                break
+            timings.append(float(output.stdout.strip().splitlines()[-1]))
+        else:
+            _record(results, name, None, timings)
+
+
+def write_corpus(data_dir, documents, words_per_document=2000, seed=0):
+    """Fill ``data_dir`` with the bundled personas file plus synthetic documents"""
+    rng = np.random.default_rng(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    shutil.copy(os.path.join(REPO_ROOT, "pages", "data", "personas.txt"), data_dir)
+    for i in range(documents):
+        words = rng.choice(VOCABULARY, words_per_document)
+        sentences = [" ".join(words[j:j + 12]).capitalize() + "." for j in range(0, len(words), 12)]
+        paragraphs = ["\n".join(sentences[j:j + 8]) for j in range(0, len(sentences), 8)]
+        with open(os.path.join(data_dir, f"doc_{i:04d}.txt"), "w") as f:
+            f.write("\n\n".join(paragraphs))
+
+
+def _run_app(app):
+    app.run()
+    if app.exception:
+        raise RuntimeError(f"streamlit_app.py failed: {app.exception[0].value}")
+    return app
+
+
+def bench_chat(results, size_name, size, repeat):
+    """Index build, reload, retrieval and answer latency of streamlit_app.py"""
+    import streamlit as st
+    from llama_index.core import Settings
+    from llama_index.core.llms import MockLLM
+    from llama_index.core.schema import MetadataMode
+    from streamlit.testing.v1 import AppTest
+
+    from finops.index_store import load_or_build_index
+    from finops.llm_tracing import count_tokens
+    from finops.retrieval import HybridRetriever, TokenBudget, load_or_build_keyword_index
+    from finops.tracing import tracer
+
+    write_corpus("pages/data", size.documents)
+    app_path = os.path.join(REPO_ROOT, "streamlit_app.py")
+
+    def new_session():
+        return AppTest.from_file(app_path, default_timeout=600)
+
+    Settings.embed_model = get_embed_model("hash")
+    with mock.patch("llama_index.llms.openai.OpenAI", lambda **kwargs: MockLLM(max_tokens=256)):
+        # First run parses, chunks and embeds the whole corpus
+        st.cache_resource.clear()
+        _record(results, "chat.load_data_cold", size_name,
+                _timings(lambda: _run_app(new_session())), documents=size.documents + 1)
+        # Later processes load the persisted index and find nothing changed
+        _record(results, "chat.load_data_warm", size_name,
+                _timings(lambda: _run_app(new_session()), repeat, setup=st.cache_resource.clear))
+
+        index = load_or_build_index("pages/data")
+        budget = TokenBudget()
+        retrievers = {
+            "chat.retrieval_dense": (index.as_retriever(), lambda nodes, question: nodes),
+            "chat.retrieval": (HybridRetriever(index, load_or_build_keyword_index(index)),
+                               lambda nodes, question: budget.postprocess_nodes(nodes, query_str=question)),
+        }
+        for name, (retriever, pack) in retrievers.items():
+            contexts = []
+
+            def retrieve_all():
+                contexts[:] = [pack(retriever.retrieve(q), q) for q in QUESTIONS]
+
+            _record(results, name, size_name, _timings(retrieve_all, repeat), questions=len(QUESTIONS),
+                    context_tokens=statistics.mean(
+                        sum(count_tokens(n.node.get_content(metadata_mode=MetadataMode.LLM)) for n in nodes) for nodes in contexts
+                    ))
+
+        def ask(question):
+            app = _run_app(new_session())
+            app.chat_input[0].set_value(question)
+            start = time.perf_counter()
+            _run_app(app)
+            return time.perf_counter() - start
+
+        def prompt_tokens():
+            return tracer.counters.get("llm.prompt_tokens", 0)
+
+        _run_app(new_session())  # load the index before timing answers
+        before = prompt_tokens()
+        _record(results, "chat.response", size_name, [ask(q) for q in QUESTIONS],
+                prompt_tokens=(prompt_tokens() - before) / len(QUESTIONS))
+        # The same questions again are served from the semantic answer cache
+        _record(results, "chat.cached_response", size_name, [ask(q) for q in QUESTIONS])
+
+        # A longer conversation in one session; standalone turns skip the condense call
+        app = _run_app(new_session())
+        turns = []
+        skipped = tracer.counters.get("chat.condense_skipped", 0)
+        before = prompt_tokens()
+        for question in CONVERSATION:
+            app.chat_input[0].set_value(question)
+            start = time.perf_counter()
+            _run_app(app)
+            turns.append(time.perf_counter() - start)
+        _record(results, "chat.conversation_turn", size_name, turns,
+                condense_skipped=tracer.counters.get("chat.condense_skipped", 0) - skipped,
+                prompt_tokens=(prompt_tokens() - before) / len(CONVERSATION))
+
+
+def bench_ingest(results, size_name, size, repeat, persist_dir="storage/bench_index"):
+    """Full index build from the embedding cache, and an update after one file changed"""
+    from finops.index_store import INGEST_WORKERS, load_or_build_index
+
+    path = "pages/data/doc_0000.txt"
+    with open(path) as f:
+        original = f.read()
+
+    def change_one_file():
+        with open(path, "w") as f:
+            f.write(original + f"\nRevised {time.perf_counter()}.")
+
+    _record(results, "index.build", size_name,
+            _timings(lambda: load_or_build_index("pages/data", persist_dir), repeat,
+                     setup=lambda: shutil.rmtree(persist_dir, ignore_errors=True)),
+            documents=size.documents + 1, workers=INGEST_WORKERS)
+    _record(results, "index.update_one_file", size_name,
+            _timings(lambda: load_or_build_index("pages/data", persist_dir), repeat, setup=change_one_file),
+            documents=size.documents + 1)
+
+
+def synthetic_embeddings(count, dim=VECTOR_DIM, clusters=100, seed=0):
+    """Unit vectors scattered around ``clusters`` topics, like embeddings of a real corpus"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = centres[rng.integers(0, clusters, count)] + 0.7 * rng.standard_normal((count, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def bench_vectors(results, size_name, size, repeat, queries=20, top_k=10, seed=0):
+    """Memory, top-k query time and recall of the vector stores"""
+    from llama_index.core.schema import TextNode
+    from llama_index.core.vector_stores import SimpleVectorStore, VectorStoreQuery
+
+    from finops.vector_store import FaissVectorStore, QuantizedVectorStore
+
+    rng = np.random.default_rng(seed)
+    vectors = synthetic_embeddings(size.vectors, seed=seed)
+    questions = vectors[rng.integers(0, size.vectors, queries)]
+    questions = questions + 0.1 * rng.standard_normal(questions.shape, dtype=np.float32)
+    exact = [set(np.argsort(-(vectors @ question))[:top_k]) for question in questions]
+    stores = {
+        "float32": SimpleVectorStore,
+        "float16": lambda: QuantizedVectorStore(dtype="float16"),
+        "int8": lambda: QuantizedVectorStore(dtype="int8"),
+        "faiss_hnsw": lambda: FaissVectorStore(kind="hnsw"),
+        "faiss_hnsw_int8": lambda: FaissVectorStore(kind="hnsw", dtype="int8"),
+        "faiss_ivf": lambda: FaissVectorStore(kind="ivf"),
+    }
+    for name, new_store in stores.items():
+        tracemalloc.start()
+        start = time.perf_counter()
+        store = new_store()
+        store.add([
+            TextNode(id_=str(i), text="", embedding=vector.tolist()) for i, vector in enumerate(vectors)
+        ])
+        build_seconds = time.perf_counter() - start
+        gc.collect()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        if isinstance(store, FaissVectorStore):
+            memory += store.nbytes  # allocated by FAISS, where tracemalloc can't see it
+        found = []
+
+        def query_all():
+            found[:] = [
+                store.query(VectorStoreQuery(query_embedding=question.tolist(), similarity_top_k=top_k)).ids
+                for question in questions
+            ]
+
+        timings = _timings(query_all, repeat)
+        recall = statistics.mean(
+            len(expected & {int(node_id) for node_id in ids}) / top_k for expected, ids in zip(exact, found)
+        )
+        _record(results, f"vectors.query_{name}", size_name, timings, vectors=size.vectors, queries=queries,
+                megabytes=memory / 2**20, build_seconds=build_seconds, recall=recall)
+        del store
+
+
+def bench_rds(results, size_name, size, aws, repeat, root="storage/bench_snapshots"):
+    """The rds_inactive job over the whole fake account, and the RDS page reading its snapshot"""
+    from finops import snapshots
+    from finops.jobs import run_job
+
+    settings = {"AWS_ACCESS_KEY_ID": "benchmark-key", "AWS_SECRET_ACCESS_KEY": "benchmark-secret",
+                "REGION_NAME": "eu-west-2"}
+    # The fan-out creates its clients per target as it runs
+    with mock.patch("boto3.session.Session", aws.session):
+        _record(results, "rds.scan_job", size_name, _timings(lambda: run_job("rds_inactive", settings, root), repeat),
+                db_instances=size.db_instances, inactive=len(snapshots.latest_snapshot("rds_inactive", root).data))
+    _record(results, "rds.latest_snapshot", size_name,
+            _timings(lambda: snapshots.latest_snapshot("rds_inactive", root), repeat, setup=snapshots._cache.clear),
+            db_instances=size.db_instances)
+
+
+def bench_actions(results, size_name, size, aws, repeat, root="storage/bench_snapshots"):
+    """Tagging every idle instance from the latest scan and notifying their owners"""
+    from finops import snapshots
+    from finops.actions import TokenBucket, send_notifications, tag_resources
+    from finops.aws_clients import get_client
+    from finops.fanout import FanOut
+
+    instances = snapshots.latest_snapshot("rds_inactive", root).data
+    fanout = FanOut({"aws_access_key_id": "benchmark-key", "aws_secret_access_key": "benchmark-secret"})
+    with mock.patch("boto3.session.Session", aws.session):
+        ses_client = get_client("ses", "benchmark-key", "benchmark-secret", "eu-west-2")
+        calls = dict(aws.calls)
+        _record(results, "rds.tag_for_deletion", size_name, _timings(lambda: tag_resources(fanout, instances), repeat),
+                instances=len(instances),
+                calls=(aws.calls.get("FakeTagging", 0) - calls.get("FakeTagging", 0)) / repeat)
+        # An unlimited quota, so this times the pipeline rather than the SES send rate
+        bucket = TokenBucket(1e6, 50)
+        _record(results, "rds.notify_owners", size_name,
+                _timings(lambda: send_notifications(ses_client, instances, "finops@example.com", bucket), repeat),
+                instances=len(instances), owners=instances["Creator Email"].nunique())
+
+
+def bench_fanout(results, size_name, size, aws, repeat, accounts=3, regions=5):
+    """The RDS scan fanned out over several accounts and regions at once"""
+    from finops.fanout import FanOut, inactive_rds_instances, merge_results
+
+    fanout = FanOut({"aws_access_key_id": "benchmark-key", "aws_secret_access_key": "benchmark-secret"},
+                    role_name="FinOpsReadOnly")
+    targets = fanout.targets([f"{i:012d}" for i in range(accounts)], [f"region-{i}" for i in range(regions)])
+
+    def scan():
+        for _ in merge_results(fanout.run(targets, inactive_rds_instances, services=("rds", "cloudwatch"))):
+            pass
+
+    with mock.patch("boto3.session.Session", aws.session):
+        _record(results, "fanout.inactive_rds_instances", size_name, _timings(scan, repeat),
+                db_instances=size.db_instances, targets=len(targets))
+
+
+def bench_top_instances(results, size_name, size, aws, repeat):
+    """get_top_rds_ec2_costs from an empty warehouse, a synced one and the memory cache"""
+    from finops import aws_clients, cost_queries, warehouse
+
+    def query():
+        top, error = cost_queries.get_top_rds_ec2_costs(
+            "benchmark-key", "benchmark-secret", "eu-west-2", include_reserved=True
+        )
+        if error:
+            raise RuntimeError(error)
+
+    def forget_memory():
+        cost_queries._cost_cache.invalidate()
+        warehouse.clear_account_ids()
+        aws_clients.clear_clients()
+
+    def forget_everything():
+        forget_memory()
+        shutil.rmtree(warehouse.WAREHOUSE_DIR, ignore_errors=True)
+
+    with mock.patch("boto3.session.Session", aws.session):
+        _record(results, "top_instances.cold", size_name, _timings(query, repeat, setup=forget_everything),
+                instance_types=size.instance_types)
+        _record(results, "top_instances.warehouse", size_name, _timings(query, repeat, setup=forget_memory),
+                instance_types=size.instance_types)
+        _record(results, "top_instances.cached", size_name, _timings(query, repeat),
+                instance_types=size.instance_types)
+
+
+def bench_agent_tools(results, size_name, size, aws, repeat):
+    """The cost agent's top-instances tool on a first call and a repeated one"""
+    from finops import agent_tools, aws_clients, cost_queries, warehouse
+    from finops.llm_tracing import count_tokens
+
+    def top_instances(include_reserved: bool = True, limit: int = 50):
+        return cost_queries.get_top_rds_ec2_costs(
+            "benchmark-key", "benchmark-secret", "eu-west-2", include_reserved=include_reserved, limit=limit
+        )
+
+    tool = agent_tools.cached_tool(top_instances, scope="benchmark-key")
+
+    def forget_memory():
+        agent_tools.invalidate_tool_results()
+        cost_queries._cost_cache.invalidate()
+        warehouse.clear_account_ids()
+        aws_clients.clear_clients()
+
+    with mock.patch("boto3.session.Session", aws.session):
+        raw_tokens = count_tokens(str(top_instances()))
+        _record(results, "agent.tool_first_call", size_name, _timings(tool.call, repeat, setup=forget_memory),
+                instance_types=size.instance_types)
+        tool.call()
+        calls_before = sum(aws.calls.values())
+        timings = _timings(tool.call, repeat)
+        _record(results, "agent.tool_repeat_call", size_name, timings,
+                aws_calls=sum(aws.calls.values()) - calls_before,
+                raw_tokens=raw_tokens, observation_tokens=count_tokens(tool.call().content))
+
+
+def synthetic_usage(hours, types, seed=0):
+    """Hourly On-Demand spend per instance type with a daily cycle and noise"""
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(0.1, 20.0, types)
+    daily = 1 + 0.3 * np.sin(np.arange(hours) * 2 * np.pi / 24)
+    usage = base * daily[:, None] * rng.gamma(4.0, 0.25, (hours, types))
+    return pd.DataFrame(usage.astype(np.float32), columns=instance_types(types))
+
+
+def synthetic_daily_costs(series, days=90, spikes=100, seed=0):
+    """Daily cost per (service, usage type) with a weekday/weekend cycle and ``spikes`` injected spikes"""
+    rng = np.random.default_rng(seed)
+    base = rng.lognormal(2.0, 1.5, series)[:, None]
+    weekly = np.where(np.arange(days) % 7 >= 5, 0.7, 1.0)
+    costs = base * weekly * rng.gamma(25, 0.04, (series, days))
+    spiked = rng.choice(series, spikes, replace=False) if spikes else np.array([], dtype=int)
+    costs[spiked, days - 1 - rng.integers(0, 7, spikes)] += base[spiked, 0] * 3 + 10
+    start = date.today() - timedelta(days=days)
+    return pd.DataFrame({
+        "service": np.repeat([f"service-{i % 200}" for i in range(series)], days),
+        "usage_type": np.repeat([f"usage-{i}" for i in range(series)], days),
+        "date": np.tile([start + timedelta(days=d) for d in range(days)], series),
+        "cost": costs.ravel(),
+    }), set(spiked)
+
+
+def bench_anomalies(results, size_name, size, repeat):
+    """Spend anomaly scoring of every (service, usage type) series at once"""
+    from finops.anomalies import detect_anomalies, score_matrix, to_matrix
+
+    costs, spiked = synthetic_daily_costs(size.cost_series)
+    keys = ["service", "usage_type"]
+    _, _, matrix = to_matrix(costs, keys)
+    _record(results, "anomalies.score", size_name, _timings(lambda: score_matrix(matrix), repeat),
+            series=size.cost_series)
+    found = detect_anomalies(costs, keys)
+    flagged = {int(usage_type[len("usage-"):]) for usage_type in found["usage_type"]}
+    _record(results, "anomalies.detect", size_name, _timings(lambda: detect_anomalies(costs, keys), repeat),
+            series=size.cost_series, rows=len(costs), spikes=len(spiked),
+            spikes_found=len(spiked & flagged), other_flagged=len(flagged - spiked))
+
+
+def bench_forecast(results, size_name, size, repeat, history_days=182):
+    """Trend-plus-seasonality forecasts of every series for 1- and 3-year terms"""
+    from finops.forecast import forecast_matrix, forecast_usage
+
+    costs, _ = synthetic_daily_costs(size.cost_series, days=history_days, spikes=0)
+    usage = costs["cost"].to_numpy().reshape(size.cost_series, history_days)
+    for years in (1, 3):
+        _record(results, f"forecast.matrix_{years}y", size_name,
+                _timings(lambda: forecast_matrix(usage, 365 * years), repeat),
+                series=size.cost_series, history_days=history_days)
+    _record(results, "forecast.usage_3y", size_name,
+            _timings(lambda: forecast_usage(costs, ["service", "usage_type"], 3 * 365), repeat),
+            series=size.cost_series, rows=len(costs))
+
+
+def bench_reservation(results, size_name, size, aws, repeat):
+    """calculate_optimal_reservation on an (hours x instance types) upload"""
+    calculate_optimal_reservation = _load_page("pages/rate_reduction.py", aws)["calculate_optimal_reservation"]
+    usage = synthetic_usage(size.usage_hours, size.usage_types)
+    _record(results, "reservation.optimal", size_name,
+            _timings(lambda: calculate_optimal_reservation(usage, 0.3), repeat),
+            hours=size.usage_hours, instance_types=size.usage_types)
+
+
+def prepare_workspace(path):
+    """Create a working directory with fake secrets and an offline pricing index"""
+    from finops import pricing
+
+    os.makedirs(os.path.join(path, ".streamlit"), exist_ok=True)
+    with open(os.path.join(path, ".streamlit", "secrets.toml"), "w") as f:
+        f.write(
+            'OPENAI_API_KEY = "sk-benchmark"\n'
+            'AWS_ACCESS_KEY_ID = "benchmark-key"\n'
+            'AWS_SECRET_ACCESS_KEY = "benchmark-secret"\n'
+            'REGION_NAME = "eu-west-2"\n'
+        )
+    # load_data() in streamlit_app.py picks its embedder from the environment
+    os.environ["FINOPS_EMBED_BACKEND"] = "hash"
+    os.chdir(path)
+    pricing.refresh_index(fixture_path=pricing.FIXTURE_PATH)
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Return the results that are more than ``tolerance`` slower than ``baseline``"""
+    previous = {(r["benchmark"], r["size"]): r["seconds"] for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["benchmark"], result["size"]))
+        if before is None:
+            continue
+        if result["seconds"] > before * (1 + tolerance) and result["seconds"] - before > MIN_REGRESSION:
+            regressions.append(dict(result, baseline_seconds=before))
+    return regressions
+
+
+def _git_commit():
+    try:
+        output = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return output.stdout.strip() or None
+
+
+def run(sizes, repeat=3, latency=0.0):
+    import streamlit.logger
+
+    # Pages executed outside a Streamlit session warn about the missing context
+    streamlit.logger.set_log_level("error")
+    results = []
+    bench_cold_start(results, repeat)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="finops-bench-") as workspace:
+        try:
+            for size_name in sizes:
+                size = SIZES[size_name]
+                prepare_workspace(os.path.join(workspace, size_name))
+                aws = FakeAWS(FakeAccount(size.db_instances, size.instance_types), latency=latency)
+                clear_clients()  # clients from the previous size point at its fake account
+                bench_chat(results, size_name, size, repeat)
+                bench_ingest(results, size_name, size, repeat)
+                bench_vectors(results, size_name, size, repeat)
+                bench_rds(results, size_name, size, aws, repeat)
+                bench_actions(results, size_name, size, aws, repeat)
+                bench_fanout(results, size_name, size, aws, repeat)
+                bench_top_instances(results, size_name, size, aws, repeat)
+                bench_agent_tools(results, size_name, size, aws, repeat)
+                bench_anomalies(results, size_name, size, repeat)
+                bench_forecast(results, size_name, size, repeat)
+                bench_reservation(results, size_name, size, aws, repeat)
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline FinOps benchmarks")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds added to every fake AWS call, like a network round trip")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--baseline", help="Earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    results = run(args.sizes, args.repeat, args.latency)
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "latency": args.latency,
+        "sizes": {name: SIZES[name]._asdict() for name in args.sizes},
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['size'] or '-'} {r['benchmark']}: "
+                  f"{r['baseline_seconds'] * 1000:.1f} ms -> {r['seconds'] * 1000:.1f} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Shared helpers used by the FinOps chatbot and its pages."""
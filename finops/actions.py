@@ -0,0 +1,215 @@
+"""Bulk actions on idle RDS instances: tagging them for deletion and telling their owners.
+
+Tagging goes through the Resource Groups Tagging API, which takes up to 20
+ARNs per TagResources call, using the DBInstanceArn the scan read from
+describe_db_instances. The batches of every account and region run on a
+thread pool that backs off together when throttled, and only the ARNs that
+failed are retried. Instances whose TagList already has the tag are skipped,
+so running it twice changes nothing the second time. A batch that fails
+outright (no access in one account, say) is reported per ARN; the other
+batches still go ahead.
+
+Notifications are grouped per owner: each CreatorEmail gets one message
+listing all of their instances, rendered from an SES template and sent with
+SendBulkTemplatedEmail, up to 50 owners per call. Every recipient takes a
+token from a bucket refilled at the account's SES MaxSendRate, so sending
+never goes over the quota however many owners there are.
+"""
+import json
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from finops.fanout import Target
+from finops.rds_scan import AdaptiveBackoff, call_with_backoff
+from finops.tracing import THROTTLING_ERRORS, span, tracer
+
+DELETION_TAG = {"for_deletion": "true"}
+TAG_BATCH_SIZE = 20  # TagResources limit
+MAX_BULK_DESTINATIONS = 50  # SendBulkTemplatedEmail limit
+MAX_WORKERS = 8
+MAX_ATTEMPTS = 5
+RETRYABLE_TAG_ERRORS = {"InternalServiceException", "ThrottlingException"}
+RETRYABLE_SEND_STATUSES = {"Failed", "TransientFailure"}
+SES_THROTTLING_ERRORS = THROTTLING_ERRORS | {"AccountThrottled"}
+
+TEMPLATE_NAME = "finops-idle-rds-instances"
+TEMPLATE = {
+    "TemplateName": TEMPLATE_NAME,
+    "SubjectPart": "{{count}} RDS instance(s) scheduled for deletion",
+    "TextPart": (
+        "Hello,\n\n"
+        "These RDS instances have not had any connections in the past {{days}} days:\n\n"
+        "{{#each instances}}  - {{id}} (account {{account}}, {{region}})\n{{/each}}\n"
+        "They have been tagged and are scheduled for deletion in {{grace_days}} days "
+        "unless you remove the for_deletion tag.\n\n"
+        "If you wish to keep an instance, please ensure the tag is removed before the deletion date.\n"
+    ),
+}
+
+ActionResult = namedtuple("ActionResult", ["done", "skipped", "failed"])  # failed: {key: error}
+
+
+class TokenBucket:
+    """Allows ``rate`` tokens a second on average, with bursts of up to ``capacity``"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Block until ``tokens`` are available, then take them"""
+        if tokens > self.capacity:
+            raise ValueError(f"Can't take {tokens} tokens from a bucket of {self.capacity:g}")
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _error_text(error):
+    if isinstance(error, ClientError):
+        details = error.response.get("Error", {})
+        return f"{details.get('Code')}: {details.get('Message')}"
+    return f"{type(error).__name__}: {error}"
+
+
+def _chunks(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def tag_resources(fanout, instances, tags=DELETION_TAG, max_workers=MAX_WORKERS):
+    """Tag every instance in ``instances``, a DataFrame of scan rows.
+
+    Returns an ActionResult counting tagged and already-tagged instances,
+    with the error of each ARN that could not be tagged.
+    """
+    pending = instances[~instances["Tagged for Deletion"]]
+    by_target = {}
+    for account_id, region, arn in pending[["Account", "Region", "DB Instance ARN"]].itertuples(index=False):
+        by_target.setdefault(Target(account_id, region), []).append(arn)
+    backoff = AdaptiveBackoff()
+
+    def tag_batch(target, arns):
+        failed = {}
+        try:
+            client = fanout.client(target, "resourcegroupstaggingapi")
+            for attempt in range(MAX_ATTEMPTS):
+                response = call_with_backoff(lambda: client.tag_resources(ResourceARNList=arns, Tags=tags), backoff)
+                retry = []
+                for arn, failure in response.get("FailedResourcesMap", {}).items():
+                    if failure.get("ErrorCode") in RETRYABLE_TAG_ERRORS and attempt < MAX_ATTEMPTS - 1:
+                        retry.append(arn)
+                    else:
+                        failed[arn] = f"{failure.get('ErrorCode')}: {failure.get('ErrorMessage')}"
+                if not retry:
+                    break
+                # Tagging is idempotent, so only the failed ARNs need to go again
+                arns = retry
+                backoff.throttled()
+                tracer.increment("actions.tag_retries", len(retry))
+        except (BotoCoreError, ClientError) as e:
+            # e.g. no access in this account; the other batches carry on
+            failed.update((arn, _error_text(e)) for arn in arns)
+        return failed
+
+    failed = {}
+    with span("actions.tag_resources", resources=len(pending)):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(tag_batch, target, batch)
+                for target, arns in by_target.items()
+                for batch in _chunks(arns, TAG_BATCH_SIZE)
+            ]
+            for future in as_completed(futures):
+                failed.update(future.result())
+    return ActionResult(len(pending) - len(failed), len(instances) - len(pending), failed)
+
+
+def ensure_template(ses_client, template=TEMPLATE):
+    """Create the notification template in SES, or update it if it changed"""
+    try:
+        current = ses_client.get_template(TemplateName=template["TemplateName"])["Template"]
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "TemplateDoesNotExist":
+            raise
+        ses_client.create_template(Template=template)
+        return
+    if any(current.get(key) != value for key, value in template.items()):
+        ses_client.update_template(Template=template)
+
+
+def owner_notifications(instances, days=30, grace_days=7):
+    """Return {owner email: template data} listing each owner's instances"""
+    owners = {}
+    rows = instances[instances["Creator Email"].notna()]
+    for email, db_instance_id, account_id, region in rows[
+        ["Creator Email", "DB Instance", "Account", "Region"]
+    ].itertuples(index=False):
+        data = owners.setdefault(email, {"days": days, "grace_days": grace_days, "instances": []})
+        data["instances"].append({"id": db_instance_id, "account": account_id, "region": region})
+    for data in owners.values():
+        data["count"] = len(data["instances"])
+    return owners
+
+
+def send_notifications(ses_client, instances, source, bucket=None, template=TEMPLATE):
+    """Email every owner in ``instances`` one templated message about all their instances.
+
+    Returns an ActionResult counting owners notified and instances without a
+    CreatorEmail, with the error for each owner that could not be sent to.
+    """
+    pending = [
+        (email, {"Destination": {"ToAddresses": [email]}, "ReplacementTemplateData": json.dumps(data)})
+        for email, data in owner_notifications(instances).items()
+    ]
+    skipped = int(instances["Creator Email"].isna().sum())
+    try:
+        ensure_template(ses_client, template)
+        if bucket is None:
+            bucket = TokenBucket(ses_client.get_send_quota()["MaxSendRate"])
+    except (BotoCoreError, ClientError) as e:
+        return ActionResult(0, skipped, {email: _error_text(e) for email, _ in pending})
+    batch_size = max(1, min(MAX_BULK_DESTINATIONS, int(bucket.capacity)))
+    sent, failed = 0, {}
+    backoff = AdaptiveBackoff()
+    with span("actions.send_notifications", owners=len(pending)):
+        for attempt in range(MAX_ATTEMPTS):
+            retry = []
+            for batch in _chunks(pending, batch_size):
+                bucket.acquire(len(batch))
+                try:
+                    response = call_with_backoff(lambda: ses_client.send_bulk_templated_email(
+                        Source=source,
+                        Template=template["TemplateName"],
+                        DefaultTemplateData=json.dumps({"count": 0, "instances": []}),
+                        Destinations=[destination for _, destination in batch],
+                    ), backoff, retryable=SES_THROTTLING_ERRORS)
+                except (BotoCoreError, ClientError) as e:
+                    failed.update((email, _error_text(e)) for email, _ in batch)
+                    continue
+                for (email, destination), status in zip(batch, response["Status"]):
+                    if status["Status"] == "Success":
+                        sent += 1
+                    elif status["Status"] in RETRYABLE_SEND_STATUSES and attempt < MAX_ATTEMPTS - 1:
+                        retry.append((email, destination))
+                    else:
+                        failed[email] = status.get("Error") or status["Status"]
+            if not retry:
+                break
+            pending = retry
+            backoff.throttled()
+            tracer.increment("actions.send_retries", len(retry))
+    return ActionResult(sent, skipped, failed)
@@ -0,0 +1,126 @@
+"""Streaming cost agent.
+
+The agent is a llama_index workflow agent. Its event stream is consumed on a
+background event loop and handed to the Streamlit script thread as plain
+events, so reasoning, tool status and answer tokens can be shown as they
+happen. Tool calls from one step are dispatched by the workflow's call_tool
+step, which runs up to four of them at a time (sync tools run in a thread
+pool).
+
+Tools built with ``finops.agent_tools.cached_tool`` memoise their results in
+the ``tool_results`` dict passed to ``iter_agent_events``; keep one per
+conversation.
+"""
+import asyncio
+import queue
+import threading
+
+from llama_index.core.agent.workflow import (
+    AgentOutput,
+    AgentStream,
+    FunctionAgent,
+    ReActAgent,
+    ToolCall,
+    ToolCallResult,
+)
+
+from finops.agent_tools import use_session_results
+
+SYSTEM_PROMPT = (
+    "You are a FinOps analyst answering questions about the user's AWS costs. "
+    "Use the tools to look up cost data. Call independent tools in the same step."
+)
+
+
+def build_agent(tools, llm, system_prompt=SYSTEM_PROMPT):
+    """Return a streaming agent for ``tools``.
+
+    Function-calling models get a FunctionAgent, which can ask for several tool
+    calls in one step so they run concurrently. Other models fall back to a
+    ReAct agent, whose text format only allows one action per step.
+    """
+    if llm.metadata.is_function_calling_model:
+        return FunctionAgent(
+            tools=tools, llm=llm, system_prompt=system_prompt,
+            streaming=True, allow_parallel_tool_calls=True,
+        )
+    return ReActAgent(tools=tools, llm=llm, system_prompt=system_prompt, streaming=True)
+
+
+_FINISHED = object()
+
+
+def iter_agent_events(agent, prompt, memory=None, tool_results=None):
+    """Run the agent on its own event loop thread and yield its events.
+
+    The final AgentOutput is yielded last.
+    """
+    events = queue.Queue()
+
+    async def run():
+        # Tool calls run in tasks and threads that copy this context
+        use_session_results(tool_results)
+        handler = agent.run(user_msg=prompt, memory=memory)
+        async for event in handler.stream_events():
+            events.put(event)
+        events.put(await handler)
+
+    def worker():
+        try:
+            asyncio.run(run())
+        except Exception as e:
+            events.put(e)
+        finally:
+            events.put(_FINISHED)
+
+    threading.Thread(target=worker, daemon=True).start()
+    while True:
+        item = events.get()
+        if item is _FINISHED:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def answer_tokens(events, on_reasoning, on_tool):
+    """Turn agent events into the final answer, yielding the whole answer so far as it grows.
+
+    A new step restarts the answer, so callers should replace what they show
+    rather than append to it. The reasoning so far is passed to
+    ``on_reasoning`` and each tool call or result to ``on_tool``, so the
+    caller can show them apart from the answer.
+    """
+    streamed = ""
+    final_output = None
+    for event in events:
+        if isinstance(event, ToolCallResult):
+            on_tool(f"✅ `{event.tool_name}` finished")
+        elif isinstance(event, ToolCall):
+            on_tool(f"🔧 Calling `{event.tool_name}` {event.tool_kwargs or ''}")
+        elif isinstance(event, AgentStream):
+            if event.tool_calls:
+                continue
+            text = event.response or ""
+            # ReAct streams "Thought: ... Answer: ..."; only the answer part is
+            # shown as the reply, the rest is reasoning
+            answer_at = text.find("Answer:")
+            if answer_at >= 0:
+                answer = text[answer_at + len("Answer:"):].lstrip()
+            elif text.lstrip().startswith(("Thought:", "Action:")):
+                on_reasoning(text)
+                continue
+            else:
+                answer = text
+            if not answer.startswith(streamed):
+                # A new step started streaming; what the last one said was reasoning
+                on_reasoning(streamed)
+            if answer != streamed:
+                streamed = answer
+                yield answer
+        elif isinstance(event, AgentOutput):
+            final_output = event
+
+    # Nothing was streamed (e.g. the model answered without streaming)
+    if not streamed and final_output is not None:
+        yield final_output.response.content or ""
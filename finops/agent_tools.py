@@ -0,0 +1,206 @@
+"""Tool execution layer for the cost agent.
+
+Tool results are memoised twice: per conversation, so a session sees the same
+numbers for a repeated call while they are fresh, and in a process-wide TTL
+cache shared by every session, so a question someone else just asked costs no
+AWS calls. Both expire after ``TOOL_RESULT_TTL``, and both are dropped by
+``invalidate_tool_results``. Only table results are cached; messages such as
+errors go back to the agent as they are, so the next call tries again.
+
+Tables are rendered as compact pipe-separated text, largest cost first, and
+cut to ``MAX_OBSERVATION_TOKENS``. A footer gives the row count and the total
+of the rows left out, so totals can still be answered from a cut table.
+"""
+import contextvars
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+from llama_index.core.tools import FunctionTool
+
+from finops.cache import TTLCache
+from finops.llm_tracing import count_tokens, truncate_tokens
+from finops.tracing import span, tracer
+
+TOOL_RESULT_TTL = 15 * 60
+MAX_OBSERVATION_TOKENS = int(os.environ.get("FINOPS_TOOL_MAX_TOKENS", "400"))
+COST_COLUMNS = ("Cost", "cost")
+# Arguments whose names contain these are credentials, kept out of cache keys
+CREDENTIAL_MARKERS = ("secret", "token", "password", "key_id")
+
+MAX_SESSION_RESULTS = 64
+
+_shared_results = TTLCache(maxsize=512, ttl=TOOL_RESULT_TTL)
+# {cache key: (stored at, generation, rendered result)} of the conversation
+# being answered, set by use_session_results
+_session_results = contextvars.ContextVar("finops_tool_results", default=None)
+_session_lock = threading.Lock()
+_generation = 0  # bumped by invalidate_tool_results; session results from earlier ones are stale
+
+
+class _Uncached(Exception):
+    """Carries a result that must not be cached out of TTLCache.get_or_compute"""
+
+    def __init__(self, text):
+        super().__init__(text)
+        self.text = text
+
+
+def use_session_results(results):
+    """Memoise tool results in ``results`` (a dict) for the rest of the current context"""
+    _session_results.set(results)
+
+
+def _session_get(session, key):
+    with _session_lock:
+        entry = session.get(key)
+        if entry is None:
+            return None
+        stored_at, generation, text = entry
+        if generation != _generation or time.monotonic() - stored_at >= TOOL_RESULT_TTL:
+            del session[key]
+            return None
+        return text
+
+
+def _session_put(session, key, text):
+    with _session_lock:
+        session.pop(key, None)
+        session[key] = (time.monotonic(), _generation, text)
+        # Oldest first, as dicts keep insertion order
+        while len(session) > MAX_SESSION_RESULTS:
+            del session[next(iter(session))]
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return str(value)
+
+
+def render_table(df, max_tokens=MAX_OBSERVATION_TOKENS, sort_by=None):
+    """Render ``df`` as a pipe-separated table of at most ``max_tokens`` tokens.
+
+    Rows are sorted by ``sort_by`` (the cost column by default), largest
+    first, and added until the budget is spent. Columns with the same value
+    in every row are written once above the table instead of on each row.
+    """
+    if df.empty:
+        return "No rows."
+    sort_by = sort_by or next((c for c in COST_COLUMNS if c in df.columns), None)
+    if sort_by is not None:
+        df = df.sort_values(sort_by, ascending=False, kind="stable")
+    lines = []
+    if len(df) > 1:
+        constant = [c for c in df.columns if c != sort_by and df[c].nunique(dropna=False) == 1]
+        lines += [f"{c}: {_format_value(df[c].iloc[0])}" for c in constant]
+        df = df.drop(columns=constant)
+    header = " | ".join(str(c) for c in df.columns)
+    lines.append(header)
+    first_row = len(lines)
+    footer_tokens = 30  # room for the footer below
+    used = count_tokens("\n".join(lines)) + footer_tokens
+    for row in df.itertuples(index=False):
+        line = " | ".join(_format_value(v) for v in row)
+        used += count_tokens(line) + 1
+        if used > max_tokens and len(lines) > first_row:
+            break
+        lines.append(line)
+    shown = len(lines) - first_row
+    if shown < len(df):
+        footer = f"({shown} of {len(df)} rows shown"
+        if sort_by is not None:
+            footer += f"; the other {len(df) - shown} total {_format_value(float(df[sort_by].iloc[shown:].sum()))}"
+        lines.append(footer + ")")
+    elif sort_by is not None and len(df) > 1:
+        lines.append(f"(total {_format_value(float(df[sort_by].sum()))})")
+    return truncate_tokens("\n".join(lines), max_tokens)
+
+
+def render_result(result, max_tokens=MAX_OBSERVATION_TOKENS, sort_by=None):
+    """Turn a tool's return value into observation text.
+
+    Raises _Uncached with the text when the result is a message rather than a
+    table.
+    """
+    if isinstance(result, tuple) and len(result) == 2 and (result[0] is None or isinstance(result[0], pd.DataFrame)):
+        data, error = result  # the (DataFrame, error) convention of cost_queries
+        if error:
+            raise _Uncached(str(error))
+        result = data
+    if isinstance(result, pd.DataFrame):
+        return render_table(result, max_tokens, sort_by)
+    raise _Uncached(truncate_tokens(str(result), max_tokens))
+
+
+def _call_key(name, signature, scope, args, kwargs):
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    # Credentials still tell callers apart, but only their digests are kept
+    arguments = {
+        arg: hashlib.sha256(str(value).encode()).hexdigest()
+        if value is not None and any(marker in arg.lower() for marker in CREDENTIAL_MARKERS) else value
+        for arg, value in bound.arguments.items()
+    }
+    # The scope is often an access key id, so it is hashed too
+    if scope is not None:
+        scope = hashlib.sha256(str(scope).encode()).hexdigest()
+    return (name, scope, json.dumps(arguments, sort_keys=True, default=str))
+
+
+def cached_tool(fn, name=None, scope=None, max_tokens=MAX_OBSERVATION_TOKENS, sort_by=None):
+    """Wrap ``fn`` as a FunctionTool whose results are memoised and rendered compactly.
+
+    Calls are keyed by the tool name, ``scope`` (e.g. the account the tool
+    reads) and the arguments with their defaults filled in, so ``limit=10``
+    and no limit at all are the same call. The scope and credential arguments
+    are hashed into the key rather than stored in it. ``sort_by`` names the column that
+    ranks the rows, when it isn't the cost.
+    """
+    name = name or fn.__name__
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span(f"tool.{name}") as attributes:
+            key = _call_key(name, signature, scope, args, kwargs)
+            session = _session_results.get()
+            text = _session_get(session, key) if session is not None else None
+            if text is not None:
+                attributes["cache"] = "session"
+                tracer.increment("tool.session_hits")
+                return text
+
+            computed = []
+
+            def compute():
+                computed.append(True)
+                return render_result(fn(*args, **kwargs), max_tokens, sort_by)
+
+            try:
+                text = _shared_results.get_or_compute(key, compute)
+            except _Uncached as e:
+                attributes["cache"] = "uncached"
+                return e.text
+            attributes["cache"] = "miss" if computed else "shared"
+            if not computed:
+                tracer.increment("tool.shared_hits")
+            attributes["tokens"] = count_tokens(text)
+            if session is not None:
+                _session_put(session, key, text)
+            return text
+
+    return FunctionTool.from_defaults(fn=wrapper, name=name)
+
+
+def invalidate_tool_results():
+    """Forget every tool result, shared or per session, e.g. after the underlying data was refreshed"""
+    global _generation
+    with _session_lock:
+        _generation += 1
+    _shared_results.invalidate()
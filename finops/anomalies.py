@@ -0,0 +1,133 @@
+"""Vectorised spend anomaly detection.
+
+Daily costs are pivoted into one row per series (e.g. account x service x
+usage type) and one column per day. Each of the last ``days`` days is scored
+against the ``window`` days before it:
+
+    seasonal_d = median of the window's weekday-d values - mean of those medians
+    baseline   = median(window - seasonal)
+    expected   = baseline + seasonal_(weekday of the day)
+    spread     = 1.4826 * median(|window_t - window_(t-7)|) / sqrt(2)
+    z          = (cost - expected) / max(PREDICTION_FACTOR * spread, MIN_SPREAD * |baseline|, MIN_SCALE)
+
+The spread comes from week-over-week differences, which cancel the weekly
+pattern without fitting it; residuals from the fitted weekday medians would
+understate it, since each median is taken over only a few of the values.
+
+The window is a whole number of weeks, so with a sliding window view every
+position in it has the same weekday offset from the scored day, and the
+weekday medians come from one reshape. Every series and scored day is
+handled by the same array operations; series are processed in chunks so
+memory stays bounded for tens of thousands of them.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+AnomalyScores = namedtuple(
+    "AnomalyScores",
+    [
+        "cost",      # (N, days) actual cost of each scored day
+        "expected",  # (N, days) seasonal baseline for that day
+        "z",         # (N, days) robust z-score
+    ],
+)
+
+WINDOW = 28  # four weeks, so each weekday appears four times
+SCORED_DAYS = 7
+THRESHOLD = 3.5
+MIN_INCREASE = 1.0  # currency units a day; smaller spikes are noise
+MIN_SPREAD = 0.05  # of the baseline, so a perfectly flat series doesn't flag cents
+MIN_SCALE = 0.01
+MAD_SCALE = 1.4826  # makes the MAD comparable with a standard deviation
+PREDICTION_FACTOR = 1.2  # the expected value is itself estimated from a few weeks
+DEFAULT_CHUNK_SERIES = 4096
+
+
+def to_matrix(costs, keys, date_column="date", value_column="cost"):
+    """Pivot long daily rows into (series, days, matrix).
+
+    ``series`` is a DataFrame of the ``keys`` of each row of ``matrix``,
+    ``days`` the dates of its columns. Days without a row count as zero.
+    """
+    codes = costs.groupby(keys, sort=False, dropna=False).ngroup().to_numpy()
+    series = costs[keys].drop_duplicates().reset_index(drop=True)
+    dates = pd.to_datetime(costs[date_column]).to_numpy().astype("datetime64[D]")
+    first, last = dates.min(), dates.max()
+    n_days = int((last - first).astype(np.int64)) + 1
+    positions = codes * n_days + (dates - first).astype(np.int64)
+    matrix = np.bincount(
+        positions, weights=costs[value_column].to_numpy(dtype=np.float64), minlength=len(series) * n_days,
+    ).reshape(len(series), n_days)
+    return series, np.arange(first, last + 1), matrix
+
+
+def _score_chunk(matrix, window, days):
+    n_series = len(matrix)
+    # history[i, k] is the window of days before scored day k
+    history = sliding_window_view(matrix[:, :-1], window, axis=1)[:, -days:]
+    # Position 0 of each week in the window falls on the scored day's weekday.
+    # Sorting the few values per weekday is quicker than np.median across an inner axis.
+    weeks = window // 7
+    by_weekday = np.sort(history.reshape(n_series, days, weeks, 7), axis=2)
+    weekday_median = (by_weekday[:, :, (weeks - 1) // 2] + by_weekday[:, :, weeks // 2]) / 2
+    seasonal = weekday_median - weekday_median.mean(axis=2, keepdims=True)
+    baseline = np.median(history - np.tile(seasonal, window // 7), axis=2)
+    week_over_week = np.abs(history[..., 7:] - history[..., :-7])
+    spread = MAD_SCALE / np.sqrt(2) * np.median(week_over_week, axis=2)
+    scale = np.maximum(np.maximum(PREDICTION_FACTOR * spread, MIN_SPREAD * np.abs(baseline)), MIN_SCALE)
+    cost = matrix[:, -days:]
+    expected = baseline + seasonal[..., 0]
+    return cost, expected, (cost - expected) / scale
+
+
+def score_matrix(matrix, window=WINDOW, days=SCORED_DAYS, chunk_series=DEFAULT_CHUNK_SERIES):
+    """Score the last ``days`` columns of a (series x days) cost matrix.
+
+    ``window`` must be a multiple of 7, and the matrix needs at least
+    ``window + days`` columns.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if window % 7:
+        raise ValueError(f"window must be a whole number of weeks, not {window} days")
+    if matrix.shape[1] < window + days:
+        raise ValueError(f"Need {window + days} days of history, got {matrix.shape[1]}")
+    parts = [
+        _score_chunk(matrix[start:start + chunk_series], window, days)
+        for start in range(0, len(matrix), chunk_series)
+    ]
+    return AnomalyScores(*(np.concatenate(values) for values in zip(*parts)))
+
+
+def detect_anomalies(costs, keys, window=WINDOW, days=SCORED_DAYS, threshold=THRESHOLD,
+                     min_increase=MIN_INCREASE, date_column="date", value_column="cost"):
+    """Return the spikes in long daily ``costs``, biggest increase first.
+
+    A series is identified by the ``keys`` columns. A day is a spike when its
+    z-score is at least ``threshold`` and it cost at least ``min_increase``
+    more than expected. The result has the keys followed by date, cost,
+    expected, increase and z_score, and is empty while the rows span fewer
+    than ``window + days`` days.
+    """
+    columns = list(keys) + ["date", "cost", "expected", "increase", "z_score"]
+    if costs.empty:
+        return pd.DataFrame(columns=columns)
+    # Only the scored days and the window before them are needed
+    dates = pd.to_datetime(costs[date_column])
+    costs = costs.assign(**{date_column: dates})[dates > dates.max() - pd.Timedelta(days=window + days)]
+    series, dates, matrix = to_matrix(costs, list(keys), date_column, value_column)
+    if matrix.shape[1] < window + days:
+        # Too little history to score; days before the first row aren't known to be zero
+        return pd.DataFrame(columns=columns)
+    scores = score_matrix(matrix, window, days)
+    increase = scores.cost - scores.expected
+    rows, day_index = np.nonzero((scores.z >= threshold) & (increase >= min_increase))
+    anomalies = series.iloc[rows].reset_index(drop=True)
+    anomalies["date"] = pd.to_datetime(dates[-days:][day_index]).date
+    anomalies["cost"] = scores.cost[rows, day_index]
+    anomalies["expected"] = scores.expected[rows, day_index]
+    anomalies["increase"] = increase[rows, day_index]
+    anomalies["z_score"] = scores.z[rows, day_index]
+    return anomalies.sort_values("increase", ascending=False, ignore_index=True)[columns]
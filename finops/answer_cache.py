@@ -0,0 +1,105 @@
+"""Semantic answer cache in front of the FinOps chat engine.
+
+Standalone questions are embedded and compared with the questions already
+answered. When the cosine similarity clears ``threshold`` the cached answer
+and its sources are replayed instead of running condense, retrieval and
+completion again. Entries are evicted LRU and by age, and the whole cache is
+dropped when the corpus version changes.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.93
+DEFAULT_MAXSIZE = 512
+DEFAULT_TTL = 24 * 3600
+
+
+def describe_sources(source_nodes):
+    """Return a short, de-duplicated list of source labels for a response"""
+    labels = []
+    for node in source_nodes or []:
+        metadata = node.node.metadata
+        label = metadata.get("file_name", "unknown")
+        if metadata.get("page_label"):
+            label = f"{label} (p. {metadata['page_label']})"
+        if label not in labels:
+            labels.append(label)
+    return labels
+
+
+def replay_stream(text):
+    """Yield a cached answer in small pieces so it renders like a live stream"""
+    for piece in re.findall(r"\S+\s*|\s+", text):
+        yield piece
+
+
+class SemanticAnswerCache:
+    def __init__(self, embed_model, threshold=DEFAULT_THRESHOLD, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+        self.embed_model = embed_model
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = None
+        self._entries = OrderedDict()  # question -> (created_at, vector, answer, sources)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def ensure_version(self, version):
+        """Drop every entry if the corpus the answers came from has changed"""
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+
+    def _embed(self, question):
+        vector = np.asarray(self.embed_model.get_query_embedding(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _evict_expired(self, now):
+        expired = [q for q, entry in self._entries.items() if now - entry[0] > self.ttl]
+        for question in expired:
+            del self._entries[question]
+
+    def lookup(self, question):
+        """Return (answer, sources, vector) on a hit, or (None, None, vector) on a miss.
+
+        The vector is handed back so ``store`` doesn't embed the question twice.
+        """
+        vector = self._embed(question)
+        with self._lock:
+            self._evict_expired(time.time())
+            if self._entries:
+                questions = list(self._entries)
+                matrix = np.stack([self._entries[q][1] for q in questions])
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.hits += 1
+                    self._entries.move_to_end(questions[best])
+                    _, _, answer, sources = self._entries[questions[best]]
+                    return answer, sources, vector
+            self.misses += 1
+            return None, None, vector
+
+    def store(self, question, answer, sources, vector=None):
+        if vector is None:
+            vector = self._embed(question)
+        with self._lock:
+            self._entries[question] = (time.time(), vector, answer, list(sources))
+            self._entries.move_to_end(question)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate}
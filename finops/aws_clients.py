@@ -0,0 +1,85 @@
+"""Process-wide factory for boto3 sessions and clients.
+
+Creating a boto3 client loads and parses the service model, which takes tens
+of milliseconds, and every new client starts with a cold connection pool.
+``get_client`` builds one client per (credentials, region, service) and keeps
+it for the life of the process, so reruns, pages and scanner threads all reuse
+the same clients and their open connections.
+
+Clients use botocore's adaptive retry mode, which adds client-side rate
+limiting on top of exponential backoff when AWS throttles. The connection pool
+size and retry budget can be tuned with ``FINOPS_AWS_MAX_POOL_CONNECTIONS``
+and ``FINOPS_AWS_MAX_ATTEMPTS``.
+"""
+import hashlib
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+from finops.tracing import instrument_client
+
+MAX_POOL_CONNECTIONS = int(os.environ.get("FINOPS_AWS_MAX_POOL_CONNECTIONS", 32))
+MAX_ATTEMPTS = int(os.environ.get("FINOPS_AWS_MAX_ATTEMPTS", 10))
+
+CLIENT_CONFIG = Config(
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    retries={"mode": "adaptive", "max_attempts": MAX_ATTEMPTS},
+    connect_timeout=5,
+    read_timeout=60,
+)
+
+_sessions = {}  # credentials key -> boto3 Session
+_clients = {}  # (credentials key, service) -> client
+_lock = threading.Lock()
+
+
+def _credentials_key(aws_access_key_id, aws_secret_access_key, aws_session_token, region_name):
+    # The secret is hashed so it isn't kept around as a dictionary key
+    secret = hashlib.sha256((aws_secret_access_key or "").encode()).hexdigest()
+    token = hashlib.sha256((aws_session_token or "").encode()).hexdigest()
+    return aws_access_key_id, secret, token, region_name
+
+
+def get_session(aws_access_key_id=None, aws_secret_access_key=None, region_name=None, aws_session_token=None):
+    """Return the shared boto3 Session for these credentials and region"""
+    key = _credentials_key(aws_access_key_id, aws_secret_access_key, aws_session_token, region_name)
+    session = _sessions.get(key)
+    if session is None:
+        with _lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _sessions[key] = boto3.session.Session(
+                    aws_access_key_id=aws_access_key_id,
+                    aws_secret_access_key=aws_secret_access_key,
+                    aws_session_token=aws_session_token,
+                    region_name=region_name,
+                )
+    return session
+
+
+def get_client(service_name, aws_access_key_id=None, aws_secret_access_key=None, region_name=None,
+               aws_session_token=None):
+    """Return the shared, traced client for ``service_name``.
+
+    Clients are thread-safe, so scanner threads can share the one returned
+    here. Without explicit credentials the default credential chain is used.
+    """
+    key = (_credentials_key(aws_access_key_id, aws_secret_access_key, aws_session_token, region_name), service_name)
+    client = _clients.get(key)
+    if client is None:
+        session = get_session(aws_access_key_id, aws_secret_access_key, region_name, aws_session_token)
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                # Sessions aren't thread-safe, so clients are only created under the lock
+                client = _clients[key] = instrument_client(session.client(service_name, config=CLIENT_CONFIG))
+    return client
+
+
+def clear_clients():
+    """Forget every cached session and client, e.g. after credentials were rotated"""
+    with _lock:
+        _sessions.clear()
+        _clients.clear()
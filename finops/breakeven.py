@@ -0,0 +1,126 @@
+"""Vectorised reservation breakeven engine.
+
+For one column of hourly usage u_1..u_T (in on-demand units) and a commitment
+of c units per hour, the cost over the period is
+
+    cost(c) = T * c * reserved_rate + on_demand_rate * sum(max(u_t - c, 0))
+
+The cost is piecewise linear in c and only bends at the observed usage
+values, so the exact optimum is one of them: the value a fraction
+``discount_rate`` of the way up the sorted usage. Sorting each column and
+taking cumulative sums gives the savings at every breakpoint in O(T log T),
+for every column at once; when only the optimum is needed a partial sort is
+enough.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+BreakevenResult = namedtuple(
+    "BreakevenResult",
+    [
+        "optimal_commitment",  # (N,) units per hour to commit to
+        "optimal_cost",        # (N,) total cost at the optimum
+        "on_demand_cost",      # (N,) total cost with no commitment
+        "savings",             # (N,) on_demand_cost - optimal_cost
+        "levels",              # (N, T + 1) commitment levels, or None
+        "savings_curve",       # (N, T + 1) savings at each level, or None
+    ],
+)
+
+DEFAULT_CHUNK_COLUMNS = 512
+
+
+def _optimal_index(hours, discount_rate):
+    """Position of the optimum among the T + 1 sorted levels (0 = commit nothing).
+
+    Past sorted level j the cost slope is T * reserved_rate - on_demand_rate * (T - j),
+    which turns non-negative once j >= T * discount_rate.
+    """
+    index = np.ceil(hours * discount_rate - 1e-9).astype(np.int64)
+    return np.clip(index, 0, hours)
+
+
+def _solve_chunk(usage, on_demand_rate, discount_rate, return_curves):
+    # ``usage`` is one contiguous row per instance type (n_columns x T), which
+    # makes the per-type sorts and sums run over contiguous memory
+    n_columns, hours = usage.shape
+    reserved_rate = on_demand_rate * (1 - discount_rate)
+    best = _optimal_index(hours, discount_rate)
+    rows = np.arange(n_columns)
+    total = usage.sum(axis=1)
+    on_demand_cost = total * on_demand_rate
+    levels = None
+    savings_curve = None
+
+    if not return_curves:
+        # Only the optimum is needed: a partial sort per distinct position is enough
+        optimal_commitment = np.zeros(n_columns, dtype=usage.dtype)
+        excess = total.copy()
+        for index in np.unique(best):
+            if index == 0:
+                continue
+            group = np.flatnonzero(best == index)
+            chunk = usage if len(group) == n_columns else usage[group]
+            part = np.partition(chunk, index - 1, axis=1)
+            commitment = part[:, index - 1]
+            optimal_commitment[group] = commitment
+            # Everything after the kth position is at least the commitment
+            excess[group] = part[:, index:].sum(axis=1) - commitment * (hours - index)
+        optimal_cost = hours * optimal_commitment * reserved_rate + excess * on_demand_rate
+    else:
+        levels = np.empty((n_columns, hours + 1), dtype=usage.dtype)
+        levels[:, 0] = 0
+        levels[:, 1:] = usage
+        levels[:, 1:].sort(axis=1)
+        # savings(j) = p * cumsum(L)_j + L_j * (p * (T - j) - T * r)
+        savings_curve = np.cumsum(levels, axis=1)
+        savings_curve *= on_demand_rate[:, None]
+        remaining_hours = hours - np.arange(hours + 1, dtype=usage.dtype)
+        savings_curve += levels * (remaining_hours * on_demand_rate[:, None] - (hours * reserved_rate)[:, None])
+        optimal_commitment = levels[rows, best]
+        optimal_cost = on_demand_cost - savings_curve[rows, best]
+
+    return optimal_commitment, optimal_cost, on_demand_cost, levels, savings_curve
+
+
+def breakeven(usage, discount_rate, on_demand_rate=1.0, return_curves=False,
+              chunk_columns=DEFAULT_CHUNK_COLUMNS, dtype=np.float64):
+    """Find the cost-minimising commitment for every column of ``usage``.
+
+    ``usage`` is an (hours x instance types) array, or a 1-D array for a single
+    type. ``discount_rate`` and ``on_demand_rate`` may be scalars or one value
+    per column. Columns are solved in chunks so memory stays bounded for
+    thousands of SKUs. The full savings curves hold T + 1 points per column,
+    so they are only built when ``return_curves`` is set.
+    """
+    usage = np.asarray(usage, dtype=dtype)
+    if usage.ndim == 1:
+        usage = usage[:, None]
+    n_columns = usage.shape[1]
+    discount_rate = np.broadcast_to(np.asarray(discount_rate, dtype=dtype), (n_columns,))
+    on_demand_rate = np.broadcast_to(np.asarray(on_demand_rate, dtype=dtype), (n_columns,))
+
+    parts = []
+    for start in range(0, n_columns, chunk_columns):
+        cols = slice(start, start + chunk_columns)
+        # Missing hours count as no usage
+        chunk = np.nan_to_num(np.array(usage[:, cols].T, order="C"), copy=False)
+        parts.append(_solve_chunk(chunk, on_demand_rate[cols], discount_rate[cols], return_curves))
+    if not parts:
+        # No instance types: solve an empty chunk so every result has its usual shape
+        empty = np.zeros((0, usage.shape[0]), dtype=dtype)
+        parts.append(_solve_chunk(empty, on_demand_rate, discount_rate, return_curves))
+
+    optimal_commitment, optimal_cost, on_demand_cost, levels, savings_curve = (
+        np.concatenate(values) if values[0] is not None else None
+        for values in zip(*parts)
+    )
+    return BreakevenResult(
+        optimal_commitment=optimal_commitment,
+        optimal_cost=optimal_cost,
+        on_demand_cost=on_demand_cost,
+        savings=on_demand_cost - optimal_cost,
+        levels=levels,
+        savings_curve=savings_curve,
+    )
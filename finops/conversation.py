@@ -0,0 +1,214 @@
+"""Bounded chat memory and the condense-skip fast path.
+
+``RollingMemory`` keeps the last few turns word for word and folds older ones
+into a running summary, so the history sent to the condense step stays
+within a fixed number of tokens however long the conversation runs. Turns
+are summarised a few at a time, from the thread that writes the streamed
+answer to memory (or ``put_later``'s, for answers from the cache), so the
+summary call is off the answer's critical path. The summary call runs without
+the memory's lock: until it returns, readers see the old turns in full.
+
+``FastCondenseChatEngine`` skips the condense LLM call when the question can
+already stand on its own: there is no history, or it has enough content
+words and nothing that refers back to earlier turns.
+"""
+import re
+import threading
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.chat_engine import CondenseQuestionChatEngine
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.memory.types import BaseMemory
+from llama_index.core.settings import Settings
+
+from finops.llm_tracing import count_tokens, truncate_tokens
+from finops.tracing import span, tracer
+
+MAX_TURNS = 6
+EVICT_TURNS = 3  # turns folded into the summary at once, so it isn't rewritten every turn
+TOKEN_LIMIT = 1500  # summary and recent turns together
+SUMMARY_TOKENS = 300
+MAX_DISPLAYED_MESSAGES = 100  # chat history kept for the page itself
+
+SUMMARY_PROMPT = (
+    "Update the summary of a conversation between a user and a FinOps assistant with the "
+    "exchanges below. Keep the facts, figures, services and decisions a later question could "
+    "refer to. Reply with the summary only, in at most {words} words.\n\n"
+    "Summary so far:\n{summary}\n\nExchanges:\n{exchanges}"
+)
+
+# Words that point back at something said earlier
+REFERENCES = frozenset(
+    "it its it's that those these they them their theirs he she him his her there same above previous "
+    "earlier former latter else".split()
+)
+# Openings that continue the previous turn rather than start a new topic
+CONTINUATIONS = ("and ", "but ", "also ", "so ", "then ", "what about", "how about", "why not", "and?", "why?")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is of on or should the to was we what "
+    "when where which who why will with you your".split()
+)
+MIN_CONTENT_WORDS = 3
+
+
+def is_standalone(question, history):
+    """Guess whether ``question`` can be answered without the earlier turns"""
+    if not history:
+        return True
+    text = question.strip().lower()
+    if text.startswith(CONTINUATIONS):
+        return False
+    words = re.findall(r"[a-z0-9']+", text)
+    if REFERENCES.intersection(words):
+        return False
+    return sum(word not in STOPWORDS for word in words) >= MIN_CONTENT_WORDS
+
+
+def _turns(messages):
+    """Split messages into turns, each starting at a user message"""
+    turns = []
+    for message in messages:
+        if message.role == MessageRole.USER or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+class RollingMemory(BaseMemory):
+    """A running summary plus the last ``max_turns`` turns, within ``token_limit``"""
+
+    max_turns: int = MAX_TURNS
+    token_limit: int = TOKEN_LIMIT
+    summary_tokens: int = SUMMARY_TOKENS
+    summary: str = ""
+    llm: object = None  # Settings.llm when unset
+    _messages: list = PrivateAttr(default_factory=list)
+    _lock: threading.RLock = PrivateAttr(default_factory=threading.RLock)
+    # Held while summarising, so summaries are written one at a time
+    _summary_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _pending: list = PrivateAttr(default_factory=list)  # put_later threads
+
+    @classmethod
+    def class_name(cls):
+        return "RollingMemory"
+
+    @classmethod
+    def from_defaults(cls, chat_history=None, llm=None, **kwargs):
+        memory = cls(llm=llm, **kwargs)
+        memory.set(chat_history or [])
+        return memory
+
+    def get(self, input=None, **kwargs):
+        with self._lock:
+            messages = list(self._messages)
+            summary = self.summary
+        if summary:
+            messages.insert(0, ChatMessage(role=MessageRole.SYSTEM, content=f"Earlier in the conversation: {summary}"))
+        return messages
+
+    def get_all(self):
+        with self._lock:
+            return list(self._messages)
+
+    def put(self, message):
+        with self._lock:
+            self._messages.append(message)
+        # Only once a turn is complete; the answer is written from a background thread
+        if message.role != MessageRole.USER:
+            self._compact()
+
+    def put_later(self, messages):
+        """Add ``messages`` now and fold old turns into the summary from a background thread.
+
+        The messages are visible to ``get`` as soon as this returns; only the
+        summary call is left to the thread, which ``flush`` waits for.
+        """
+        with self._lock:
+            self._messages.extend(messages)
+            self._pending = [thread for thread in self._pending if thread.is_alive()]
+            thread = threading.Thread(target=self._compact, name="memory-put", daemon=True)
+            self._pending.append(thread)
+        thread.start()
+        return thread
+
+    def flush(self, timeout=None):
+        """Wait for the summaries started by ``put_later``"""
+        with self._lock:
+            pending = list(self._pending)
+        for thread in pending:
+            thread.join(timeout)
+
+    def set(self, messages):
+        with self._lock:
+            self._messages = list(messages)
+        self._compact()
+
+    def reset(self):
+        with self._lock:
+            self._messages = []
+            self.summary = ""
+
+    def _tokens(self):
+        return count_tokens(self.summary) + sum(count_tokens(str(m.content or "")) for m in self._messages)
+
+    def _compact(self):
+        with self._summary_lock:
+            with self._lock:
+                evicted = self._to_evict()
+                summary = self.summary
+            if not evicted:
+                return
+            summary = self._summarise(evicted, summary)
+            with self._lock:
+                # Turns added meanwhile come after the evicted ones; after a set
+                # or reset the evicted turns are gone and the summary is moot
+                if len(self._messages) < len(evicted) or any(
+                    kept is not old for kept, old in zip(self._messages, evicted)
+                ):
+                    return
+                del self._messages[:len(evicted)]
+                self.summary = summary
+
+    def _to_evict(self):
+        """Return the messages of the oldest turns that no longer fit"""
+        turns = _turns(self._messages)
+        # The turn in progress always stays
+        evict = max(0, len(turns) - self.max_turns)
+        if evict:
+            evict = min(len(turns) - 1, max(evict, EVICT_TURNS))
+        while evict < len(turns) - 1 and self._tokens_without(turns[:evict]) > self.token_limit:
+            evict += 1
+        return [message for turn in turns[:evict] for message in turn]
+
+    def _tokens_without(self, turns):
+        return self._tokens() - sum(count_tokens(str(m.content or "")) for turn in turns for m in turn)
+
+    def _summarise(self, messages, summary):
+        exchanges = "\n".join(f"{m.role.value}: {m.content}" for m in messages if m.content)
+        llm = self.llm or Settings.llm
+        try:
+            with span("chat.summarise", messages=len(messages)):
+                summary = llm.complete(SUMMARY_PROMPT.format(
+                    words=int(self.summary_tokens * 0.75), summary=summary or "(none)", exchanges=exchanges,
+                )).text.strip()
+        except Exception:
+            # Without a summary the user's questions still say what was discussed
+            questions = [str(m.content) for m in messages if m.role == MessageRole.USER]
+            summary = " ".join(filter(None, [summary, "The user asked: " + " / ".join(questions)]))
+        return truncate_tokens(summary, self.summary_tokens)
+
+
+class FastCondenseChatEngine(CondenseQuestionChatEngine):
+    """Condense-question chat engine that skips condensing standalone questions"""
+
+    def _condense_question(self, chat_history, last_message):
+        if is_standalone(last_message, chat_history):
+            tracer.increment("chat.condense_skipped")
+            return last_message
+        return super()._condense_question(chat_history, last_message)
+
+    async def _acondense_question(self, chat_history, last_message):
+        if is_standalone(last_message, chat_history):
+            tracer.increment("chat.condense_skipped")
+            return last_message
+        return await super()._acondense_question(chat_history, last_message)
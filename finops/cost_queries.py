@@ -0,0 +1,197 @@
+"""Shared, memoised Cost Explorer queries used by the pages and the agent.
+
+Results are cached per (account, time window, group-bys, filters) in a
+process-wide TTL cache, so a user moving between pages, or several users
+looking at the same account, trigger one query between them.
+"""
+import json
+from datetime import datetime, timedelta
+
+import pandas as pd
+from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+
+from finops.anomalies import SCORED_DAYS, THRESHOLD, WINDOW, detect_anomalies
+from finops.aws_clients import get_client
+from finops.cache import TTLCache
+from finops.forecast import HISTORY_DAYS
+from finops.pricing import estimate_reserved_cost
+from finops.tracing import span
+from finops.warehouse import (
+    INSTANCE_COSTS,
+    SERVICE_USAGE_COSTS,
+    get_account_id,
+    read_costs,
+    regional_dataset,
+    sync_costs,
+)
+
+_cost_cache = TTLCache(maxsize=256, ttl=15 * 60)
+NO_COSTS = "No costs or instances found for the specified time period."
+NO_ANOMALIES = "No spend anomalies found in the specified time period."
+NOT_ENOUGH_HISTORY = "Not enough daily spend history yet to find anomalies."
+
+
+def last_month_window():
+    """Return (start, end): the first day of last month up to today"""
+    end_date = datetime.now().date()
+    start_date = (end_date.replace(day=1) - timedelta(days=1)).replace(day=1)
+    return start_date, end_date
+
+
+def _cache_key(account_id, dataset, start_date, end_date):
+    return (
+        account_id,
+        start_date.isoformat(),
+        end_date.isoformat(),
+        tuple(dataset.group_by),
+        json.dumps(dataset.filter, sort_keys=True),
+        dataset.metric,
+    )
+
+
+def _synced_costs(aws_access_key_id, aws_secret_access_key, region_name, aws_session_token,
+                  account_id, dataset, start_date, end_date, force=False):
+    client = get_client('ce', aws_access_key_id, aws_secret_access_key, region_name, aws_session_token)
+    # Only days not yet in the local warehouse are fetched from Cost Explorer
+    with span("costs.sync", dataset=dataset.name) as attributes:
+        attributes["days"] = len(sync_costs(client, account_id, dataset, start=start_date, force=force))
+    with span("costs.read", dataset=dataset.name) as attributes:
+        costs = read_costs(account_id, dataset, start_date, end_date)
+        attributes["rows"] = len(costs)
+    return costs
+
+
+def query_costs(aws_access_key_id, aws_secret_access_key, region_name,
+                dataset=INSTANCE_COSTS, start_date=None, end_date=None, aws_session_token=None, force=False):
+    """Return costs for ``dataset`` totalled per group over [start_date, end_date).
+
+    ``force`` re-syncs the warehouse from Cost Explorer and replaces the cached
+    result, however recently either was refreshed.
+    """
+    if start_date is None or end_date is None:
+        start_date, end_date = last_month_window()
+    account_id = get_account_id(aws_access_key_id, aws_secret_access_key, region_name, aws_session_token)
+
+    def compute():
+        costs = _synced_costs(aws_access_key_id, aws_secret_access_key, region_name, aws_session_token,
+                              account_id, dataset, start_date, end_date, force)
+        with span("costs.aggregate", dataset=dataset.name):
+            group_columns = [key.lower() for key in dataset.group_by]
+            return costs.groupby(group_columns, as_index=False)['cost'].sum()
+
+    key = _cache_key(account_id, dataset, start_date, end_date)
+    if force:
+        _cost_cache.invalidate(key)
+    # Callers get their own copy so the cached frame is never modified
+    return _cost_cache.get_or_compute(key, compute).copy()
+
+
+def query_daily_costs(aws_access_key_id, aws_secret_access_key, region_name, start_date, end_date,
+                      dataset=SERVICE_USAGE_COSTS, aws_session_token=None, force=False):
+    """Return the daily rows of ``dataset`` over [start_date, end_date), one per group and day.
+
+    ``force`` works as it does for query_costs.
+    """
+    account_id = get_account_id(aws_access_key_id, aws_secret_access_key, region_name, aws_session_token)
+
+    def compute():
+        return _synced_costs(aws_access_key_id, aws_secret_access_key, region_name, aws_session_token,
+                             account_id, dataset, start_date, end_date, force)
+
+    key = ("daily",) + _cache_key(account_id, dataset, start_date, end_date)
+    if force:
+        _cost_cache.invalidate(key)
+    return _cost_cache.get_or_compute(key, compute).copy()
+
+
+def get_spend_anomalies(aws_access_key_id, aws_secret_access_key, region_name,
+                        days=SCORED_DAYS, threshold=THRESHOLD, aws_session_token=None):
+    """Find daily spend spikes per service and usage type over the last ``days`` complete days"""
+    try:
+        # Today's costs are still coming in, so the last scored day is yesterday
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=WINDOW + days)
+        costs = query_daily_costs(aws_access_key_id, aws_secret_access_key, region_name,
+                                  start_date, end_date, aws_session_token=aws_session_token)
+        if costs.empty:
+            return None, NO_COSTS
+        dates = pd.to_datetime(costs["date"])
+        if (dates.max() - dates.min()).days + 1 < WINDOW + days:
+            return None, NOT_ENOUGH_HISTORY
+        with span("anomalies.detect", rows=len(costs)) as attributes:
+            found = detect_anomalies(costs, ["service", "usage_type"], days=days, threshold=threshold)
+            attributes["anomalies"] = len(found)
+        if found.empty:
+            return None, NO_ANOMALIES
+        return found.rename(columns={
+            'service': 'Service', 'usage_type': 'Usage Type', 'date': 'Date', 'cost': 'Cost',
+            'expected': 'Expected', 'increase': 'Increase', 'z_score': 'Z-Score',
+        }), None
+
+    except NoCredentialsError:
+        return None, "No credentials provided."
+    except PartialCredentialsError:
+        return None, "Incomplete credentials provided."
+    except Exception as e:
+        return None, str(e)
+
+
+def get_family_usage(aws_access_key_id, aws_secret_access_key, region_name,
+                     history_days=HISTORY_DAYS, region_only=False, aws_session_token=None, force=False):
+    """Daily On-Demand spend per RDS and EC2 instance family over the last ``history_days`` complete days"""
+    try:
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=history_days)
+        dataset = regional_dataset(INSTANCE_COSTS, region_name) if region_only else INSTANCE_COSTS
+        costs = query_daily_costs(aws_access_key_id, aws_secret_access_key, region_name, start_date, end_date,
+                                  dataset=dataset, aws_session_token=aws_session_token, force=force)
+        if costs.empty:
+            return None, NO_COSTS
+        # db.r5.large -> db.r5, m5.xlarge -> m5
+        costs['family'] = costs['instance_type'].str.rsplit('.', n=1).str[0]
+        usage = costs.groupby(['service', 'family', 'date'], as_index=False)['cost'].sum()
+        return usage.rename(columns={'service': 'Service', 'family': 'Family'}), None
+
+    except NoCredentialsError:
+        return None, "No credentials provided."
+    except PartialCredentialsError:
+        return None, "Incomplete credentials provided."
+    except Exception as e:
+        return None, str(e)
+
+
+def get_top_rds_ec2_costs(aws_access_key_id, aws_secret_access_key, region_name,
+                          include_reserved=False, limit=10, region_only=False, aws_session_token=None, force=False):
+    """Search AWS account for top RDS and EC2 instances by cost and returns dataframe of top instances"""
+    try:
+        # Cost Explorer is global, so spend is account-wide unless limited to the region
+        dataset = regional_dataset(INSTANCE_COSTS, region_name) if region_only else INSTANCE_COSTS
+        totals = query_costs(aws_access_key_id, aws_secret_access_key, region_name,
+                             dataset=dataset, aws_session_token=aws_session_token, force=force)
+
+        # Check if there are any results
+        if totals.empty:
+            return None, NO_COSTS
+
+        df = totals.rename(columns={'service': 'Service', 'instance_type': 'Instance Type', 'cost': 'Cost'})
+        top = df.sort_values(by='Cost', ascending=False).head(limit).reset_index(drop=True)
+
+        if include_reserved:
+            reserved_costs = []
+            savings = []
+            for service, instance_type, amount in top[['Service', 'Instance Type', 'Cost']].itertuples(index=False):
+                # Priced from the local bulk pricing index rather than the Pricing API
+                reserved_cost = estimate_reserved_cost(service, instance_type, region_name, amount)
+                reserved_costs.append(reserved_cost)
+                savings.append((amount - reserved_cost) / amount if reserved_cost and amount else 0)
+            top['Reserved Cost'] = reserved_costs
+            top['Percentage Saving'] = savings
+
+        return top, None
+
+    except NoCredentialsError:
+        return None, "No credentials provided."
+    except PartialCredentialsError:
+        return None, "Incomplete credentials provided."
+    except Exception as e:
+        return None, str(e)
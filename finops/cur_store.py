@@ -0,0 +1,169 @@
+"""Local query engine over Cost and Usage Report Parquet files.
+
+CUR exports copied to ``storage/cur/`` (CUR 2.0 or legacy Parquet, any
+``key=value`` folder partitioning) are opened as one Arrow dataset over
+memory-mapped files. Queries read only the columns they need, push date and
+equality filters down to the Parquet row groups, and aggregate in Arrow, so
+tens of millions of line items can be summarised locally without a Cost
+Explorer call.
+"""
+import os
+from datetime import date, datetime
+
+from finops.lazy import lazy_import
+
+# Loaded on the first query, so the agent page doesn't pay for Arrow at startup
+pa = lazy_import("pyarrow")
+pc = lazy_import("pyarrow.compute")
+ds = lazy_import("pyarrow.dataset")
+fs = lazy_import("pyarrow.fs")
+
+CUR_DIR = "storage/cur"
+DEFAULT_LIMIT = 20
+
+# Friendly dimension -> (CUR 2.0 column, legacy CUR column)
+DIMENSIONS = {
+    "service": ("line_item_product_code", "line_item_product_code"),
+    "account": ("line_item_usage_account_id", "line_item_usage_account_id"),
+    "usage_type": ("line_item_usage_type", "line_item_usage_type"),
+    "region": ("product_region_code", "product_region"),
+    "instance_type": ("product_instance_type", "product_instance_type"),
+}
+START_COLUMN = "line_item_usage_start_date"
+COST_COLUMN = "line_item_unblended_cost"
+TAG_MAP_COLUMN = "resource_tags"  # CUR 2.0 keeps tags in one map column
+LEGACY_TAG_PREFIX = "resource_tags_user_"
+
+
+def open_cur_dataset(cur_dir=CUR_DIR):
+    """Open every Parquet file under ``cur_dir`` as one memory-mapped dataset"""
+    return ds.dataset(
+        cur_dir,
+        format="parquet",
+        partitioning="hive",
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+
+
+def _dimension_column(dataset, name):
+    names = dataset.schema.names
+    if name.startswith("tag:"):
+        key = name[len("tag:"):]
+        if LEGACY_TAG_PREFIX + key in names:
+            return LEGACY_TAG_PREFIX + key
+        if TAG_MAP_COLUMN in names:
+            return None  # looked up from the map column after the scan
+        raise ValueError(f"No tag column for '{key}'")
+    if name == "day":
+        return START_COLUMN
+    for column in DIMENSIONS.get(name, ()):
+        if column in names:
+            return column
+    raise ValueError(f"Unknown dimension '{name}'. Use one of: {', '.join(list(DIMENSIONS) + ['day', 'tag:<key>'])}")
+
+
+def _as_date_scalar(value, dataset):
+    value = date.fromisoformat(value) if isinstance(value, str) else value
+    field_type = dataset.schema.field(START_COLUMN).type
+    if pa.types.is_timestamp(field_type):
+        moment = datetime(value.year, value.month, value.day)
+        return pa.scalar(moment, pa.timestamp("s", tz=field_type.tz)).cast(field_type)
+    return pa.scalar(value, pa.date32()).cast(field_type)
+
+
+def query_cur(group_by=("service",), filters=None, start_date=None, end_date=None,
+              limit=DEFAULT_LIMIT, cur_dir=CUR_DIR, dataset=None):
+    """Return unblended cost summed by ``group_by`` as a DataFrame, largest first.
+
+    ``filters`` maps dimensions (same names as ``group_by``) to a value or a
+    list of values. ``start_date`` is inclusive and ``end_date`` exclusive.
+    """
+    dataset = dataset or open_cur_dataset(cur_dir)
+    filters = filters or {}
+    group_by = list(group_by)
+
+    # Column pruning: only grouped, filtered and cost columns are read
+    wanted = {COST_COLUMN}
+    columns = {}
+    for name in set(group_by) | set(filters):
+        column = _dimension_column(dataset, name)
+        columns[name] = column
+        wanted.add(column or TAG_MAP_COLUMN)
+    if start_date or end_date:
+        wanted.add(START_COLUMN)
+
+    # Predicate pushdown for everything that maps to a plain column
+    condition = None
+
+    def add(expression):
+        nonlocal condition
+        condition = expression if condition is None else condition & expression
+
+    for name, value in filters.items():
+        column = columns[name]
+        if column is None or name == "day":
+            continue
+        values = value if isinstance(value, (list, tuple)) else [value]
+        add(ds.field(column).isin(values))
+    if start_date:
+        add(ds.field(START_COLUMN) >= _as_date_scalar(start_date, dataset))
+    if end_date:
+        add(ds.field(START_COLUMN) < _as_date_scalar(end_date, dataset))
+
+    table = dataset.to_table(columns=sorted(wanted), filter=condition)
+
+    # Derived columns: tags from the map column, and the usage day
+    keys = []
+    for name in group_by + [f for f in filters if f not in group_by]:
+        column = columns[name]
+        key = name.replace(":", "_")
+        if column is None:
+            values = pc.map_lookup(table[TAG_MAP_COLUMN], f"user_{name[len('tag:'):]}", "first")
+        elif name == "day":
+            values = pc.cast(table[column], pa.date32()) if pa.types.is_timestamp(table[column].type) else table[column]
+        else:
+            values = table[column]
+        table = table.append_column(key, values)
+        if name in filters and (column is None or name == "day"):
+            wanted_values = filters[name] if isinstance(filters[name], (list, tuple)) else [filters[name]]
+            if name == "day":
+                wanted_values = [date.fromisoformat(str(v)) for v in wanted_values]
+            table = table.filter(pc.is_in(table[key], pa.array(wanted_values, type=table[key].type)))
+        if name in group_by:
+            keys.append(key)
+
+    totals = table.group_by(keys).aggregate([(COST_COLUMN, "sum")])
+    df = totals.to_pandas().rename(columns={f"{COST_COLUMN}_sum": "cost"})
+    df = df.sort_values("cost", ascending=False).reset_index(drop=True)
+    return df[keys + ["cost"]].head(limit) if limit else df[keys + ["cost"]]
+
+
+def query_cur_spend(group_by: str = "service", service: str = "", account: str = "",
+                    usage_type: str = "", tag: str = "", start_date: str = "",
+                    end_date: str = "", limit: int = DEFAULT_LIMIT):
+    """Summarise AWS spend from the local Cost and Usage Report.
+
+    group_by: comma-separated dimensions from service, account, usage_type,
+    region, instance_type, day or tag:<key> (e.g. "service,day" or "tag:team").
+    service, account, usage_type: optional exact-match filters.
+    tag: optional tag filter written as "key=value".
+    start_date, end_date: optional YYYY-MM-DD bounds (end is exclusive).
+    Returns a table of unblended cost, largest first.
+    """
+    if not os.path.isdir(CUR_DIR):
+        return f"No Cost and Usage Report files found in {CUR_DIR}."
+    filters = {}
+    for name, value in (("service", service), ("account", account), ("usage_type", usage_type)):
+        if value:
+            filters[name] = value
+    if tag:
+        key, _, value = tag.partition("=")
+        filters[f"tag:{key.strip()}"] = value.strip()
+    dimensions = [d.strip() for d in group_by.split(",") if d.strip()]
+    try:
+        df = query_cur(dimensions, filters, start_date or None, end_date or None, limit)
+    except (ValueError, pa.ArrowInvalid) as e:
+        return f"Could not query the Cost and Usage Report: {e}"
+    if df.empty:
+        return "No matching line items."
+    return df
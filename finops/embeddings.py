@@ -0,0 +1,189 @@
+"""Embedding backends for the chat index, with an on-disk embedding cache.
+
+The backend is chosen with ``FINOPS_EMBED_BACKEND``:
+
+    openai   OpenAI embeddings over the network (the default)
+    local    a sentence-transformers model on the CPU, named by
+             FINOPS_EMBED_MODEL (needs llama-index-embeddings-huggingface)
+    hash     a deterministic hashed bag of words; no model, no network,
+             for offline runs and benchmarks
+
+Whatever the backend, ``get_embed_model`` wraps it in ``CachedEmbedding``.
+Each batch of chunks is hashed, every vector already in the cache is read back
+in one query, only the misses go to the model, and the results are
+normalised together with NumPy before they are stored. Re-indexing unchanged
+text therefore never calls the model again, even after the index itself has
+been rebuilt.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import zlib
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+from finops.tracing import tracer
+
+CACHE_PATH = "storage/embedding_cache.sqlite"
+DEFAULT_LOCAL_MODEL = "BAAI/bge-small-en-v1.5"
+DEFAULT_OPENAI_MODEL = "text-embedding-ada-002"
+BATCH_SIZE = 256
+LOOKUP_CHUNK = 500  # keys per SELECT, under SQLite's bound-parameter limit
+
+
+class HashEmbedding(BaseEmbedding):
+    """Deterministic bag-of-words embedding, hashed into ``embed_dim`` buckets"""
+
+    embed_dim: int = 256
+
+    @classmethod
+    def class_name(cls):
+        return "HashEmbedding"
+
+    def _embed(self, text):
+        vector = np.zeros(self.embed_dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            bucket = zlib.crc32(token.encode())
+            vector[bucket % self.embed_dim] += 1.0 if bucket & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _get_query_embedding(self, query):
+        return self._embed(query)
+
+    def _get_text_embedding(self, text):
+        return self._embed(text)
+
+    async def _aget_query_embedding(self, query):
+        return self._embed(query)
+
+
+def _normalise(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class EmbeddingCache:
+    """SQLite table of float32 vectors keyed by a hash of model and text"""
+
+    def __init__(self, path=CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # One connection shared by the indexing and session threads
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB)")
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[start:start + LOOKUP_CHUNK]
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                )
+                found.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+        return found
+
+    def put_many(self, items):
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO vectors VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items],
+            )
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(path=CACHE_PATH):
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = EmbeddingCache(path)
+        return _caches[path]
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Wraps an embedding model with the on-disk cache and batched normalisation.
+
+    ``model_name`` identifies the backend and model, so vectors from different
+    models never mix in the cache or in one index.
+    """
+
+    model: BaseEmbedding = Field(exclude=True)
+    cache_path: str = CACHE_PATH
+    embed_batch_size: int = BATCH_SIZE
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._cache = get_cache(self.cache_path)
+
+    @classmethod
+    def class_name(cls):
+        return "CachedEmbedding"
+
+    def _key(self, kind, text):
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode()).hexdigest()
+
+    def _embed_batch(self, kind, texts, compute):
+        keys = [self._key(kind, text) for text in texts]
+        cached = self._cache.get_many(keys)
+        # Repeated chunks (boilerplate, headers) are embedded once
+        missing = {key: text for key, text in zip(keys, texts) if key not in cached}
+        if missing:
+            missing_texts = list(missing.values())
+            batch_size = getattr(self.model, "embed_batch_size", BATCH_SIZE)
+            computed = []
+            for start in range(0, len(missing_texts), batch_size):
+                computed.extend(compute(missing_texts[start:start + batch_size]))
+            new = dict(zip(missing, _normalise(computed)))
+            self._cache.put_many(new.items())
+            cached.update(new)
+        tracer.increment("embed.cache_hits", len(texts) - len(missing))
+        tracer.increment("embed.cache_misses", len(missing))
+        return [cached[key].tolist() for key in keys]
+
+    def _get_text_embeddings(self, texts):
+        return self._embed_batch("text", texts, self.model._get_text_embeddings)
+
+    def _get_text_embedding(self, text):
+        return self._get_text_embeddings([text])[0]
+
+    def _get_query_embedding(self, query):
+        return self._embed_batch("query", [query], lambda queries: [self.model._get_query_embedding(queries[0])])[0]
+
+    async def _aget_query_embedding(self, query):
+        return self._get_query_embedding(query)
+
+
+def _backend_model(backend, model_name):
+    if backend == "hash":
+        return HashEmbedding(), "hash:256"
+    if backend == "local":
+        try:
+            from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+        except ImportError as e:
+            raise ImportError(
+                "The local embedding backend needs llama-index-embeddings-huggingface"
+            ) from e
+        model_name = model_name or DEFAULT_LOCAL_MODEL
+        return HuggingFaceEmbedding(model_name=model_name, device="cpu"), f"local:{model_name}"
+    if backend == "openai":
+        from llama_index.embeddings.openai import OpenAIEmbedding
+        model_name = model_name or DEFAULT_OPENAI_MODEL
+        return OpenAIEmbedding(model=model_name), f"openai:{model_name}"
+    raise ValueError(f"Unknown embedding backend {backend!r}; expected openai, local or hash")
+
+
+def get_embed_model(backend=None, model_name=None, cache_path=CACHE_PATH):
+    """Return the configured embedding model, wrapped in the embedding cache"""
+    backend = backend or os.environ.get("FINOPS_EMBED_BACKEND", "openai")
+    model_name = model_name or os.environ.get("FINOPS_EMBED_MODEL")
+    model, model_id = _backend_model(backend, model_name)
+    return CachedEmbedding(model=model, model_name=model_id, cache_path=cache_path)
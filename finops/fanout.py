@@ -0,0 +1,241 @@
+"""Concurrent fan-out of scans across accounts and regions.
+
+Each (account, region) target runs on a shared thread pool with its own
+clients from the client factory. Accounts are reached by assuming a role into
+them, and the temporary credentials are cached until shortly before they
+expire. A semaphore per AWS service caps how many targets use that service at
+once across the whole process, so Cost Explorer's low rate limit holds however
+many regions are scanned.
+
+Results are yielded as each target finishes. A target that fails, or is still
+running when the deadline passes, is reported on its own and never holds up
+the others.
+"""
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+
+import pandas as pd
+
+from finops.aws_clients import get_client
+from finops.cache import TTLCache
+from finops.cost_queries import (
+    NO_ANOMALIES,
+    NO_COSTS,
+    NOT_ENOUGH_HISTORY,
+    get_family_usage,
+    get_spend_anomalies,
+    get_top_rds_ec2_costs,
+)
+from finops.rds_scan import scan_inactive_instances
+from finops.tracing import span
+from finops.warehouse import get_account_id
+
+MAX_WORKERS = 16
+# Targets allowed to use a service at the same time, process-wide
+SERVICE_LIMITS = {"ce": 2, "rds": 8, "cloudwatch": 8}
+DEFAULT_SERVICE_LIMIT = 4
+ROLE_SESSION_NAME = "finops-chatbot"
+ROLE_DURATION = 3600
+DEFAULT_TIMEOUT = 300
+
+INACTIVE_COLUMNS = ["DB Instance", "Master Username", "Creator Email", "Tagged for Deletion", "DB Instance ARN"]
+
+Target = namedtuple("Target", ["account_id", "region"])
+TargetResult = namedtuple("TargetResult", ["target", "data", "error", "seconds"])
+
+# Refreshed ten minutes before the assumed-role credentials run out
+_role_credentials = TTLCache(maxsize=512, ttl=ROLE_DURATION - 600)
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+def _service_semaphore(service):
+    with _semaphores_lock:
+        if service not in _semaphores:
+            _semaphores[service] = threading.BoundedSemaphore(SERVICE_LIMITS.get(service, DEFAULT_SERVICE_LIMIT))
+        return _semaphores[service]
+
+
+def parse_list(text):
+    """Split a comma or whitespace separated list, as typed into a text box"""
+    return [item for item in text.replace(",", " ").split() if item]
+
+
+class FanOut:
+    """Runs a task against many (account, region) targets in parallel.
+
+    ``base_credentials`` are the keyword arguments for ``get_client``
+    (aws_access_key_id, aws_secret_access_key, aws_session_token). With a
+    ``role_name`` every account is entered by assuming that role; without one
+    the base credentials are used directly, for their own account only.
+    """
+
+    def __init__(self, base_credentials, role_name=None, max_workers=MAX_WORKERS):
+        self.base_credentials = base_credentials
+        self.role_name = role_name
+        self.max_workers = max_workers
+
+    def home_account(self):
+        return get_account_id(
+            self.base_credentials.get("aws_access_key_id"),
+            self.base_credentials.get("aws_secret_access_key"),
+            None,
+            self.base_credentials.get("aws_session_token"),
+        )
+
+    def targets(self, accounts, regions):
+        # Without a role to assume only the credentials' own account is reachable
+        if not accounts or not self.role_name:
+            accounts = [self.home_account()]
+        return [Target(account_id, region) for account_id in accounts for region in regions]
+
+    def credentials(self, account_id):
+        """Return client credentials for ``account_id``, assuming the role if needed"""
+        if not self.role_name:
+            return self.base_credentials
+        role_arn = f"arn:aws:iam::{account_id}:role/{self.role_name}"
+
+        def assume():
+            sts = get_client("sts", **self.base_credentials)
+            with span("fanout.assume_role", account=account_id):
+                response = sts.assume_role(
+                    RoleArn=role_arn, RoleSessionName=ROLE_SESSION_NAME, DurationSeconds=ROLE_DURATION
+                )
+            credentials = response["Credentials"]
+            return {
+                "aws_access_key_id": credentials["AccessKeyId"],
+                "aws_secret_access_key": credentials["SecretAccessKey"],
+                "aws_session_token": credentials["SessionToken"],
+            }
+
+        key = (role_arn, self.base_credentials.get("aws_access_key_id"))
+        return _role_credentials.get_or_compute(key, assume)
+
+    def client(self, target, service):
+        return get_client(service, region_name=target.region, **self.credentials(target.account_id))
+
+    def run(self, targets, task, services=(), timeout=DEFAULT_TIMEOUT):
+        """Yield a TargetResult per target as ``task(fanout, target)`` finishes.
+
+        ``services`` are the AWS services the task calls; their semaphores are
+        held while it runs. Targets still running after ``timeout`` seconds are
+        yielded with a timeout error and left to finish in the background.
+        """
+        semaphores = [_service_semaphore(service) for service in sorted(services)]
+
+        def run_target(target):
+            started = time.perf_counter()
+            # Acquired in a fixed order so tasks needing several services can't deadlock
+            for semaphore in semaphores:
+                semaphore.acquire()
+            try:
+                with span(f"fanout.{task.__name__}", account=target.account_id, region=target.region):
+                    data = task(self, target)
+                return TargetResult(target, data, None, time.perf_counter() - started)
+            except Exception as e:
+                return TargetResult(target, None, f"{type(e).__name__}: {e}", time.perf_counter() - started)
+            finally:
+                for semaphore in reversed(semaphores):
+                    semaphore.release()
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = {executor.submit(run_target, target): target for target in targets}
+        pending = set(futures)
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                pending.discard(future)
+                yield future.result()
+        except TimeoutError:
+            for future in pending:
+                future.cancel()
+                yield TargetResult(futures[future], None, f"Timed out after {timeout}s", timeout)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def merge_results(results):
+    """Yield (all rows so far, latest TargetResult) as results arrive.
+
+    Rows from every target are combined into one DataFrame with Account and
+    Region columns in front.
+    """
+    frames = []
+    merged = pd.DataFrame()
+    for result in results:
+        if result.data is not None and len(result.data):
+            frames.append(result.data.assign(
+                Account=result.target.account_id, Region=result.target.region,
+            ))
+            merged = pd.concat(frames, ignore_index=True)
+            merged = merged[["Account", "Region"] + [c for c in merged.columns if c not in ("Account", "Region")]]
+        yield merged, result
+
+
+def _tag_value(tag_list, key):
+    return next((tag["Value"] for tag in tag_list or [] if tag["Key"] == key), None)
+
+
+def inactive_rds_instances(fanout, target):
+    """RDS instances in one account and region with no connections in 30 days.
+
+    The ARN and the tags come from the describe_db_instances response.
+    """
+    rows = [
+        {
+            "DB Instance": instance["DBInstanceIdentifier"],
+            "Master Username": instance.get("MasterUsername"),
+            "Creator Email": _tag_value(instance.get("TagList"), "CreatorEmail"),
+            "Tagged for Deletion": _tag_value(instance.get("TagList"), "for_deletion") == "true",
+            "DB Instance ARN": instance["DBInstanceArn"],
+        }
+        for batch in scan_inactive_instances(
+            fanout.client(target, "rds"), fanout.client(target, "cloudwatch"), days=30, max_workers=2
+        )
+        for instance in batch
+    ]
+    return pd.DataFrame(rows, columns=INACTIVE_COLUMNS)
+
+
+def top_instances(fanout, target, force=False):
+    """Top RDS and EC2 instance types by cost in one account and region, with reserved prices"""
+    credentials = fanout.credentials(target.account_id)
+    top, error = get_top_rds_ec2_costs(
+        credentials.get("aws_access_key_id"), credentials.get("aws_secret_access_key"), target.region,
+        include_reserved=True, region_only=True,
+        aws_session_token=credentials.get("aws_session_token"), force=force,
+    )
+    if error == NO_COSTS:
+        return pd.DataFrame()
+    if error:
+        raise RuntimeError(error)
+    return top
+
+
+def family_usage(fanout, target, force=False):
+    """Daily On-Demand spend per instance family in one account and region"""
+    credentials = fanout.credentials(target.account_id)
+    usage, error = get_family_usage(
+        credentials.get("aws_access_key_id"), credentials.get("aws_secret_access_key"), target.region,
+        region_only=True, aws_session_token=credentials.get("aws_session_token"), force=force,
+    )
+    if error == NO_COSTS:
+        return pd.DataFrame()
+    if error:
+        raise RuntimeError(error)
+    return usage
+
+
+def spend_anomalies(fanout, target):
+    """Daily spend spikes per service and usage type in one account"""
+    credentials = fanout.credentials(target.account_id)
+    found, error = get_spend_anomalies(
+        credentials.get("aws_access_key_id"), credentials.get("aws_secret_access_key"), target.region,
+        aws_session_token=credentials.get("aws_session_token"),
+    )
+    if error in (NO_COSTS, NO_ANOMALIES, NOT_ENOUGH_HISTORY):
+        return pd.DataFrame()
+    if error:
+        raise RuntimeError(error)
+    return found
@@ -0,0 +1,162 @@
+"""Vectorised trend-plus-seasonality forecasts for reservation sizing.
+
+Every series (one row of an N x T usage matrix) is fitted with the same
+linear model
+
+    y_t = a + b * t + sum_k (c_k * sin(2 pi k t / p) + d_k * cos(2 pi k t / p))
+
+for each seasonal period p (7 for daily data; 24 and 168 for hourly data).
+The design matrix X is shared, so ordinary least squares for all series is
+one product with (X'X)^-1 X', and the residual spread gives each series a
+prediction interval that widens with the leverage of the forecast step:
+
+    sd_h = sigma * sqrt(1 + x_h (X'X)^-1 x_h')
+
+The baseline commitment is the lowest lower bound over the whole term: the
+usage the family is expected to stay above from the first hour of the term
+to the last, whether it is growing, flat or shrinking. Series are processed
+in chunks so the (series x horizon) forecast paths stay bounded.
+"""
+from collections import namedtuple
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from finops.anomalies import to_matrix
+
+ForecastResult = namedtuple(
+    "ForecastResult",
+    [
+        "mean",        # (N,) average forecast per step over the horizon
+        "lower",       # (N,) lower bound of that average
+        "upper",       # (N,) upper bound of that average
+        "trend",       # (N,) fitted change per step
+        "sigma",       # (N,) residual standard deviation
+        "commitment",  # (N,) lowest per-step lower bound over the horizon, at least 0
+        "paths",       # (mean, lower, upper), each (N, horizon), or None
+    ],
+)
+
+DAILY_PERIODS = (7,)
+HOURLY_PERIODS = (24, 168)
+HARMONICS = 3
+COVERAGE = 0.8
+HISTORY_DAYS = 182  # 26 whole weeks of daily spend to fit on
+MIN_HISTORY = 14  # steps; shorter series can't separate trend from the weekly cycle
+MAX_CHUNK_CELLS = 4_000_000  # series x horizon values held at once
+
+
+def design_matrix(start, steps, history, periods=DAILY_PERIODS, harmonics=HARMONICS):
+    """Rows of X for steps ``start`` .. ``start + steps - 1``.
+
+    Time is scaled by the ``history`` length so the trend column stays in the
+    same range as the others.
+    """
+    t = np.arange(start, start + steps, dtype=np.float64)
+    columns = [np.ones_like(t), t / history]
+    for period in periods:
+        for k in range(1, min(harmonics, period // 2) + 1):
+            angle = 2 * np.pi * k * t / period
+            columns.append(np.cos(angle))
+            if 2 * k != period:  # sin is all zeros at the Nyquist frequency
+                columns.append(np.sin(angle))
+    return np.column_stack(columns)
+
+
+def forecast_matrix(usage, horizon, periods=DAILY_PERIODS, harmonics=HARMONICS, coverage=COVERAGE,
+                    return_paths=False, dtype=np.float64):
+    """Fit every row of ``usage`` (series x steps) and forecast ``horizon`` steps ahead.
+
+    Missing steps count as no usage. The per-step paths hold N x horizon
+    values each, so they are only returned when ``return_paths`` is set.
+    """
+    usage = np.nan_to_num(np.asarray(usage, dtype=dtype))
+    if usage.ndim == 1:
+        usage = usage[None, :]
+    n_series, history = usage.shape
+    if history < MIN_HISTORY:
+        raise ValueError(f"Need at least {MIN_HISTORY} steps of history, got {history}")
+    x = design_matrix(0, history, history, periods, harmonics)
+    x_future = design_matrix(history, horizon, history, periods, harmonics)
+    xtx_inv = np.linalg.pinv(x.T @ x)
+    z = NormalDist().inv_cdf((1 + coverage) / 2)
+
+    # All series share X, so the fit is two matrix products
+    coefficients = usage @ (x @ xtx_inv)  # (N, p)
+    residuals = usage - coefficients @ x.T
+    sigma = np.sqrt((residuals ** 2).sum(axis=1) / max(history - x.shape[1], 1))
+    trend = coefficients[:, 1] / history
+
+    # Leverage of each forecast step, and of the average over the horizon
+    step_leverage = np.einsum("hp,pq,hq->h", x_future, xtx_inv, x_future)
+    x_average = x_future.mean(axis=0)
+    average_sd = sigma * np.sqrt(1 / horizon + x_average @ xtx_inv @ x_average)
+    mean = coefficients @ x_average
+
+    commitment = np.empty(n_series, dtype=dtype)
+    paths = [np.empty((n_series, horizon), dtype=dtype) for _ in range(3)] if return_paths else None
+    step_sd = np.sqrt(1 + step_leverage)
+    chunk = max(1, MAX_CHUNK_CELLS // horizon)
+    for start in range(0, n_series, chunk):
+        rows = slice(start, start + chunk)
+        path_mean = coefficients[rows] @ x_future.T
+        half_width = z * sigma[rows, None] * step_sd
+        path_lower = path_mean - half_width
+        commitment[rows] = np.maximum(path_lower.min(axis=1), 0)
+        if return_paths:
+            paths[0][rows] = np.maximum(path_mean, 0)
+            paths[1][rows] = np.maximum(path_lower, 0)
+            paths[2][rows] = np.maximum(path_mean + half_width, 0)
+
+    return ForecastResult(
+        mean=np.maximum(mean, 0),
+        lower=np.maximum(mean - z * average_sd, 0),
+        upper=np.maximum(mean + z * average_sd, 0),
+        trend=trend,
+        sigma=sigma,
+        commitment=commitment,
+        paths=tuple(paths) if return_paths else None,
+    )
+
+
+def forecast_usage(usage, keys, horizon_days, coverage=COVERAGE, date_column="date", value_column="cost"):
+    """Forecast long daily ``usage`` rows for every series identified by ``keys``.
+
+    Returns one row per series with its recent and forecast spend per hour,
+    the interval of the forecast, the trend per 30 days and the baseline
+    commitment per hour, largest commitment first. Raises ValueError when
+    the rows span fewer than MIN_HISTORY days.
+    """
+    series, _, matrix = to_matrix(usage, list(keys), date_column, value_column)
+    result = forecast_matrix(matrix, horizon_days, coverage=coverage)
+    hourly = 1 / 24
+    forecast = series.assign(**{
+        "Recent ($/hour)": matrix[:, -28:].mean(axis=1) * hourly,
+        "Forecast ($/hour)": result.mean * hourly,
+        "Low ($/hour)": result.lower * hourly,
+        "High ($/hour)": result.upper * hourly,
+        "Trend ($/hour per 30 days)": result.trend * 30 * hourly,
+        "Baseline commitment ($/hour)": result.commitment * hourly,
+    })
+    return forecast.sort_values("Baseline commitment ($/hour)", ascending=False, ignore_index=True)
+
+
+def forecast_series(daily, horizon_days, coverage=COVERAGE, start=None, end=None):
+    """History and forecast of one daily series (indexed by date) in $/hour, for a chart.
+
+    Days from ``start`` to ``end`` without a row count as no spend, so a
+    family launched recently is fitted over the same days as the others.
+    """
+    daily = daily.copy()
+    daily.index = pd.to_datetime(daily.index)
+    days = pd.date_range(start or daily.index.min(), end or daily.index.max(), freq="D")
+    daily = daily.groupby(level=0).sum().reindex(days, fill_value=0.0)
+    result = forecast_matrix(daily.to_numpy(), horizon_days, coverage=coverage, return_paths=True)
+    mean, lower, upper = (path[0] / 24 for path in result.paths)
+    future = pd.date_range(daily.index[-1] + pd.Timedelta(days=1), periods=horizon_days, freq="D")
+    return pd.concat([
+        pd.DataFrame({"History": daily.to_numpy() / 24}, index=daily.index),
+        pd.DataFrame({"Forecast": mean, "Low": lower, "High": upper,
+                      "Baseline commitment": result.commitment[0] / 24}, index=future),
+    ], axis=1)
@@ -0,0 +1,310 @@
+"""Persistent vector index for the FinOps chat app.
+
+The index is saved under ``storage/`` and reloaded on startup. A manifest of
+file content hashes records which documents came from which file, so only
+added or changed files are re-chunked and re-embedded, and nodes belonging to
+changed or deleted files are removed. The manifest also keeps each file's
+modification time and size, so unchanged files aren't read to be hashed.
+
+Changed files are parsed and chunked in a pool of worker processes, and each
+file's nodes are embedded and inserted as soon as they arrive, while the
+rest are still being parsed.
+
+Vectors are kept as float32 by llama_index's default store, or as float16 or
+int8 in ``QuantizedVectorStore`` when ``FINOPS_VECTOR_DTYPE`` says so. The
+embedding model and vector type the index was built with are saved beside
+it; if either changes, the index is rebuilt (from the embedding cache, so
+unchanged text isn't embedded again).
+
+``FINOPS_VECTOR_INDEX=hnsw`` or ``ivf`` keeps the vectors in a FAISS
+approximate nearest-neighbour index instead of searching all of them, for
+corpora too large for exact search. It is rebuilt the same way.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from llama_index.core import (
+    Settings,
+    SimpleDirectoryReader,
+    StorageContext,
+    VectorStoreIndex,
+    load_index_from_storage,
+)
+from llama_index.core.node_parser import SentenceSplitter
+
+from finops.tracing import span, traced, tracer
+from finops.vector_store import ANN_KINDS, FaissVectorStore, QuantizedVectorStore, store_path
+
+DATA_DIR = "pages/data"
+PERSIST_DIR = "storage/chat_index"
+MANIFEST_FILE = "manifest.json"
+CONFIG_FILE = "index_config.json"
+VECTOR_DTYPE = os.environ.get("FINOPS_VECTOR_DTYPE", "float32")
+VECTOR_INDEX = os.environ.get("FINOPS_VECTOR_INDEX", "exact")
+INGEST_WORKERS = int(os.environ.get("FINOPS_INGEST_WORKERS", os.cpu_count() or 1))
+# Worker processes take seconds to start (each imports llama_index), which
+# only pays off for this much text or more
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+CHECKPOINT_SECONDS = 60  # persist progress this often during a long build
+
+
+def file_hash(path):
+    """Return the sha256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_corpus(data_dir=DATA_DIR, manifest=None):
+    """Return {path relative to data_dir: {hash, mtime_ns, size}} for every file in the corpus.
+
+    Files whose modification time and size match their ``manifest`` entry
+    keep the recorded hash instead of being read again.
+    """
+    manifest = manifest or {}
+    files = {}
+    for root, dirs, names in os.walk(data_dir):
+        # Skip hidden directories and files, as SimpleDirectoryReader does
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in names:
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, data_dir)
+            stat = os.stat(path)
+            known = manifest.get(relative, {})
+            if (known.get("mtime_ns"), known.get("size")) == (stat.st_mtime_ns, stat.st_size):
+                digest = known["hash"]
+            else:
+                digest = file_hash(path)
+            files[relative] = {"hash": digest, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    return files
+
+
+def load_manifest(persist_dir=PERSIST_DIR):
+    path = os.path.join(persist_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, persist_dir=PERSIST_DIR):
+    os.makedirs(persist_dir, exist_ok=True)
+    path = os.path.join(persist_dir, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def index_config(vector_dtype=VECTOR_DTYPE, vector_index=VECTOR_INDEX):
+    """The settings an index is only valid for"""
+    return {
+        "embed_model": Settings.embed_model.model_name,
+        "vector_dtype": vector_dtype,
+        "vector_index": vector_index,
+    }
+
+
+def load_index_config(persist_dir=PERSIST_DIR):
+    path = os.path.join(persist_dir, CONFIG_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_index_config(config, persist_dir=PERSIST_DIR):
+    os.makedirs(persist_dir, exist_ok=True)
+    with open(os.path.join(persist_dir, CONFIG_FILE), "w") as f:
+        json.dump(config, f, indent=2, sort_keys=True)
+
+
+def manifest_version(persist_dir=PERSIST_DIR):
+    """Return a short fingerprint of the indexed corpus.
+
+    It changes whenever a file is added, changed or removed, or the index is
+    rebuilt with another embedding model or vector store, so caches of answers
+    built from the index can tell when they are out of date.
+    """
+    manifest = load_manifest(persist_dir)
+    digest = hashlib.sha256()
+    digest.update(json.dumps(load_index_config(persist_dir), sort_keys=True).encode())
+    for path in sorted(manifest):
+        digest.update(f"{path}:{manifest[path]['hash']}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def diff_corpus(current, manifest):
+    """Compare current hashes against the manifest.
+
+    Returns (changed, removed): files that are new or whose content changed,
+    and files that are in the manifest but no longer on disk.
+    """
+    changed = sorted(
+        path for path, state in current.items()
+        if manifest.get(path, {}).get("hash") != state["hash"]
+    )
+    removed = sorted(path for path in manifest if path not in current)
+    return changed, removed
+
+
+def _record_stats(manifest, current):
+    """Copy current mtimes and sizes into the manifest; return whether any differed"""
+    stale = False
+    for path, entry in manifest.items():
+        state = current.get(path)
+        if state and (entry.get("mtime_ns"), entry.get("size")) != (state["mtime_ns"], state["size"]):
+            entry["mtime_ns"], entry["size"] = state["mtime_ns"], state["size"]
+            stale = True
+    return stale
+
+
+def corpus_changed(data_dir=DATA_DIR, persist_dir=PERSIST_DIR):
+    """Whether ``load_or_build_index`` has anything to do, judged from the manifest alone"""
+    manifest = load_manifest(persist_dir)
+    current = scan_corpus(data_dir, manifest)
+    changed, removed = diff_corpus(current, manifest)
+    return bool(changed or removed) or _record_stats(manifest, current)
+
+
+def parse_file(data_dir, path, chunk_size, chunk_overlap):
+    """Read and chunk one file of the corpus. Runs in a worker process.
+
+    Returns (path, [(doc id, doc hash)], nodes without embeddings, seconds).
+    """
+    start = time.perf_counter()
+    docs = SimpleDirectoryReader(input_files=[os.path.join(data_dir, path)], filename_as_id=True).load_data()
+    splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    nodes = splitter.get_nodes_from_documents(docs)
+    return path, [(doc.doc_id, doc.hash) for doc in docs], nodes, time.perf_counter() - start
+
+
+def parse_files(data_dir, sizes, workers=INGEST_WORKERS):
+    """Yield ``parse_file`` results for ``sizes`` ({path: bytes}) as they finish"""
+    chunking = (Settings.chunk_size, Settings.chunk_overlap)
+    workers = min(workers, len(sizes))
+    if workers <= 1 or sum(sizes.values()) < PARALLEL_MIN_BYTES:
+        for path in sizes:
+            yield parse_file(data_dir, path, *chunking)
+        return
+    # spawn rather than fork: the Streamlit server has threads running
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        # Largest first, so one big file doesn't start last and hold up the end
+        futures = [
+            pool.submit(parse_file, data_dir, path, *chunking)
+            for path in sorted(sizes, key=sizes.get, reverse=True)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def _vector_store_class(config):
+    """The vector store for ``config``, or None for llama_index's default"""
+    if config["vector_index"] in ANN_KINDS:
+        return FaissVectorStore
+    if config["vector_index"] != "exact":
+        raise ValueError(
+            f"Unknown vector index {config['vector_index']!r}; expected exact, {', '.join(ANN_KINDS)}"
+        )
+    return QuantizedVectorStore if config["vector_dtype"] != "float32" else None
+
+
+def _new_index(config):
+    store_class = _vector_store_class(config)
+    if store_class is None:
+        return VectorStoreIndex(nodes=[])
+    if store_class is FaissVectorStore:
+        vector_store = FaissVectorStore(kind=config["vector_index"], dtype=config["vector_dtype"])
+    else:
+        vector_store = QuantizedVectorStore(dtype=config["vector_dtype"])
+    storage_context = StorageContext.from_defaults(vector_store=vector_store)
+    return VectorStoreIndex(nodes=[], storage_context=storage_context)
+
+
+def _load_index(persist_dir, config):
+    if not os.path.exists(os.path.join(persist_dir, "docstore.json")):
+        return None
+    # Indexes saved before the config existed were float32 with the current model
+    saved = load_index_config(persist_dir) or {"embed_model": config["embed_model"], "vector_dtype": "float32"}
+    # ... and those saved before FAISS support were searched exactly
+    saved.setdefault("vector_index", "exact")
+    if saved != config:
+        return None
+    vector_store = None
+    store_class = _vector_store_class(config)
+    if store_class is not None:
+        if not os.path.exists(store_path(persist_dir)):
+            return None
+        vector_store = store_class.from_persist_dir(persist_dir)
+    storage_context = StorageContext.from_defaults(persist_dir=persist_dir, vector_store=vector_store)
+    return load_index_from_storage(storage_context)
+
+
+def _persist(index, manifest, config, persist_dir):
+    with span("index.persist"):
+        index.storage_context.persist(persist_dir=persist_dir)
+        save_manifest(manifest, persist_dir)
+        save_index_config(config, persist_dir)
+
+
+@traced("index.load_or_build")
+def load_or_build_index(data_dir=DATA_DIR, persist_dir=PERSIST_DIR, vector_dtype=VECTOR_DTYPE,
+                        vector_index=VECTOR_INDEX, workers=INGEST_WORKERS):
+    """Load the persisted index and bring it up to date with ``data_dir``.
+
+    Only files whose content hash differs from the manifest are parsed and
+    embedded. If nothing changed, the index is returned straight from disk.
+    """
+    config = index_config(vector_dtype, vector_index)
+    manifest = load_manifest(persist_dir)
+    with span("index.scan"):
+        current = scan_corpus(data_dir, manifest)
+    with span("index.load"):
+        index = _load_index(persist_dir, config)
+    if index is None:
+        index = _new_index(config)
+        manifest = {}
+
+    changed, removed = diff_corpus(current, manifest)
+    if not changed and not removed:
+        if _record_stats(manifest, current):
+            save_manifest(manifest, persist_dir)
+        return index
+
+    for path in removed:
+        for doc_id in manifest.pop(path)["doc_ids"]:
+            index.delete_ref_doc(doc_id, delete_from_docstore=True)
+
+    # Embed and insert each file's nodes as soon as its worker has chunked them
+    checkpoint = time.monotonic()
+    sizes = {path: current[path]["size"] for path in changed}
+    for path, docs, nodes, seconds in parse_files(data_dir, sizes, workers):
+        tracer.record("index.parse", seconds, file=path, nodes=len(nodes))
+        # The old nodes stay searchable until the new ones are ready
+        for doc_id in manifest.pop(path, {}).get("doc_ids", []):
+            index.delete_ref_doc(doc_id, delete_from_docstore=True)
+        with span("index.insert", file=path, nodes=len(nodes)):
+            index.insert_nodes(nodes)
+            for doc_id, doc_hash in docs:
+                index.docstore.set_document_hash(doc_id, doc_hash)
+        manifest[path] = dict(current[path], doc_ids=[doc_id for doc_id, _ in docs])
+        # Files not reached yet still have their old entries and nodes, so
+        # the checkpoint is consistent
+        if time.monotonic() - checkpoint > CHECKPOINT_SECONDS:
+            _persist(index, manifest, config, persist_dir)
+            checkpoint = time.monotonic()
+
+    _record_stats(manifest, current)
+    _persist(index, manifest, config, persist_dir)
+    return index
@@ -0,0 +1,62 @@
+"""Bring the chat index up to date from the command line.
+
+Only files added, changed or deleted since the last run are processed, the
+same as when the app starts, so a large corpus can be indexed ahead of time
+or kept current while documents are dropped into it:
+
+    python -m finops.ingest                  # update storage/chat_index once
+    python -m finops.ingest --watch          # and again whenever pages/data changes
+    python -m finops.ingest --workers 8
+
+The embedding backend and vector store come from the same environment
+variables as the app.
+"""
+import argparse
+import time
+
+from llama_index.core import Settings
+
+from finops.embeddings import get_embed_model
+from finops.index_store import (
+    DATA_DIR,
+    INGEST_WORKERS,
+    PERSIST_DIR,
+    corpus_changed,
+    load_or_build_index,
+    manifest_version,
+)
+
+WATCH_INTERVAL = 5.0
+
+
+def ingest(data_dir=DATA_DIR, persist_dir=PERSIST_DIR, workers=INGEST_WORKERS):
+    before = manifest_version(persist_dir)
+    start = time.perf_counter()
+    index = load_or_build_index(data_dir, persist_dir, workers=workers)
+    if manifest_version(persist_dir) == before:
+        print(f"{data_dir} is already indexed")
+    else:
+        print(f"Indexed {data_dir}: {len(index.docstore.docs)} chunks in {time.perf_counter() - start:.1f} s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--persist-dir", default=PERSIST_DIR)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help="processes that parse and chunk files; 1 parses in this process")
+    parser.add_argument("--watch", action="store_true", help="keep polling the corpus for changes")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="seconds between polls")
+    args = parser.parse_args(argv)
+
+    Settings.embed_model = get_embed_model()
+    ingest(args.data_dir, args.persist_dir, args.workers)
+    while args.watch:
+        time.sleep(args.interval)
+        # Polling compares mtimes and sizes, so it reads only files that changed
+        if corpus_changed(args.data_dir, args.persist_dir):
+            ingest(args.data_dir, args.persist_dir, args.workers)
+
+
+if __name__ == "__main__":
+    main()
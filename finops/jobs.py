@@ -0,0 +1,336 @@
+"""Headless runner for the scans behind the RDS and Reservation Optimiser pages.
+
+Jobs run outside the Streamlit script thread and save their results as
+snapshots (see ``finops.snapshots``); the pages only read the latest one, so
+they render at once and a scan never runs again because someone opened a
+page or it reran. A page can start a run on a background thread, and a
+scheduler keeps every job fresh:
+
+    python -m finops.jobs run rds_inactive    # one job, now
+    python -m finops.jobs schedule            # each job whenever its snapshot is older than its interval
+    python -m finops.jobs list                # the latest snapshot of each job
+
+Credentials and the accounts and regions to scan come from
+``.streamlit/secrets.toml``, as they do for the pages. AWS_ACCESS_KEY_ID,
+AWS_SECRET_ACCESS_KEY and REGION_NAME in the environment take precedence.
+
+A lock file per job stops two processes (the app and a scheduler, or several
+app servers) running the same job at the same time. The run holding it
+touches it every LOCK_HEARTBEAT seconds, so a lock that hasn't been touched
+for LOCK_TIMEOUT was left behind by a process that died.
+"""
+import argparse
+import functools
+import os
+import threading
+import time
+import tomllib
+import traceback
+import uuid
+from collections import namedtuple
+
+import pandas as pd
+
+from finops.cost_queries import NO_COSTS, get_family_usage, get_top_rds_ec2_costs
+from finops.fanout import FanOut, family_usage, inactive_rds_instances, merge_results, top_instances
+from finops.snapshots import SNAPSHOT_DIR, latest_snapshot, save_snapshot
+from finops.tracing import span
+from finops.warehouse import SYNC_INTERVAL
+
+SECRETS_PATH = ".streamlit/secrets.toml"
+SETTINGS_FROM_ENV = ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "REGION_NAME")
+LOCK_TIMEOUT = 300  # a lock not touched for this long was left behind by a run that died
+LOCK_HEARTBEAT = 30
+SCHEDULER_TICK = 30
+RETRY_INTERVAL = 300  # wait this long before retrying a job that failed
+
+Job = namedtuple("Job", ["name", "run", "interval", "description"])
+
+_threads = {}  # job name -> background Thread
+_failures = {}  # job name -> (time, message) of the last failed background run
+_threads_lock = threading.Lock()
+
+
+def load_settings(path=SECRETS_PATH, environ=os.environ):
+    """Read the app's secrets file for use outside Streamlit"""
+    settings = {}
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            settings = tomllib.load(f)
+    settings.update((key, environ[key]) for key in SETTINGS_FROM_ENV if environ.get(key))
+    return settings
+
+
+def scan_fanout(settings):
+    """The FanOut and targets configured by SCAN_ACCOUNTS, SCAN_REGIONS and SCAN_ROLE_NAME"""
+    accounts = list(settings.get("SCAN_ACCOUNTS", []))
+    # The role is only for the accounts listed; the home account is read with its own credentials
+    fanout = FanOut(
+        {"aws_access_key_id": settings["AWS_ACCESS_KEY_ID"],
+         "aws_secret_access_key": settings["AWS_SECRET_ACCESS_KEY"]},
+        role_name=settings.get("SCAN_ROLE_NAME") if accounts else None,
+    )
+    targets = fanout.targets(accounts, list(settings.get("SCAN_REGIONS", [settings["REGION_NAME"]])))
+    return fanout, targets
+
+
+def _fan_out(settings, task, services, **options):
+    """Run ``task`` on every target; return the merged rows and the per-target errors"""
+    if options:
+        task = functools.update_wrapper(functools.partial(task, **options), task)
+    fanout, targets = scan_fanout(settings)
+    data, errors = pd.DataFrame(), []
+    for data, result in merge_results(fanout.run(targets, task, services=services)):
+        if result.error:
+            errors.append({"account": result.target.account_id, "region": result.target.region,
+                           "error": result.error})
+    return data, errors
+
+
+def rds_inactive(settings, force=False):
+    # Every scan reads CloudWatch afresh, so there is nothing to force
+    return _fan_out(settings, inactive_rds_instances, ("rds", "cloudwatch"))
+
+
+def cost_sync(settings, force=False):
+    """Sync the cost warehouse and rank instance types by cost, with reserved prices.
+
+    ``force`` re-fetches from Cost Explorer even if the warehouse was synced
+    within SYNC_INTERVAL.
+    """
+    if settings.get("SCAN_ACCOUNTS") or len(settings.get("SCAN_REGIONS", [])) > 1:
+        return _fan_out(settings, top_instances, ("ce",), force=force)
+    top, error = get_top_rds_ec2_costs(
+        settings["AWS_ACCESS_KEY_ID"], settings["AWS_SECRET_ACCESS_KEY"], settings["REGION_NAME"],
+        include_reserved=True, force=force,
+    )
+    if error == NO_COSTS:
+        return pd.DataFrame(), []
+    if error:
+        raise RuntimeError(error)
+    return top, []
+
+
+def usage_history(settings, force=False):
+    """Daily On-Demand spend per instance family, for the Reservation Optimiser's forecasts"""
+    if settings.get("SCAN_ACCOUNTS") or len(settings.get("SCAN_REGIONS", [])) > 1:
+        return _fan_out(settings, family_usage, ("ce",), force=force)
+    usage, error = get_family_usage(
+        settings["AWS_ACCESS_KEY_ID"], settings["AWS_SECRET_ACCESS_KEY"], settings["REGION_NAME"], force=force,
+    )
+    if error == NO_COSTS:
+        return pd.DataFrame(), []
+    if error:
+        raise RuntimeError(error)
+    return usage, []
+
+
+JOBS = {
+    job.name: job for job in [
+        Job("rds_inactive", rds_inactive, 6 * 3600, "RDS instances with no connections in 30 days"),
+        Job("cost_sync", cost_sync, SYNC_INTERVAL, "Cost warehouse sync and top instances by cost"),
+        Job("usage_history", usage_history, SYNC_INTERVAL, "Daily spend per instance family for forecasts"),
+    ]
+}
+
+
+def _lock_path(name, root):
+    return os.path.join(root, name, ".lock")
+
+
+def _read_lock(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _acquire(name, root):
+    """Take the lock of job ``name``; return the token written in it, or None if another run holds it"""
+    path = _lock_path(name, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # Read before the age check, so a lock replaced in between is seen as fresh
+            held = _read_lock(path)
+            if held is not None and is_running(name, root):
+                return None
+            if held is not None:
+                _break_stale(path, held)
+            continue
+        token = f"{os.getpid()} {uuid.uuid4().hex}"
+        with os.fdopen(fd, "w") as f:
+            f.write(token)
+        return token
+    return None
+
+
+def _break_stale(path, stale):
+    """Remove the lock at ``path`` if it still holds the token ``stale``"""
+    # Of several processes breaking the same lock, the atomic rename lets only one move it
+    aside = f"{path}.{os.getpid()}-{threading.get_ident()}"
+    try:
+        os.rename(path, aside)
+    except FileNotFoundError:
+        return
+    if _read_lock(aside) != stale:
+        # Another process broke it first and its new lock was moved; put that back
+        try:
+            os.link(aside, path)
+        except FileExistsError:
+            pass
+    os.remove(aside)
+
+
+def _release(path, token):
+    """Remove the lock at ``path`` if it still holds ``token``"""
+    if _read_lock(path) == token:
+        os.remove(path)
+
+
+def _keep_alive(path, stop):
+    """Touch the lock at ``path`` every LOCK_HEARTBEAT seconds until ``stop`` is set"""
+    while not stop.wait(LOCK_HEARTBEAT):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return
+
+
+def is_running(name, root=SNAPSHOT_DIR):
+    """Whether any process is running job ``name`` right now"""
+    path = _lock_path(name, root)
+    try:
+        return time.time() - os.path.getmtime(path) < LOCK_TIMEOUT
+    except FileNotFoundError:
+        return False
+
+
+def is_active(name, root=SNAPSHOT_DIR):
+    """Whether job ``name`` is running, counting a thread of this process that hasn't taken the lock yet"""
+    thread = _threads.get(name)
+    return bool(thread and thread.is_alive()) or is_running(name, root)
+
+
+def run_job(name, settings, root=SNAPSHOT_DIR, force=False):
+    """Run job ``name`` and save its snapshot.
+
+    ``force`` refreshes data the job would otherwise reuse, such as a
+    recently synced cost warehouse. Returns the new snapshot version, or None
+    when another run of the job already holds its lock.
+    """
+    job = JOBS[name]
+    token = _acquire(name, root)
+    if token is None:
+        return None
+    path = _lock_path(name, root)
+    stop = threading.Event()
+    threading.Thread(target=_keep_alive, args=(path, stop), name=f"lock-{name}", daemon=True).start()
+    try:
+        started = time.perf_counter()
+        with span(f"job.{name}"):
+            data, errors = job.run(settings, force=force)
+        return save_snapshot(name, data, errors, time.perf_counter() - started, root)
+    finally:
+        stop.set()
+        _release(path, token)
+
+
+def start_job(name, settings, root=SNAPSHOT_DIR, force=False):
+    """Run job ``name`` on a background thread.
+
+    Returns False if it is already running, or if its last background run
+    failed less than RETRY_INTERVAL ago; ``force`` (for a user asking for a
+    refresh) retries at once and is passed on to run_job.
+    """
+    with _threads_lock:
+        if is_active(name, root):
+            return False
+        failed_at, _ = _failures.get(name, (0, None))
+        if not force and time.time() - failed_at < RETRY_INTERVAL:
+            return False
+
+        def run():
+            try:
+                if run_job(name, settings, root, force):
+                    _failures.pop(name, None)
+            except Exception as e:
+                _failures[name] = (time.time(), f"{type(e).__name__}: {e}")
+                traceback.print_exc()
+
+        _threads[name] = threading.Thread(target=run, name=f"job-{name}", daemon=True)
+        _threads[name].start()
+        return True
+
+
+def last_failure(name):
+    """The error of the last background run of ``name``, if it failed"""
+    return _failures.get(name, (0, None))[1]
+
+
+def due_jobs(jobs, root=SNAPSHOT_DIR, now=None):
+    """The jobs whose latest snapshot is missing or older than their interval"""
+    now = now or time.time()
+    for job in jobs:
+        snapshot = latest_snapshot(job.name, root)
+        if snapshot is None or now - snapshot.created_at >= job.interval:
+            yield job
+
+
+def run_scheduler(settings, jobs=None, root=SNAPSHOT_DIR, tick=SCHEDULER_TICK):
+    """Run each job whenever it is due, until interrupted"""
+    jobs = jobs or list(JOBS.values())
+    attempted = {}
+    while True:
+        for job in due_jobs(jobs, root):
+            if time.time() - attempted.get(job.name, 0) < RETRY_INTERVAL:
+                continue
+            attempted[job.name] = time.time()
+            try:
+                version = run_job(job.name, settings, root)
+            except Exception as e:
+                print(f"{job.name} failed: {type(e).__name__}: {e}")
+                continue
+            print(f"{job.name}: {'saved ' + version if version else 'already running elsewhere'}")
+        time.sleep(tick)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--secrets", default=SECRETS_PATH)
+    parser.add_argument("--root", default=SNAPSHOT_DIR, help="where snapshots are saved")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="run jobs now")
+    run.add_argument("jobs", nargs="*", metavar="job", help=f"one of {', '.join(JOBS)}; all by default")
+    schedule = commands.add_parser("schedule", help="keep every job's snapshot fresh")
+    schedule.add_argument("--tick", type=float, default=SCHEDULER_TICK, help="seconds between checks")
+    commands.add_parser("list", help="show the latest snapshot of each job")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for job in JOBS.values():
+            snapshot = latest_snapshot(job.name, args.root)
+            if snapshot is None:
+                print(f"{job.name:<14} never run")
+                continue
+            age = (time.time() - snapshot.created_at) / 60
+            print(f"{job.name:<14} {snapshot.version}  {len(snapshot.data)} rows, "
+                  f"{len(snapshot.errors)} errors, {age:.0f} min old")
+        return
+
+    settings = load_settings(args.secrets)
+    if args.command == "schedule":
+        run_scheduler(settings, root=args.root, tick=args.tick)
+    unknown = [name for name in args.jobs if name not in JOBS]
+    if unknown:
+        parser.error(f"unknown job {unknown[0]!r}; expected one of {', '.join(JOBS)}")
+    for name in args.jobs or JOBS:
+        version = run_job(name, settings, args.root)
+        print(f"{name}: {'saved ' + version if version else 'already running elsewhere'}")
+
+
+if __name__ == "__main__":
+    main()
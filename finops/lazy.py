@@ -0,0 +1,47 @@
+"""Deferred imports for the pages.
+
+A page's first run pays for every module it imports at the top, even the ones
+only needed after a button press or an upload. ``lazy_import`` returns a
+stand-in that imports the real module the first time one of its attributes
+is used, and records how long that took as an ``import.<name>`` span.
+
+    pd = lazy_import("pandas")
+    ...
+    pd.DataFrame(rows)  # pandas is imported here
+"""
+import importlib
+import sys
+import threading
+import types
+
+from finops.tracing import span
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name):
+        super().__init__(name)
+        self._lazy_module = None
+        self._lazy_lock = threading.Lock()
+
+    def _load(self):
+        if self._lazy_module is None:
+            # Pages run in several session threads at once
+            with self._lazy_lock:
+                if self._lazy_module is None:
+                    with span(f"import.{self.__name__}"):
+                        self._lazy_module = importlib.import_module(self.__name__)
+        return self._lazy_module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name):
+    """Return module ``name``, imported on first attribute access"""
+    # Already imported by something else, so there is nothing to save
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
@@ -0,0 +1,138 @@
+"""Spans for llama_index retrieval, embedding and LLM calls.
+
+llama_index reports what it is doing through its instrumentation dispatcher.
+``instrument_llama_index`` registers a handler that pairs each start event
+with its end event and records the time between them on the shared tracer,
+together with token counts and the time to the first streamed token.
+"""
+import threading
+import time
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+from llama_index.core.instrumentation.events.embedding import EmbeddingEndEvent, EmbeddingStartEvent
+from llama_index.core.instrumentation.events.llm import (
+    LLMChatEndEvent,
+    LLMChatInProgressEvent,
+    LLMChatStartEvent,
+    LLMCompletionEndEvent,
+    LLMCompletionInProgressEvent,
+    LLMCompletionStartEvent,
+    LLMPredictEndEvent,
+    LLMPredictStartEvent,
+)
+from llama_index.core.instrumentation.events.retrieval import RetrievalEndEvent, RetrievalStartEvent
+from llama_index.core.utils import get_tokenizer
+
+from finops.tracing import tracer
+
+# Start event -> (stage, end event)
+STAGES = {
+    RetrievalStartEvent: ("chat.retrieve", RetrievalEndEvent),
+    EmbeddingStartEvent: ("embed", EmbeddingEndEvent),
+    # Non-streaming predict is the condense step of the chat engine
+    LLMPredictStartEvent: ("chat.condense", LLMPredictEndEvent),
+    LLMChatStartEvent: ("llm.call", LLMChatEndEvent),
+    LLMCompletionStartEvent: ("llm.call", LLMCompletionEndEvent),
+}
+END_EVENTS = {end: stage for stage, end in STAGES.values()}
+MAX_OPEN = 1000  # streaming predicts never send an end event; don't let them pile up
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            # Loads cl100k_base from the files bundled with llama_index, so
+            # tiktoken doesn't need to download it
+            get_tokenizer()
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    return _encoding
+
+
+def count_tokens(text):
+    """Count tokens with the OpenAI tokenizer, or words when tiktoken is unavailable"""
+    encoding = _get_encoding()
+    if not text:
+        return 0
+    return len(encoding.encode(text, disallowed_special=())) if encoding else len(text.split())
+
+
+def truncate_tokens(text, max_tokens):
+    """Cut ``text`` down to its first ``max_tokens`` tokens"""
+    encoding = _get_encoding()
+    if not encoding:
+        return " ".join(text.split()[:max_tokens])
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def _prompt_text(event):
+    if isinstance(event, LLMChatStartEvent):
+        return "\n".join(str(message.content or "") for message in event.messages)
+    return getattr(event, "prompt", "")
+
+
+def _response_text(event):
+    if isinstance(event, LLMChatEndEvent):
+        return event.response.message.content if event.response else ""
+    return event.response.text if event.response else ""
+
+
+class TracingEventHandler(BaseEventHandler):
+    _open: dict = PrivateAttr(default_factory=dict)  # (span id, stage) -> [start, perf counter, attributes]
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @classmethod
+    def class_name(cls):
+        return "TracingEventHandler"
+
+    def handle(self, event, **kwargs):
+        event_type = type(event)
+        if event_type in STAGES:
+            stage = STAGES[event_type][0]
+            attributes = {}
+            if stage == "llm.call":
+                attributes["prompt_tokens"] = count_tokens(_prompt_text(event))
+            with self._lock:
+                if len(self._open) >= MAX_OPEN:
+                    self._open.pop(next(iter(self._open)))
+                self._open[(event.span_id, stage)] = [time.time(), time.perf_counter(), attributes]
+        elif event_type in (LLMChatInProgressEvent, LLMCompletionInProgressEvent):
+            with self._lock:
+                entry = self._open.get((event.span_id, "llm.call"))
+            if entry and "first_token" not in entry[2]:
+                entry[2]["first_token"] = time.perf_counter() - entry[1]
+                tracer.record("llm.first_token", entry[2]["first_token"])
+        elif event_type in END_EVENTS:
+            stage = END_EVENTS[event_type]
+            with self._lock:
+                entry = self._open.pop((event.span_id, stage), None)
+            if entry is None:
+                return
+            start, started, attributes = entry
+            if stage == "llm.call":
+                attributes["completion_tokens"] = count_tokens(_response_text(event))
+                tracer.increment("llm.prompt_tokens", attributes["prompt_tokens"])
+                tracer.increment("llm.completion_tokens", attributes["completion_tokens"])
+            tracer.record(stage, time.perf_counter() - started, start, None, None, **attributes)
+
+
+_handler = None
+_handler_lock = threading.Lock()
+
+
+def instrument_llama_index():
+    """Register the tracing handler on llama_index's root dispatcher, once per process"""
+    global _handler
+    with _handler_lock:
+        if _handler is None:
+            _handler = TracingEventHandler()
+            get_dispatcher().add_event_handler(_handler)
+    return _handler
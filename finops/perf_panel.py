@@ -0,0 +1,45 @@
+"""Optional sidebar panel with per-stage latency from the tracer.
+
+Shown when the app runs with ``FINOPS_PERF_PANEL=1`` or the page is opened
+with ``?perf=1``. The numbers are process-wide, so they cover every session
+served by this Streamlit server.
+"""
+import os
+
+import streamlit as st
+
+from finops.lazy import lazy_import
+from finops.tracing import WINDOW, tracer
+
+# The panel is usually off, so pages don't pay for pandas just to import it
+pd = lazy_import("pandas")
+
+
+def perf_panel_enabled():
+    return os.environ.get("FINOPS_PERF_PANEL") == "1" or st.query_params.get("perf") == "1"
+
+
+def render_perf_panel():
+    if not perf_panel_enabled():
+        return
+    with st.sidebar.expander("⏱️ Performance", expanded=True):
+        stats = tracer.stage_stats()
+        if not stats:
+            st.caption("No spans recorded yet.")
+            return
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "Stage": name,
+                    "Calls": stage["count"],
+                    "Errors": stage["errors"],
+                    "p50 (ms)": round(stage["p50"] * 1000, 1),
+                    "p95 (ms)": round(stage["p95"] * 1000, 1),
+                }
+                for name, stage in stats.items()
+            ]),
+            hide_index=True,
+        )
+        for name, value in sorted(tracer.counters.items()):
+            st.caption(f"{name}: {value:,}")
+        st.caption(f"Percentiles over the last {WINDOW:,} calls per stage, across all sessions.")
@@ -0,0 +1,293 @@
+"""Local pricing index built from the AWS bulk offer files.
+
+The regional EC2 and RDS offer files (CSV format) are stream-parsed row by row
+into a compact index keyed by
+(service, instance type, region, term, tenancy, engine) -> effective USD/hour.
+The index is saved as JSON under ``storage/`` so pages can do O(1) lookups
+instead of one Pricing API call per Cost Explorer row.
+
+Build or refresh it from the command line:
+
+    python -m finops.pricing --regions eu-west-2 us-east-1
+    python -m finops.pricing --fixture   # offline, uses the bundled sample
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+INDEX_PATH = "storage/pricing_index.json"
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "offer_sample.csv")
+OFFER_URL = "https://pricing.us-east-1.amazonaws.com/offers/v1.0/aws/{service}/current/{region}/index.csv"
+SERVICES = ["AmazonEC2", "AmazonRDS"]
+DEFAULT_REGIONS = ["eu-west-2"]
+REFRESH_INTERVAL = 7 * 24 * 3600  # Offer files change a few times a month at most
+RETRY_INTERVAL = 300  # wait this long before retrying a refresh that failed
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_TIMEOUT = 120
+
+ON_DEMAND = "OnDemand"
+RESERVED_1YR_NO_UPFRONT = "1yr/No Upfront/standard"
+
+# Cost Explorer SERVICE dimension values -> offer file service codes
+CE_SERVICE_CODES = {
+    "Amazon Elastic Compute Cloud - Compute": "AmazonEC2",
+    "Amazon Relational Database Service": "AmazonRDS",
+}
+# Engine assumed when the caller doesn't know it (CE groups don't carry it)
+DEFAULT_ENGINES = {"AmazonEC2": "Linux", "AmazonRDS": "MySQL"}
+HOURS_PER_YEAR = 8760
+
+
+def _column_key(name):
+    # Offer file headers vary in spelling ("Pre Installed S/W", "Region Code"),
+    # so columns are matched on their lower-cased alphanumerics only
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def _term_hours(lease_length):
+    years = int(re.match(r"(\d+)", lease_length or "1").group(1))
+    return years * HOURS_PER_YEAR
+
+
+def _term_name(term_type, lease_length, purchase_option, offering_class):
+    if term_type == "OnDemand":
+        return ON_DEMAND
+    return f"{lease_length}/{purchase_option}/{offering_class or 'standard'}"
+
+
+def parse_offer_file(lines, service):
+    """Stream-parse one offer CSV and return {index key: USD per hour}.
+
+    ``lines`` is any iterable of text lines, so a network response can be
+    parsed without holding the file in memory. Reserved terms are reduced to
+    an effective hourly rate (recurring fee plus upfront fee spread over the
+    term).
+    """
+    reader = csv.reader(lines)
+    # The offer CSV starts with a few metadata rows before the real header
+    for row in reader:
+        if row and row[0] == "SKU":
+            cols = {_column_key(name): i for i, name in enumerate(row)}
+            break
+    else:
+        return {}
+
+    def col(row, name):
+        i = cols.get(name)
+        return row[i] if i is not None and i < len(row) else ""
+
+    hourly = {}
+    upfront = {}
+    for row in reader:
+        if col(row, "servicecode") not in (service, ""):
+            continue
+        if col(row, "productfamily") not in ("Compute Instance", "Database Instance"):
+            continue
+        if col(row, "currency") not in ("USD", ""):
+            continue
+        if service == "AmazonEC2":
+            if col(row, "preinstalledsw") != "NA" or col(row, "capacitystatus") != "Used":
+                continue
+            if col(row, "licensemodel") not in ("No License required", ""):
+                continue
+            tenancy = col(row, "tenancy") or "Shared"
+            engine = col(row, "operatingsystem")
+        else:
+            if col(row, "deploymentoption") != "Single-AZ":
+                continue
+            if col(row, "licensemodel") == "Bring your own license":
+                continue
+            tenancy = "Shared"
+            engine = col(row, "databaseengine")
+
+        term_type = col(row, "termtype")
+        key = (
+            service,
+            col(row, "instancetype"),
+            col(row, "regioncode"),
+            _term_name(term_type, col(row, "leasecontractlength"),
+                       col(row, "purchaseoption"), col(row, "offeringclass")),
+            tenancy,
+            engine,
+        )
+        try:
+            price = float(col(row, "priceperunit"))
+        except ValueError:
+            continue
+        # Several SKUs can collapse onto one key; they are kept apart until the
+        # upfront and recurring parts of each one have been combined
+        sku_key = key + (col(row, "sku"),)
+        if col(row, "unit") == "Quantity":
+            upfront[sku_key] = price / _term_hours(col(row, "leasecontractlength"))
+        else:
+            hourly[sku_key] = price
+
+    prices = {}
+    for sku_key in set(hourly) | set(upfront):
+        key = sku_key[:-1]
+        rate = hourly.get(sku_key, 0.0) + upfront.get(sku_key, 0.0)
+        if key not in prices or rate < prices[key]:
+            prices[key] = rate
+    return prices
+
+
+class PricingIndex:
+    """In-memory view of the pricing index with O(1) lookups"""
+
+    def __init__(self, prices=None, built_at=0.0):
+        self.prices = prices or {}
+        self.built_at = built_at
+        self.regions = {key[2] for key in self.prices}
+
+    def __len__(self):
+        return len(self.prices)
+
+    def is_stale(self, max_age=REFRESH_INTERVAL):
+        return time.time() - self.built_at > max_age
+
+    def lookup(self, service, instance_type, region, term=ON_DEMAND, tenancy="Shared", engine=None):
+        """Return the effective USD/hour for a key, or None if it isn't indexed"""
+        service = CE_SERVICE_CODES.get(service, service)
+        engine = engine or DEFAULT_ENGINES.get(service)
+        return self.prices.get((service, instance_type, region, term, tenancy, engine))
+
+    def save(self, path=INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        payload = {
+            "built_at": self.built_at,
+            "prices": [list(key) + [price] for key, price in self.prices.items()],
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            payload = json.load(f)
+        prices = {tuple(row[:-1]): row[-1] for row in payload["prices"]}
+        return cls(prices, payload.get("built_at", 0.0))
+
+
+def build_index(regions=DEFAULT_REGIONS, services=SERVICES, fixture_path=None):
+    """Download and parse the offer files, or parse ``fixture_path`` offline"""
+    prices = {}
+    if fixture_path:
+        for service in services:
+            with open(fixture_path, newline="") as f:
+                prices.update(parse_offer_file(f, service))
+    else:
+        # Offer files are downloaded in parallel; one failing region doesn't
+        # stop the others from being indexed
+        errors = []
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            futures = {
+                executor.submit(_download_offer_file, service, region): (service, region)
+                for service in services
+                for region in regions
+            }
+            for future in as_completed(futures):
+                try:
+                    prices.update(future.result())
+                except (OSError, ValueError) as e:
+                    errors.append("{}/{}: {}".format(*futures[future], e))
+        if errors and not prices:
+            raise RuntimeError("; ".join(errors))
+        for error in errors:
+            print(f"Skipped offer file {error}")
+    return PricingIndex(prices, time.time())
+
+
+def _download_offer_file(service, region):
+    url = OFFER_URL.format(service=service, region=region)
+    with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response:
+        lines = io.TextIOWrapper(response, encoding="utf-8", newline="")
+        return parse_offer_file(lines, service)
+
+
+def refresh_index(path=INDEX_PATH, regions=DEFAULT_REGIONS, fixture_path=None):
+    index = build_index(regions, fixture_path=fixture_path)
+    index.save(path)
+    return index
+
+
+_index = None
+_index_lock = threading.Lock()
+_refresh_thread = None
+_refresh_failed_at = 0.0
+_requested_regions = set(DEFAULT_REGIONS)
+
+
+def get_pricing_index(path=INDEX_PATH, regions=DEFAULT_REGIONS):
+    """Return the process-wide pricing index.
+
+    The index is loaded from disk once. When it is missing, older than
+    REFRESH_INTERVAL or asked for regions it has never been built for, a
+    background refresh is started and the current (possibly empty) index keeps
+    serving lookups until the new one is ready. A refresh that failed is not
+    retried for RETRY_INTERVAL.
+    """
+    global _index, _refresh_thread
+    with _index_lock:
+        if _index is None:
+            _index = PricingIndex.load(path)
+        new_regions = set(regions) - _requested_regions - _index.regions
+        refreshing = _refresh_thread is not None and _refresh_thread.is_alive()
+        backing_off = time.time() - _refresh_failed_at < RETRY_INTERVAL
+        if (_index.is_stale() or new_regions) and not refreshing and not backing_off:
+            _requested_regions.update(regions)
+            all_regions = sorted(_requested_regions | _index.regions)
+            _refresh_thread = threading.Thread(
+                target=_refresh_in_background, args=(path, all_regions), daemon=True
+            )
+            _refresh_thread.start()
+        return _index
+
+
+def _refresh_in_background(path, regions):
+    global _index, _refresh_failed_at
+    try:
+        index = refresh_index(path, regions)
+    except Exception as e:
+        print(f"Error refreshing pricing index: {e}")
+        with _index_lock:
+            _refresh_failed_at = time.time()
+        return
+    with _index_lock:
+        _index = index
+
+
+def estimate_reserved_cost(service, instance_type, region, on_demand_cost, term=RESERVED_1YR_NO_UPFRONT):
+    """Return the cost of the same usage under a reservation, or None if unpriced"""
+    index = get_pricing_index(regions=[region])
+    on_demand_rate = index.lookup(service, instance_type, region)
+    reserved_rate = index.lookup(service, instance_type, region, term=term)
+    if not on_demand_rate or reserved_rate is None:
+        return None
+    hours = on_demand_cost / on_demand_rate
+    return hours * reserved_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the local AWS pricing index")
+    parser.add_argument("--regions", nargs="+", default=DEFAULT_REGIONS)
+    parser.add_argument("--output", default=INDEX_PATH)
+    parser.add_argument("--fixture", nargs="?", const=FIXTURE_PATH, default=None,
+                        help="Parse a local offer CSV instead of downloading")
+    args = parser.parse_args()
+    index = refresh_index(args.output, args.regions, fixture_path=args.fixture)
+    print(f"Indexed {len(index)} prices into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
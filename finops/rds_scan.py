@@ -0,0 +1,141 @@
+"""Batched scanner for RDS instances with no database connections.
+
+Instances are listed with the describe_db_instances paginator and their
+DatabaseConnections metric is fetched for up to 500 instances per
+GetMetricData request, sent as soon as the listing has filled it. Batches
+run on a small thread pool that backs off together when CloudWatch
+throttles, and results are yielded batch by batch, while later pages are
+still being listed, so the UI can show them as they arrive.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+from botocore.exceptions import ClientError
+
+from finops.tracing import THROTTLING_ERRORS, tracer
+
+MAX_QUERIES_PER_REQUEST = 500  # GetMetricData limit
+MAX_WORKERS = 4
+MAX_ATTEMPTS = 8
+
+
+class AdaptiveBackoff:
+    """Delay shared by all workers.
+
+    Every throttled call doubles the delay and every successful call halves it,
+    so the pool slows down together under throttling and recovers afterwards.
+    """
+
+    def __init__(self, base=0.25, cap=20.0):
+        self.base = base
+        self.cap = cap
+        self.delay = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        delay = self.delay
+        if delay:
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def throttled(self):
+        with self._lock:
+            self.delay = min(self.cap, max(self.base, self.delay * 2))
+
+    def succeeded(self):
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > self.base else 0.0
+
+
+def call_with_backoff(fn, backoff, max_attempts=MAX_ATTEMPTS, retryable=THROTTLING_ERRORS):
+    """Call ``fn`` and retry it while AWS reports throttling (an error code in ``retryable``)"""
+    for attempt in range(max_attempts):
+        backoff.wait()
+        try:
+            result = fn()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in retryable or attempt == max_attempts - 1:
+                raise
+            backoff.throttled()
+            tracer.increment("aws.backoff_retries")
+            continue
+        backoff.succeeded()
+        return result
+
+
+def iter_db_instance_pages(rds_client):
+    """Yield each page of DB instances from the describe_db_instances paginator"""
+    paginator = rds_client.get_paginator("describe_db_instances")
+    for page in paginator.paginate():
+        yield page["DBInstances"]
+
+
+def _connection_totals(cloudwatch_client, instance_ids, start_time, end_time, backoff):
+    """Return {instance id: total connections} for one batch of instances"""
+    queries = [
+        {
+            "Id": f"m{i}",
+            "MetricStat": {
+                "Metric": {
+                    "Namespace": "AWS/RDS",
+                    "MetricName": "DatabaseConnections",
+                    "Dimensions": [{"Name": "DBInstanceIdentifier", "Value": instance_id}],
+                },
+                "Period": 86400,  # 1 day interval
+                "Stat": "Sum",
+            },
+            "ReturnData": True,
+        }
+        for i, instance_id in enumerate(instance_ids)
+    ]
+    totals = {instance_id: 0.0 for instance_id in instance_ids}
+    next_token = None
+    while True:
+        kwargs = {"MetricDataQueries": queries, "StartTime": start_time, "EndTime": end_time}
+        if next_token:
+            kwargs["NextToken"] = next_token
+        response = call_with_backoff(lambda: cloudwatch_client.get_metric_data(**kwargs), backoff)
+        for result in response["MetricDataResults"]:
+            instance_id = instance_ids[int(result["Id"][1:])]
+            totals[instance_id] += sum(result["Values"])
+        next_token = response.get("NextToken")
+        if not next_token:
+            return totals
+
+
+def scan_inactive_instances(rds_client, cloudwatch_client, days=30,
+                            batch_size=MAX_QUERIES_PER_REQUEST, max_workers=MAX_WORKERS):
+    """Yield lists of the describe_db_instances records of instances with no connections.
+
+    The records carry DBInstanceArn and TagList, so acting on the instances
+    needs no further lookups. One list is yielded per GetMetricData batch, in
+    completion order.
+    """
+    end_time = datetime.now(timezone.utc)
+    start_time = end_time - timedelta(days=days)
+    backoff = AdaptiveBackoff()
+
+    def scan_batch(instances):
+        ids = [instance["DBInstanceIdentifier"] for instance in instances]
+        totals = _connection_totals(cloudwatch_client, ids, start_time, end_time, backoff)
+        return [instance for instance in instances if totals[instance["DBInstanceIdentifier"]] == 0]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        batch = []
+        for page in iter_db_instance_pages(rds_client):
+            batch.extend(page)
+            while len(batch) >= batch_size:
+                pending.add(executor.submit(scan_batch, batch[:batch_size]))
+                batch = batch[batch_size:]
+            # Hand over the batches that finished while this page was listed
+            done = {future for future in pending if future.done()}
+            pending -= done
+            for future in done:
+                yield future.result()
+        if batch:
+            pending.add(executor.submit(scan_batch, batch))
+        for future in as_completed(pending):
+            yield future.result()
@@ -0,0 +1,247 @@
+"""Hybrid, token-budgeted retrieval for the FinOps chat engine.
+
+Questions are answered from the union of two candidate lists: the nearest
+chunks by embedding and the best chunks by BM25 keyword score, so exact terms
+such as instance types or API names are found even when the embedding misses
+them. Every candidate is scored on both signals and reranked by a blend of
+the two, near-identical chunks are dropped, and the survivors are packed into
+a fixed budget of context tokens, counted with tiktoken, before they reach
+the LLM.
+
+The BM25 index is built from the index's docstore and saved next to it. It is
+only rebuilt when the corpus fingerprint changes.
+"""
+import json
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import MetadataMode, NodeWithScore, TextNode
+from llama_index.core.settings import Settings
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from finops.conversation import FastCondenseChatEngine
+from finops.index_store import PERSIST_DIR, manifest_version
+from finops.llm_tracing import count_tokens, truncate_tokens
+from finops.tracing import span
+
+KEYWORD_INDEX_FILE = "bm25.json"
+DENSE_TOP_K = 8
+KEYWORD_TOP_K = 8
+DENSE_WEIGHT = 0.6  # share of the rerank score from embedding similarity
+CONTEXT_TOKENS = int(os.environ.get("FINOPS_CONTEXT_TOKENS", 1500))
+MIN_CHUNK_TOKENS = 64  # smaller leftovers of the budget aren't worth a truncated chunk
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from how i if in into is it its of on or our should "
+    "so than that the their them then there these they this to was we what when where which who why "
+    "will with you your".split()
+)
+
+
+def tokenize(text):
+    return [word for word in re.findall(r"[a-z0-9]+(?:[._-][a-z0-9]+)*", text.lower())
+            if word not in STOPWORDS and len(word) > 1]
+
+
+class KeywordIndex:
+    """Okapi BM25 over the chunks of the vector index"""
+
+    def __init__(self, node_ids, doc_lengths, postings, version=None, k1=1.5, b=0.75):
+        self.node_ids = list(node_ids)
+        self.positions = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self.postings = postings  # term -> [[position, term frequency], ...]
+        self.version = version
+        self.k1 = k1
+        self.b = b
+        self._arrays = {}
+
+    @classmethod
+    def build(cls, nodes, version=None):
+        node_ids, doc_lengths, postings = [], [], {}
+        for position, node in enumerate(nodes):
+            terms = Counter(tokenize(node.get_content(metadata_mode=MetadataMode.NONE)))
+            node_ids.append(node.node_id)
+            doc_lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                postings.setdefault(term, []).append([position, frequency])
+        return cls(node_ids, doc_lengths, postings, version)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["node_ids"], data["doc_lengths"], data["postings"], data["version"])
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "version": self.version,
+                "node_ids": self.node_ids,
+                "doc_lengths": self.doc_lengths.tolist(),
+                "postings": self.postings,
+            }, f)
+        os.replace(tmp_path, path)
+
+    def _term_arrays(self, term):
+        if term not in self._arrays:
+            pairs = np.asarray(self.postings[term], dtype=np.int64)
+            self._arrays[term] = pairs[:, 0], pairs[:, 1].astype(np.float32)
+        return self._arrays[term]
+
+    def scores(self, query):
+        """Return the BM25 score of every chunk for ``query``, in node_ids order"""
+        scores = np.zeros(len(self.node_ids), dtype=np.float32)
+        if not self.node_ids:
+            return scores
+        count = len(self.node_ids)
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(self.doc_lengths.mean(), 1))
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            positions, frequencies = self._term_arrays(term)
+            idf = math.log(1 + (count - len(positions) + 0.5) / (len(positions) + 0.5))
+            scores[positions] += idf * frequencies * (self.k1 + 1) / (frequencies + length_norm[positions])
+        return scores
+
+
+def load_or_build_keyword_index(index, persist_dir=PERSIST_DIR):
+    """Load the saved BM25 index, rebuilding it if the corpus changed since"""
+    version = manifest_version(persist_dir)
+    path = os.path.join(persist_dir, KEYWORD_INDEX_FILE)
+    if os.path.exists(path):
+        with span("index.keywords.load"):
+            keyword_index = KeywordIndex.load(path)
+        if keyword_index.version == version:
+            return keyword_index
+    with span("index.keywords.build") as attributes:
+        keyword_index = KeywordIndex.build(index.docstore.docs.values(), version)
+        attributes["chunks"] = len(keyword_index.node_ids)
+        os.makedirs(persist_dir, exist_ok=True)
+        keyword_index.save(path)
+    return keyword_index
+
+
+def _normalise(values):
+    values = np.asarray(values, dtype=np.float32)
+    low, high = values.min(), values.max()
+    if high - low < 1e-9:
+        return np.ones_like(values) if high > 0 else np.zeros_like(values)
+    return (values - low) / (high - low)
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses embedding and BM25 candidates, then reranks and de-duplicates them"""
+
+    def __init__(self, index, keyword_index, dense_top_k=DENSE_TOP_K, keyword_top_k=KEYWORD_TOP_K,
+                 dense_weight=DENSE_WEIGHT, embed_model=None):
+        super().__init__()
+        self._index = index
+        self._keyword_index = keyword_index
+        self._dense_top_k = dense_top_k
+        self._keyword_top_k = keyword_top_k
+        self._dense_weight = dense_weight
+        self._embed_model = embed_model or Settings.embed_model
+
+    def _dense_search(self, query_bundle):
+        if query_bundle.embedding is None:
+            query_bundle.embedding = self._embed_model.get_agg_embedding_from_queries(query_bundle.embedding_strs)
+        result = self._index.vector_store.query(
+            VectorStoreQuery(query_embedding=query_bundle.embedding, similarity_top_k=self._dense_top_k)
+        )
+        return dict(zip(result.ids or [], result.similarities or []))
+
+    def _similarity(self, query_embedding, node_id):
+        # Keyword-only candidates are scored against their stored embedding
+        try:
+            embedding = self._index.vector_store.get(node_id)
+        except (AttributeError, KeyError, NotImplementedError):
+            return 0.0
+        query, embedding = np.asarray(query_embedding), np.asarray(embedding)
+        return float(query @ embedding / (np.linalg.norm(query) * np.linalg.norm(embedding) or 1.0))
+
+    def _retrieve(self, query_bundle):
+        dense = self._dense_search(query_bundle)
+        keyword_scores = self._keyword_index.scores(query_bundle.query_str)
+        best = np.argsort(-keyword_scores)[:self._keyword_top_k]
+        keyword_ids = [self._keyword_index.node_ids[i] for i in best if keyword_scores[i] > 0]
+
+        candidates = list(dict.fromkeys(list(dense) + keyword_ids))
+        if not candidates:
+            return []
+        dense_scores = [
+            dense[node_id] if node_id in dense else self._similarity(query_bundle.embedding, node_id)
+            for node_id in candidates
+        ]
+        positions = self._keyword_index.positions
+        bm25_scores = [keyword_scores[positions[node_id]] if node_id in positions else 0.0 for node_id in candidates]
+        fused = self._dense_weight * _normalise(dense_scores) + (1 - self._dense_weight) * _normalise(bm25_scores)
+
+        nodes = {node.node_id: node for node in self._index.docstore.get_nodes(candidates, raise_error=False)}
+        results, seen = [], set()
+        for i in np.argsort(-fused):
+            node = nodes.get(candidates[i])
+            if node is None:
+                continue
+            # The same passage can appear in several files or be re-indexed under a new id
+            fingerprint = " ".join(node.get_content(metadata_mode=MetadataMode.NONE).lower().split())
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            results.append(NodeWithScore(node=node, score=float(fused[i])))
+        return results
+
+
+class TokenBudget(BaseNodePostprocessor):
+    """Keep the best-ranked chunks that fit in ``max_tokens`` of context.
+
+    Chunks are taken in rank order. The first one that no longer fits is cut
+    down to the tokens that are left, unless too few are left to be useful.
+    """
+
+    max_tokens: int = CONTEXT_TOKENS
+
+    @classmethod
+    def class_name(cls):
+        return "TokenBudget"
+
+    def _postprocess_nodes(self, nodes, query_bundle=None):
+        packed, remaining = [], self.max_tokens
+        for node_with_score in nodes:
+            node = node_with_score.node
+            tokens = count_tokens(node.get_content(metadata_mode=MetadataMode.LLM))
+            if tokens <= remaining:
+                packed.append(node_with_score)
+                remaining -= tokens
+                continue
+            if remaining >= MIN_CHUNK_TOKENS:
+                text = node.get_content(metadata_mode=MetadataMode.NONE)
+                metadata_tokens = tokens - count_tokens(text)
+                truncated = TextNode(
+                    id_=node.node_id,
+                    text=truncate_tokens(text, max(remaining - metadata_tokens, MIN_CHUNK_TOKENS)),
+                    metadata=node.metadata,
+                    excluded_llm_metadata_keys=node.excluded_llm_metadata_keys,
+                    excluded_embed_metadata_keys=node.excluded_embed_metadata_keys,
+                    relationships=node.relationships,
+                )
+                packed.append(NodeWithScore(node=truncated, score=node_with_score.score))
+            break
+        return packed
+
+
+def build_chat_engine(index, keyword_index, memory, max_tokens=CONTEXT_TOKENS, **kwargs):
+    """Condense-question chat engine over hybrid retrieval and a context budget"""
+    query_engine = RetrieverQueryEngine.from_args(
+        HybridRetriever(index, keyword_index),
+        node_postprocessors=[TokenBudget(max_tokens=max_tokens)],
+        streaming=True,
+    )
+    return FastCondenseChatEngine.from_defaults(query_engine=query_engine, memory=memory, **kwargs)
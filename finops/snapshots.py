@@ -0,0 +1,98 @@
+"""Versioned snapshots of background job results.
+
+Each run of a job is saved as its own version, and a pointer file names the
+latest one:
+
+    storage/snapshots/<job>/<version>.parquet   the result table
+    storage/snapshots/<job>/<version>.json      when it ran, how long it took, per-target errors
+    storage/snapshots/<job>/latest.json         {"version": ...}
+
+The pointer is replaced only after both files of a version are written, so
+readers never see a half-written snapshot. Reads are cached per version, so
+every session reads a given snapshot from disk once.
+"""
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import pandas as pd
+
+SNAPSHOT_DIR = "storage/snapshots"
+KEEP_VERSIONS = 10
+
+Snapshot = namedtuple("Snapshot", ["job", "version", "created_at", "seconds", "errors", "data"])
+
+_cache = {}  # (root, job, version) -> Snapshot
+_cache_lock = threading.Lock()
+
+
+def _job_dir(job, root):
+    return os.path.join(root, job)
+
+
+def _write_json(path, value):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(value, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def save_snapshot(job, data, errors=(), seconds=None, root=SNAPSHOT_DIR, keep=KEEP_VERSIONS):
+    """Save a job's result as a new version, make it the latest and return the version"""
+    job_dir = _job_dir(job, root)
+    os.makedirs(job_dir, exist_ok=True)
+    created_at = time.time()
+    version = datetime.fromtimestamp(created_at, timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    path = os.path.join(job_dir, version)
+    data.to_parquet(path + ".parquet.tmp", index=False)
+    os.replace(path + ".parquet.tmp", path + ".parquet")
+    _write_json(path + ".json", {"created_at": created_at, "seconds": seconds, "errors": list(errors)})
+    _write_json(os.path.join(job_dir, "latest.json"), {"version": version})
+
+    for old in list_versions(job, root)[:-keep]:
+        for suffix in (".parquet", ".json"):
+            try:
+                os.remove(os.path.join(job_dir, old + suffix))
+            except FileNotFoundError:
+                pass
+    return version
+
+
+def list_versions(job, root=SNAPSHOT_DIR):
+    """Return the stored versions of ``job``, oldest first"""
+    job_dir = _job_dir(job, root)
+    if not os.path.isdir(job_dir):
+        return []
+    return sorted(name[:-len(".parquet")] for name in os.listdir(job_dir) if name.endswith(".parquet"))
+
+
+def load_snapshot(job, version, root=SNAPSHOT_DIR):
+    key = (root, job, version)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+    path = os.path.join(_job_dir(job, root), version)
+    with open(path + ".json") as f:
+        meta = json.load(f)
+    snapshot = Snapshot(
+        job, version, meta["created_at"], meta["seconds"], meta["errors"], pd.read_parquet(path + ".parquet"),
+    )
+    with _cache_lock:
+        # Only the latest versions are read again, so don't hold on to the rest
+        for cached in [k for k in _cache if k[:2] == key[:2]]:
+            del _cache[cached]
+        _cache[key] = snapshot
+    return snapshot
+
+
+def latest_snapshot(job, root=SNAPSHOT_DIR):
+    """Return the newest Snapshot of ``job``, or None if it has never run"""
+    path = os.path.join(_job_dir(job, root), "latest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        version = json.load(f)["version"]
+    return load_snapshot(job, version, root)
@@ -0,0 +1,85 @@
+"""Startup profile of the Streamlit pages.
+
+Runs each page's module-level imports in a fresh interpreter with
+``python -X importtime`` and reports the total import time per page along
+with the slowest top-level modules. Imports behind ``lazy_import`` are not
+paid at startup and so don't show up here.
+
+    python -m finops.startup                 # every page
+    python -m finops.startup pages/RDS.py --top 5
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+from collections import namedtuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ["streamlit_app.py"] + sorted(
+    os.path.join("pages", name) for name in os.listdir(os.path.join(REPO_ROOT, "pages"))
+    if name.endswith(".py")
+)
+
+PageProfile = namedtuple("PageProfile", ["page", "seconds", "modules", "error"])
+
+
+def page_imports(path):
+    """Return the module-level import statements of a page as source"""
+    with open(os.path.join(REPO_ROOT, path)) as f:
+        source = f.read()
+    tree = ast.parse(source)
+    return "\n".join(
+        ast.get_source_segment(source, node)
+        for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    )
+
+
+def parse_importtime(output):
+    """Return [(module, cumulative seconds)] for the top-level imports in ``-X importtime`` output"""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented under the module that triggered them
+        if not name.startswith("  "):
+            modules.append((name.strip(), int(cumulative) / 1e6))
+    return modules
+
+
+def _importtime(source):
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", source], cwd=REPO_ROOT, capture_output=True, text=True,
+    )
+
+
+def profile_page(path, interpreter_modules=()):
+    """Import a page's dependencies in a new interpreter and time them"""
+    output = _importtime(page_imports(path))
+    modules = [module for module in parse_importtime(output.stderr) if module[0] not in interpreter_modules]
+    error = output.stderr.strip().splitlines()[-1] if output.returncode else None
+    return PageProfile(path, sum(seconds for _, seconds in modules), modules, error)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages", nargs="*", default=PAGES)
+    parser.add_argument("--top", type=int, default=8, help="slowest modules to list per page")
+    args = parser.parse_args(argv)
+
+    # Modules every interpreter loads at startup (site, encodings, ...) aren't the page's doing
+    interpreter_modules = {module for module, _ in parse_importtime(_importtime("pass").stderr)}
+    for page in args.pages:
+        profile = profile_page(page, interpreter_modules)
+        if profile.error:
+            print(f"{page:<40} failed: {profile.error}")
+            continue
+        print(f"{page:<40} {profile.seconds * 1000:8.0f} ms")
+        for module, seconds in sorted(profile.modules, key=lambda m: -m[1])[:args.top]:
+            print(f"    {module:<36} {seconds * 1000:8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
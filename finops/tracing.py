@@ -0,0 +1,240 @@
+"""Lightweight tracing for the hot paths.
+
+Code wraps a stage in ``span("name")``. Finished spans go to the process-wide
+``tracer``, which keeps the most recent spans, a rolling window of durations
+per stage (for p50/p95) and event counters such as throttling retries. The
+same tracer feeds the Streamlit performance panel and the optional
+exporters, which are switched on with environment variables:
+
+    FINOPS_TRACE_JSONL=storage/trace.jsonl       one JSON line per span
+    FINOPS_TRACE_PROMETHEUS=/var/lib/node_exporter/finops.prom
+                                                 Prometheus text, rewritten
+                                                 at most every 15 seconds
+
+AWS clients are traced with ``instrument_client``, which times every API call
+through botocore's event hooks and records how many retries it needed.
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+MAX_SPANS = 2000
+WINDOW = 1000  # durations kept per stage for the percentiles
+PROMETHEUS_INTERVAL = 15
+THROTTLING_ERRORS = {"Throttling", "ThrottlingException", "RequestLimitExceeded", "TooManyRequestsException"}
+
+Span = namedtuple("Span", ["name", "start", "duration", "parent", "attributes", "error"])
+
+_current_span = contextvars.ContextVar("finops_current_span", default=None)
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class Tracer:
+    def __init__(self, max_spans=MAX_SPANS, window=WINDOW):
+        self.spans = deque(maxlen=max_spans)
+        self.window = window
+        self.counters = {}
+        self.exporters = []
+        self._durations = {}  # stage -> deque of recent durations
+        self._totals = {}  # stage -> [count, total seconds, errors]
+        self._lock = threading.Lock()
+
+    def record(self, name, duration, start=None, parent=None, error=None, **attributes):
+        """Record a finished span and hand it to the exporters"""
+        finished = Span(name, start or time.time() - duration, duration, parent, attributes, error)
+        with self._lock:
+            self.spans.append(finished)
+            self._durations.setdefault(name, deque(maxlen=self.window)).append(duration)
+            totals = self._totals.setdefault(name, [0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += duration
+            totals[2] += error is not None
+        for exporter in self.exporters:
+            exporter(finished)
+        return finished
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def stage_stats(self):
+        """Return {stage: {count, errors, p50, p95, max}} over the recent window"""
+        with self._lock:
+            windows = {name: list(values) for name, values in self._durations.items()}
+            totals = {name: list(values) for name, values in self._totals.items()}
+        return {
+            name: {
+                "count": totals[name][0],
+                "errors": totals[name][2],
+                "p50": _percentile(values, 0.5),
+                "p95": _percentile(values, 0.95),
+                "max": max(values),
+            }
+            for name, values in sorted(windows.items())
+        }
+
+    def prometheus_text(self):
+        """Render the stage latencies and counters in the Prometheus text format"""
+        with self._lock:
+            windows = {name: list(values) for name, values in self._durations.items()}
+            totals = {name: list(values) for name, values in self._totals.items()}
+            counters = dict(self.counters)
+        lines = ["# TYPE finops_stage_seconds summary"]
+        for name in sorted(windows):
+            label = f'stage="{name}"'
+            for q in (0.5, 0.95):
+                lines.append(f'finops_stage_seconds{{{label},quantile="{q}"}} {_percentile(windows[name], q):.6f}')
+            lines.append(f"finops_stage_seconds_sum{{{label}}} {totals[name][1]:.6f}")
+            lines.append(f"finops_stage_seconds_count{{{label}}} {totals[name][0]}")
+        lines.append("# TYPE finops_stage_errors_total counter")
+        for name in sorted(totals):
+            lines.append(f'finops_stage_errors_total{{stage="{name}"}} {totals[name][2]}')
+        lines.append("# TYPE finops_events_total counter")
+        for name in sorted(counters):
+            lines.append(f'finops_events_total{{event="{name}"}} {counters[name]}')
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer()
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Time the enclosed block as stage ``name``.
+
+    Yields the attribute dict, so the block can add details (token counts,
+    row counts) before the span is recorded.
+    """
+    parent = _current_span.get()
+    token = _current_span.set(name)
+    start = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        tracer.record(name, time.perf_counter() - started, start, parent, error, **attributes)
+
+
+def traced(name=None):
+    """Decorator form of ``span``; the stage defaults to the function name"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name or fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def time_to_first_token(tokens, started, name="chat.first_token"):
+    """Pass ``tokens`` through, recording the delay from ``started`` to the first one"""
+    first = True
+    count = 0
+    for token in tokens:
+        if first:
+            tracer.record(name, time.perf_counter() - started)
+            first = False
+        count += 1
+        yield token
+    tracer.increment(f"{name.rsplit('.', 1)[0]}.stream_chunks", count)
+
+
+def _before_call(model, context, **kwargs):
+    stage = f"aws.{model.service_model.service_name}.{model.name}"
+    context["finops_span"] = (stage, time.time(), time.perf_counter(), _current_span.get())
+
+
+def _after_call(http_response, parsed, context, **kwargs):
+    stage, start, started, parent = context["finops_span"]
+    metadata = parsed.get("ResponseMetadata", {})
+    retries = metadata.get("RetryAttempts", 0)
+    error = parsed.get("Error", {}).get("Code")
+    if retries:
+        tracer.increment("aws.retries", retries)
+    if error in THROTTLING_ERRORS:
+        tracer.increment("aws.throttled")
+    tracer.record(stage, time.perf_counter() - started, start, parent, error,
+                  retries=retries, status=metadata.get("HTTPStatusCode"))
+
+
+def _after_call_error(exception, context, **kwargs):
+    # Connection errors and the like, after botocore's own retries gave up
+    stage, start, started, parent = context["finops_span"]
+    tracer.record(stage, time.perf_counter() - started, start, parent, type(exception).__name__)
+
+
+def instrument_client(client):
+    """Record a span for every API call ``client`` makes, retries included"""
+    events = client.meta.events
+    events.register("before-call", _before_call, unique_id="finops-trace-before")
+    events.register("after-call", _after_call, unique_id="finops-trace-after")
+    events.register("after-call-error", _after_call_error, unique_id="finops-trace-error")
+    return client
+
+
+class JsonlExporter:
+    """Append every finished span to ``path`` as one JSON object per line"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", buffering=1)
+        self._lock = threading.Lock()
+
+    def __call__(self, finished):
+        line = json.dumps(finished._asdict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+
+class PrometheusFileExporter:
+    """Rewrite ``path`` with the tracer's metrics at most every ``interval`` seconds.
+
+    Meant for the node_exporter textfile collector, since Streamlit can't
+    serve a /metrics endpoint itself.
+    """
+
+    def __init__(self, path, tracer, interval=PROMETHEUS_INTERVAL):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.tracer = tracer
+        self.interval = interval
+        self._written_at = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, finished):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._written_at < self.interval:
+                return
+            self._written_at = now
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.tracer.prometheus_text())
+        os.replace(tmp_path, self.path)
+
+
+def configure_exporters(tracer=tracer, environ=os.environ):
+    if environ.get("FINOPS_TRACE_JSONL"):
+        tracer.exporters.append(JsonlExporter(environ["FINOPS_TRACE_JSONL"]))
+    if environ.get("FINOPS_TRACE_PROMETHEUS"):
+        tracer.exporters.append(PrometheusFileExporter(environ["FINOPS_TRACE_PROMETHEUS"], tracer))
+
+
+configure_exporters()
@@ -0,0 +1,134 @@
+"""Chunked, memory-bounded ingestion of hourly usage files.
+
+Large hourly exports and CUR extracts are read in chunks with only the needed
+columns and narrow dtypes, and each chunk is reduced to per-hour, per-SKU
+sums straight away. Peak memory therefore depends on the number of distinct
+(hour, SKU) pairs, not on the size of the file.
+
+Two layouts are understood:
+
+* the rate reduction sample: one row per hour with an ``On Demand($)`` column
+  and optionally an ``Instance Type`` column;
+* Cost and Usage Report extracts (legacy ``lineItem/...`` or CUR 2.0
+  ``line_item_...`` headers), aggregated by usage start hour and instance
+  type, On-Demand line items only.
+"""
+import gzip
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 250_000
+# Combine the per-chunk partial sums once this many have built up
+MAX_PARTIALS = 16
+
+Layout = namedtuple("Layout", ["time", "sku", "value", "term"])
+
+SAMPLE_LAYOUT = Layout(time=None, sku="Instance Type", value="On Demand($)", term=None)
+CUR_LAYOUTS = [
+    Layout(time="lineItem/UsageStartDate", sku="product/instanceType",
+           value="lineItem/UnblendedCost", term="pricing/term"),
+    Layout(time="line_item_usage_start_date", sku="product_instance_type",
+           value="line_item_unblended_cost", term="pricing_term"),
+]
+SINGLE_SKU = "All instances"
+
+
+def _open(uploaded_file, name):
+    if name.endswith(".gz"):
+        return gzip.GzipFile(fileobj=uploaded_file, mode="rb")
+    return uploaded_file
+
+
+def _detect_layout(header):
+    for layout in CUR_LAYOUTS:
+        if layout.time in header and layout.value in header:
+            return layout
+    if SAMPLE_LAYOUT.value in header:
+        return SAMPLE_LAYOUT
+    raise ValueError(
+        "Unrecognised file: expected an 'On Demand($)' column or a Cost and Usage Report extract"
+    )
+
+
+def _read_header(uploaded_file, name):
+    stream = _open(uploaded_file, name)
+    header = pd.read_csv(stream, nrows=0).columns
+    uploaded_file.seek(0)
+    return list(header)
+
+
+def _compact(partials):
+    combined = pd.concat(partials)
+    return [combined.groupby(level=[0, 1], observed=True).sum()]
+
+
+def ingest_usage(uploaded_file, name=None, size=None, progress=None, chunk_rows=CHUNK_ROWS):
+    """Read ``uploaded_file`` in chunks and return an (hours x SKUs) DataFrame.
+
+    ``progress`` is called with a fraction between 0 and 1 after every chunk.
+    Values are On-Demand dollars per hour as float32; timestamped hours are
+    in UTC. Raises ValueError for files it can't read or with no On-Demand
+    usage in them.
+    """
+    name = name or getattr(uploaded_file, "name", "")
+    size = size or getattr(uploaded_file, "size", None)
+    header = _read_header(uploaded_file, name)
+    layout = _detect_layout(header)
+
+    columns = [c for c in (layout.time, layout.sku, layout.value, layout.term) if c and c in header]
+    dtypes = {layout.value: "float32"}
+    for column in (layout.sku, layout.term):
+        if column in columns:
+            dtypes[column] = "category"
+
+    reader = pd.read_csv(
+        _open(uploaded_file, name),
+        usecols=columns,
+        dtype=dtypes,
+        chunksize=chunk_rows,
+    )
+
+    partials = []
+    rows_seen = {}  # files without timestamps: rows per SKU so far = its hour
+    for chunk in reader:
+        if layout.term in columns:
+            chunk = chunk[chunk[layout.term] == "OnDemand"]
+        if layout.sku in columns:
+            skus = chunk[layout.sku].astype(str)
+        else:
+            skus = pd.Series(SINGLE_SKU, index=chunk.index)
+
+        if layout.time:
+            # As naive UTC the hours group as datetime64 rather than as Timestamp objects
+            hours = pd.to_datetime(chunk[layout.time], utc=True).dt.floor("h").dt.tz_localize(None)
+        else:
+            # Each row is one hour of its SKU, in file order
+            position = skus.groupby(skus, observed=True).cumcount()
+            hours = position + skus.map(rows_seen).fillna(0).astype("int64")
+            for sku, count in skus.value_counts().items():
+                rows_seen[sku] = rows_seen.get(sku, 0) + int(count)
+
+        # Partial sums are kept in float64 so totals over large files stay exact
+        values = chunk[layout.value].astype("float64")
+        partial = values.groupby([hours.to_numpy(), skus.to_numpy()]).sum()
+        partials.append(partial)
+        if len(partials) >= MAX_PARTIALS:
+            partials = _compact(partials)
+
+        if progress and size:
+            # Position in the raw (possibly compressed) upload
+            progress(min(uploaded_file.tell() / size, 1.0))
+
+    if progress:
+        progress(1.0)
+    totals = _compact(partials)[0] if partials else None
+    if totals is None or totals.empty:
+        raise ValueError("No On-Demand usage in this file")
+    usage = totals.unstack(fill_value=0).sort_index().astype(np.float32)
+    if layout.time and len(usage):
+        # Hours with no usage at all still count towards the reservation
+        all_hours = pd.date_range(usage.index[0], usage.index[-1], freq="h")
+        usage = usage.reindex(all_hours, fill_value=0)
+    return usage
@@ -0,0 +1,382 @@
+"""Vector stores for the chat index.
+
+llama_index's default store keeps every embedding as a Python list of
+floats, roughly 32 bytes per dimension. ``QuantizedVectorStore`` keeps one
+NumPy matrix instead: float16 halves the size of float32, and int8 (one scale
+per vector) quarters it, so a 1536-dimension embedding takes 1.5 KB rather
+than ~50 KB. Vectors are normalised before they are stored, so the cosine
+similarity is a plain dot product, computed block by block so a query never
+converts the whole matrix to float32 at once.
+
+Both of those still compare the query with every vector. ``FaissVectorStore``
+searches an approximate nearest-neighbour index instead, HNSW or IVF, so
+query time stays nearly flat as the corpus grows. Its vectors can be stored
+as float32, float16 or int8 too. The index is written to its own file and
+loaded read-only. FAISS only memory-maps the inverted lists of an IVF index,
+so a startup that changes nothing doesn't read IVF vectors into RAM; HNSW
+graphs and flat or scalar-quantised storage are read into memory in full.
+"""
+import os
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.vector_stores.types import BasePydanticVectorStore, VectorStoreQueryResult
+
+from finops.lazy import lazy_import
+
+faiss = lazy_import("faiss")
+
+DTYPES = ("float16", "int8")
+QUERY_BLOCK = 65536  # rows converted to float32 at a time
+
+ANN_KINDS = ("hnsw", "ivf")
+FAISS_ENCODINGS = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+MIN_ANN_VECTORS = 4096  # smaller indexes are searched exactly, which is as fast
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+IVF_REBUILD_GROWTH = 4  # retrain IVF once it holds this many times the vectors it was trained on
+MAX_DELETED = 0.2  # fraction of deleted vectors that triggers a rebuild
+EF_SEARCH = int(os.environ.get("FINOPS_FAISS_EF_SEARCH", 64))
+NPROBE = int(os.environ.get("FINOPS_FAISS_NPROBE", 16))
+
+
+def store_path(persist_dir):
+    return os.path.join(persist_dir, "default__vector_store.npz")
+
+
+def faiss_path(persist_dir):
+    return os.path.join(persist_dir, "default__vector_store.faiss")
+
+
+class QuantizedVectorStore(BasePydanticVectorStore):
+    stores_text: bool = False
+    dtype: str = "int8"
+    _ids: list = PrivateAttr(default_factory=list)
+    _ref_doc_ids: list = PrivateAttr(default_factory=list)
+    _positions: dict = PrivateAttr(default_factory=dict)
+    _vectors: np.ndarray = PrivateAttr(default=None)  # (capacity, dim), only the first len(_ids) used
+    _scales: np.ndarray = PrivateAttr(default=None)
+
+    def __init__(self, dtype="int8", **kwargs):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}; expected one of {', '.join(DTYPES)}")
+        super().__init__(dtype=dtype, **kwargs)
+
+    @classmethod
+    def class_name(cls):
+        return "QuantizedVectorStore"
+
+    @property
+    def client(self):
+        return None
+
+    @property
+    def nbytes(self):
+        count = len(self._ids)
+        return 0 if self._vectors is None else self._vectors[:count].nbytes + self._scales[:count].nbytes
+
+    def _quantise(self, vectors):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _append(self, ids, ref_doc_ids, quantised, scales):
+        count = len(self._ids)
+        if self._vectors is None:
+            self._vectors = np.empty((0, quantised.shape[1]), dtype=quantised.dtype)
+            self._scales = np.empty(0, dtype=np.float32)
+        if count + len(ids) > len(self._vectors):
+            # Grow geometrically so inserting document by document stays linear
+            capacity = max(count + len(ids), 2 * len(self._vectors), 1024)
+            vectors = np.empty((capacity, quantised.shape[1]), dtype=quantised.dtype)
+            vectors[:count] = self._vectors[:count]
+            self._vectors = vectors
+            self._scales = np.resize(self._scales[:count], capacity)
+        self._vectors[count:count + len(ids)] = quantised
+        self._scales[count:count + len(ids)] = scales
+        for offset, (node_id, ref_doc_id) in enumerate(zip(ids, ref_doc_ids)):
+            self._positions[node_id] = count + offset
+        self._ids.extend(ids)
+        self._ref_doc_ids.extend(ref_doc_ids)
+
+    def add(self, nodes, **kwargs):
+        if not nodes:
+            return []
+        vectors = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        ids = [node.node_id for node in nodes]
+        self._append(ids, [node.ref_doc_id for node in nodes], *self._quantise(vectors))
+        return ids
+
+    def get(self, node_id):
+        """Return the stored (normalised, dequantised) embedding of ``node_id``"""
+        position = self._positions[node_id]
+        return (self._vectors[position].astype(np.float32) * self._scales[position]).tolist()
+
+    def delete(self, ref_doc_id, **delete_kwargs):
+        keep = [i for i, doc_id in enumerate(self._ref_doc_ids) if doc_id != ref_doc_id]
+        if len(keep) == len(self._ids):
+            return
+        self._vectors = self._vectors[keep]
+        self._scales = self._scales[keep]
+        self._ids = [self._ids[i] for i in keep]
+        self._ref_doc_ids = [self._ref_doc_ids[i] for i in keep]
+        self._positions = {node_id: i for i, node_id in enumerate(self._ids)}
+
+    def query(self, query, **kwargs):
+        if query.filters is not None:
+            raise NotImplementedError("Metadata filters are not supported by QuantizedVectorStore")
+        count = len(self._ids)
+        if not count or query.query_embedding is None:
+            return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+        vector = np.asarray(query.query_embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1
+
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, QUERY_BLOCK):
+            end = min(start + QUERY_BLOCK, count)
+            scores[start:end] = (self._vectors[start:end].astype(np.float32) @ vector) * self._scales[start:end]
+        if query.node_ids or query.doc_ids:
+            allowed = np.zeros(count, dtype=bool)
+            for i, (node_id, ref_doc_id) in enumerate(zip(self._ids, self._ref_doc_ids)):
+                allowed[i] = node_id in (query.node_ids or ()) or ref_doc_id in (query.doc_ids or ())
+            scores[~allowed] = -np.inf
+
+        k = min(query.similarity_top_k, count)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        best = best[np.isfinite(scores[best])]
+        return VectorStoreQueryResult(
+            nodes=None, similarities=scores[best].tolist(), ids=[self._ids[i] for i in best],
+        )
+
+    def persist(self, persist_path, fs=None):
+        count = len(self._ids)
+        path = store_path(os.path.dirname(persist_path))
+        with open(path + ".tmp", "wb") as f:
+            np.savez(
+                f,
+                dtype=np.array(self.dtype),
+                ids=np.array(self._ids, dtype=str),
+                ref_doc_ids=np.array([doc_id or "" for doc_id in self._ref_doc_ids], dtype=str),
+                vectors=self._vectors[:count] if self._vectors is not None else np.empty((0, 0)),
+                scales=self._scales[:count] if self._scales is not None else np.empty(0),
+            )
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir):
+        with np.load(store_path(persist_dir)) as data:
+            store = cls(dtype=str(data["dtype"]))
+            if len(data["ids"]):
+                store._append(
+                    data["ids"].tolist(), [doc_id or None for doc_id in data["ref_doc_ids"].tolist()],
+                    data["vectors"], data["scales"],
+                )
+        return store
+
+
+class FaissVectorStore(BasePydanticVectorStore):
+    """Approximate nearest-neighbour search with a FAISS HNSW or IVF index.
+
+    FAISS labels are positions in ``_ids``. HNSW can't remove vectors, so
+    deleted ones are skipped at query time and the index is rebuilt without
+    them once they make up ``MAX_DELETED`` of it. ``ef_search`` (HNSW) and
+    ``nprobe`` (IVF) trade recall for latency and can change at any time;
+    the rest of the index layout follows from the vector count.
+    """
+
+    stores_text: bool = False
+    kind: str = "hnsw"
+    dtype: str = "float32"
+    ef_search: int = EF_SEARCH
+    nprobe: int = NPROBE
+    _index: object = PrivateAttr(default=None)
+    _spec: str = PrivateAttr(default=None)  # faiss.index_factory description of _index
+    _trained_count: int = PrivateAttr(default=0)
+    _ids: list = PrivateAttr(default_factory=list)
+    _ref_doc_ids: list = PrivateAttr(default_factory=list)
+    _positions: dict = PrivateAttr(default_factory=dict)  # live node id -> label
+    _deleted: set = PrivateAttr(default_factory=set)
+    _mapped_path: str = PrivateAttr(default=None)  # set while _index is loaded read-only (IVF lists mapped)
+
+    def __init__(self, kind="hnsw", dtype="float32", **kwargs):
+        if kind not in ANN_KINDS:
+            raise ValueError(f"Unsupported FAISS index {kind!r}; expected one of {', '.join(ANN_KINDS)}")
+        if dtype not in FAISS_ENCODINGS:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}; expected one of {', '.join(FAISS_ENCODINGS)}")
+        super().__init__(kind=kind, dtype=dtype, **kwargs)
+
+    @classmethod
+    def class_name(cls):
+        return "FaissVectorStore"
+
+    @property
+    def client(self):
+        return self._index
+
+    @property
+    def nbytes(self):
+        """Size of the FAISS index, which lives outside Python's allocator"""
+        return 0 if self._index is None else faiss.serialize_index(self._index).nbytes
+
+    def _layout(self, count):
+        if count < MIN_ANN_VECTORS:
+            return "Flat"
+        encoding = FAISS_ENCODINGS[self.dtype]
+        if self.kind == "hnsw":
+            return f"HNSW{HNSW_M}" if encoding == "Flat" else f"HNSW{HNSW_M}_{encoding}"
+        return f"IVF{int(np.sqrt(count))},{encoding}"
+
+    def _build(self, vectors):
+        self._spec = self._layout(len(vectors))
+        index = faiss.index_factory(vectors.shape[1], self._spec, faiss.METRIC_INNER_PRODUCT)
+        if self._spec.startswith("HNSW"):
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+        if self._spec.startswith("IVF"):
+            # Lets get() and rebuilds reconstruct vectors by label
+            faiss.extract_index_ivf(index).make_direct_map()
+        self._index = index
+        self._trained_count = len(vectors)
+        self._mapped_path = None
+
+    def _live(self):
+        keep = [i for i in range(len(self._ids)) if i not in self._deleted]
+        vectors = self._index.reconstruct_batch(np.array(keep, dtype=np.int64)) if keep else None
+        return keep, vectors
+
+    def _rebuild(self, vectors=None, ids=(), ref_doc_ids=()):
+        """Rebuild the index from its live vectors plus any new ones"""
+        keep, live = self._live() if self._index is not None else ([], None)
+        parts = [part for part in (live, vectors) if part is not None]
+        self._ids = [self._ids[i] for i in keep] + list(ids)
+        self._ref_doc_ids = [self._ref_doc_ids[i] for i in keep] + list(ref_doc_ids)
+        self._positions = {node_id: i for i, node_id in enumerate(self._ids)}
+        self._deleted = set()
+        if parts:
+            self._build(np.vstack(parts))
+        else:
+            self._index, self._spec, self._trained_count = None, None, 0
+
+    def _needs_rebuild(self, count):
+        if self._index is None:
+            return True
+        # Outgrew exact search, or IVF outgrew the clusters it was trained with
+        if self._spec == "Flat":
+            return self._layout(count) != "Flat"
+        return self._spec.startswith("IVF") and count > IVF_REBUILD_GROWTH * self._trained_count
+
+    def add(self, nodes, **kwargs):
+        if not nodes:
+            return []
+        vectors = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        ids = [node.node_id for node in nodes]
+        ref_doc_ids = [node.ref_doc_id for node in nodes]
+        if self._needs_rebuild(len(self._ids) - len(self._deleted) + len(ids)):
+            self._rebuild(vectors, ids, ref_doc_ids)
+            return ids
+        if self._mapped_path:
+            # An index loaded read-only (IVF lists memory-mapped) can't be changed; load it properly first
+            self._index = faiss.read_index(self._mapped_path)
+            self._mapped_path = None
+        start = len(self._ids)
+        self._index.add(vectors)
+        self._ids.extend(ids)
+        self._ref_doc_ids.extend(ref_doc_ids)
+        self._positions.update((node_id, start + i) for i, node_id in enumerate(ids))
+        return ids
+
+    def get(self, node_id):
+        """Return the stored (normalised, decoded) embedding of ``node_id``"""
+        return self._index.reconstruct(self._positions[node_id]).tolist()
+
+    def delete(self, ref_doc_id, **delete_kwargs):
+        labels = [i for i, doc_id in enumerate(self._ref_doc_ids) if doc_id == ref_doc_id and i not in self._deleted]
+        if not labels:
+            return
+        self._deleted.update(labels)
+        for i in labels:
+            self._positions.pop(self._ids[i], None)
+        if len(self._deleted) > MAX_DELETED * len(self._ids):
+            self._rebuild()
+
+    def _search_params(self, k):
+        if self._spec.startswith("HNSW"):
+            return faiss.SearchParametersHNSW(efSearch=max(self.ef_search, k))
+        if self._spec.startswith("IVF"):
+            return faiss.SearchParametersIVF(nprobe=self.nprobe)
+        return None
+
+    def query(self, query, **kwargs):
+        if query.filters is not None:
+            raise NotImplementedError("Metadata filters are not supported by FaissVectorStore")
+        if not self._positions or query.query_embedding is None:
+            return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+        vector = np.asarray([query.query_embedding], dtype=np.float32)
+        faiss.normalize_L2(vector)
+
+        if query.node_ids or query.doc_ids:
+            # A handful of candidates; score them exactly
+            labels = np.array([
+                i for node_id, i in self._positions.items()
+                if node_id in (query.node_ids or ()) or self._ref_doc_ids[i] in (query.doc_ids or ())
+            ], dtype=np.int64)
+            scores = self._index.reconstruct_batch(labels) @ vector[0] if len(labels) else np.empty(0)
+            order = np.argsort(-scores)[:query.similarity_top_k]
+            scores, labels = scores[order], labels[order]
+        else:
+            # Ask for extra neighbours to make up for deleted ones
+            k = min(query.similarity_top_k + len(self._deleted), len(self._ids))
+            scores, labels = self._index.search(vector, k, params=self._search_params(k))
+            scores, labels = scores[0], labels[0]
+            live = [j for j, i in enumerate(labels) if i >= 0 and i not in self._deleted]
+            live = live[:query.similarity_top_k]
+            scores, labels = scores[live], labels[live]
+        return VectorStoreQueryResult(
+            nodes=None, similarities=scores.tolist(), ids=[self._ids[i] for i in labels],
+        )
+
+    def persist(self, persist_path, fs=None):
+        persist_dir = os.path.dirname(persist_path)
+        if self._index is not None and not self._mapped_path:
+            path = faiss_path(persist_dir)
+            faiss.write_index(self._index, path + ".tmp")
+            os.replace(path + ".tmp", path)
+        path = store_path(persist_dir)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(
+                f,
+                kind=np.array(self.kind),
+                dtype=np.array(self.dtype),
+                spec=np.array(self._spec or ""),
+                trained_count=np.array(self._trained_count),
+                ids=np.array(self._ids, dtype=str),
+                ref_doc_ids=np.array([doc_id or "" for doc_id in self._ref_doc_ids], dtype=str),
+                deleted=np.array(sorted(self._deleted), dtype=np.int64),
+            )
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir, **kwargs):
+        with np.load(store_path(persist_dir)) as data:
+            store = cls(kind=str(data["kind"]), dtype=str(data["dtype"]), **kwargs)
+            store._ids = data["ids"].tolist()
+            store._ref_doc_ids = [doc_id or None for doc_id in data["ref_doc_ids"].tolist()]
+            store._deleted = set(data["deleted"].tolist())
+            store._spec = str(data["spec"]) or None
+            store._trained_count = int(data["trained_count"])
+        store._positions = {
+            node_id: i for i, node_id in enumerate(store._ids) if i not in store._deleted
+        }
+        if store._ids:
+            path = faiss_path(persist_dir)
+            store._index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            store._mapped_path = path
+        return store
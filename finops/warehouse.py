@@ -0,0 +1,242 @@
+"""Local Parquet warehouse of daily Cost Explorer results.
+
+Each dataset (a fixed set of group-bys and filters) is stored per account and
+partitioned by day:
+
+    storage/cost_warehouse/<account>/<dataset>/date=YYYY-MM-DD/part.parquet
+
+``sync_costs`` only asks Cost Explorer for days that are not stored yet plus a
+short restatement window (recent days that AWS may still revise), following
+every NextPageToken. Pages then read any date range from local files.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from finops.aws_clients import get_client
+
+WAREHOUSE_DIR = "storage/cost_warehouse"
+RESTATEMENT_DAYS = 3
+BACKFILL_DAYS = 90
+SYNC_INTERVAL = 6 * 3600  # Don't resync a dataset more often than this
+MAX_ACCOUNT_IDS = 256
+
+_account_ids = {}  # (access key id, secret digest, token digest) -> account id
+_account_ids_lock = threading.Lock()
+
+CostDataset = namedtuple("CostDataset", ["name", "group_by", "filter", "metric"])
+
+INSTANCE_COSTS = CostDataset(
+    name="instance_costs",
+    group_by=["SERVICE", "INSTANCE_TYPE"],
+    filter={
+        "Dimensions": {
+            "Key": "SERVICE",
+            "Values": ["Amazon Relational Database Service", "Amazon Elastic Compute Cloud - Compute"],
+        }
+    },
+    metric="UnblendedCost",
+)
+
+# Every service, for anomaly detection. Cost Explorer allows two group-bys, so
+# the account is the warehouse directory the dataset is stored under.
+SERVICE_USAGE_COSTS = CostDataset(
+    name="service_usage_costs",
+    group_by=["SERVICE", "USAGE_TYPE"],
+    filter=None,
+    metric="UnblendedCost",
+)
+
+
+def regional_dataset(dataset, region):
+    """Return ``dataset`` restricted to one region, stored as its own dataset"""
+    region_filter = {"Dimensions": {"Key": "REGION", "Values": [region]}}
+    return dataset._replace(
+        name=f"{dataset.name}_{region}",
+        filter={"And": [dataset.filter, region_filter]} if dataset.filter else region_filter,
+    )
+
+
+def get_account_id(aws_access_key_id, aws_secret_access_key, region_name=None, aws_session_token=None):
+    """Return the account the credentials belong to, so accounts never mix"""
+    # The secret is hashed so it isn't kept around as a dictionary key
+    key = (
+        aws_access_key_id,
+        hashlib.sha256((aws_secret_access_key or "").encode()).hexdigest(),
+        hashlib.sha256((aws_session_token or "").encode()).hexdigest(),
+    )
+    account_id = _account_ids.get(key)
+    if account_id is None:
+        sts = get_client("sts", aws_access_key_id, aws_secret_access_key, region_name, aws_session_token)
+        account_id = sts.get_caller_identity()["Account"]
+        with _account_ids_lock:
+            if len(_account_ids) >= MAX_ACCOUNT_IDS:
+                _account_ids.pop(next(iter(_account_ids)))
+            _account_ids[key] = account_id
+    return account_id
+
+
+def clear_account_ids():
+    """Forget every cached account id, e.g. after credentials were rotated"""
+    with _account_ids_lock:
+        _account_ids.clear()
+
+
+def _column_names(dataset):
+    return [key.lower() for key in dataset.group_by]
+
+
+def _dataset_dir(account_id, dataset, root=WAREHOUSE_DIR):
+    return os.path.join(root, account_id, dataset.name)
+
+
+def _partition_path(dataset_dir, day):
+    return os.path.join(dataset_dir, f"date={day.isoformat()}", "part.parquet")
+
+
+def stored_days(account_id, dataset, root=WAREHOUSE_DIR):
+    """Return the set of days that already have a partition"""
+    dataset_dir = _dataset_dir(account_id, dataset, root)
+    if not os.path.isdir(dataset_dir):
+        return set()
+    days = set()
+    for name in os.listdir(dataset_dir):
+        if name.startswith("date=") and os.path.exists(os.path.join(dataset_dir, name, "part.parquet")):
+            days.add(date.fromisoformat(name[len("date="):]))
+    return days
+
+
+def days_to_sync(stored, start, end, restatement_days=RESTATEMENT_DAYS):
+    """Return the sorted days in [start, end) that are missing or still restatable"""
+    restate_from = end - timedelta(days=restatement_days)
+    days = []
+    day = start
+    while day < end:
+        if day not in stored or day >= restate_from:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def _contiguous_ranges(days):
+    """Group sorted days into [start, end) ranges so each range is one query"""
+    ranges = []
+    for day in days:
+        if ranges and ranges[-1][1] == day:
+            ranges[-1][1] = day + timedelta(days=1)
+        else:
+            ranges.append([day, day + timedelta(days=1)])
+    return ranges
+
+
+def fetch_daily_costs(ce_client, dataset, start, end):
+    """Fetch [start, end) at DAILY granularity, following every page token"""
+    columns = _column_names(dataset)
+    rows = []
+    kwargs = {
+        "TimePeriod": {"Start": start.isoformat(), "End": end.isoformat()},
+        "Granularity": "DAILY",
+        "Metrics": [dataset.metric],
+        "GroupBy": [{"Type": "DIMENSION", "Key": key} for key in dataset.group_by],
+    }
+    if dataset.filter:
+        kwargs["Filter"] = dataset.filter
+    while True:
+        response = ce_client.get_cost_and_usage(**kwargs)
+        for result in response["ResultsByTime"]:
+            day = result["TimePeriod"]["Start"]
+            for group in result["Groups"]:
+                amount = float(group["Metrics"][dataset.metric]["Amount"])
+                rows.append([day] + list(group["Keys"]) + [amount])
+        token = response.get("NextPageToken")
+        if not token:
+            break
+        kwargs["NextPageToken"] = token
+    df = pd.DataFrame(rows, columns=["date"] + columns + ["cost"])
+    df["date"] = pd.to_datetime(df["date"]).dt.date
+    return df
+
+
+def _write_day(dataset_dir, dataset, day, df):
+    path = _partition_path(dataset_dir, day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # An empty partition is still written so the day counts as synced
+    day_df = df.drop(columns=["date"]).reset_index(drop=True)
+    day_df = day_df.astype({column: "string" for column in _column_names(dataset)})
+    day_df["cost"] = day_df["cost"].astype("float64")
+    tmp_path = path + ".tmp"
+    day_df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _sync_state_path(account_id, dataset, root):
+    return os.path.join(_dataset_dir(account_id, dataset, root), "_sync.json")
+
+
+def last_synced(account_id, dataset, root=WAREHOUSE_DIR):
+    path = _sync_state_path(account_id, dataset, root)
+    if not os.path.exists(path):
+        return 0.0
+    with open(path) as f:
+        return json.load(f).get("synced_at", 0.0)
+
+
+def sync_costs(ce_client, account_id, dataset=INSTANCE_COSTS, start=None, end=None,
+               root=WAREHOUSE_DIR, restatement_days=RESTATEMENT_DAYS, force=False):
+    """Bring the local copy of ``dataset`` up to date and return the days fetched.
+
+    Skips the Cost Explorer call entirely when the dataset was synced less than
+    SYNC_INTERVAL ago and every day in the range is already stored.
+    """
+    end = end or datetime.now(timezone.utc).date() + timedelta(days=1)
+    start = start or end - timedelta(days=BACKFILL_DAYS)
+    stored = stored_days(account_id, dataset, root)
+    recently_synced = time.time() - last_synced(account_id, dataset, root) < SYNC_INTERVAL
+    missing = days_to_sync(stored, start, end, 0)
+    if not force and recently_synced and not missing:
+        return []
+
+    days = days_to_sync(stored, start, end, restatement_days)
+    dataset_dir = _dataset_dir(account_id, dataset, root)
+    for range_start, range_end in _contiguous_ranges(days):
+        df = fetch_daily_costs(ce_client, dataset, range_start, range_end)
+        by_day = dict(tuple(df.groupby("date"))) if not df.empty else {}
+        day = range_start
+        while day < range_end:
+            _write_day(dataset_dir, dataset, day, by_day.get(day, df.iloc[0:0]))
+            day += timedelta(days=1)
+
+    os.makedirs(dataset_dir, exist_ok=True)
+    with open(_sync_state_path(account_id, dataset, root), "w") as f:
+        json.dump({"synced_at": time.time()}, f)
+    return days
+
+
+def read_costs(account_id, dataset=INSTANCE_COSTS, start=None, end=None, root=WAREHOUSE_DIR):
+    """Return stored rows for days in [start, end) as a DataFrame"""
+    columns = ["date"] + _column_names(dataset) + ["cost"]
+    dataset_dir = _dataset_dir(account_id, dataset, root)
+    if not stored_days(account_id, dataset, root):
+        return pd.DataFrame(columns=columns)
+    partitions = ds.dataset(
+        dataset_dir,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("date", pa.date32())]), flavor="hive"),
+    )
+    # Partition pruning: only files for days inside the range are opened
+    condition = None
+    if start:
+        condition = ds.field("date") >= pa.scalar(start, pa.date32())
+    if end:
+        before_end = ds.field("date") < pa.scalar(end, pa.date32())
+        condition = before_end if condition is None else condition & before_end
+    table = partitions.to_table(columns=columns, filter=condition)
+    return table.to_pandas()
@@ -0,0 +1,63 @@
+import streamlit as st
+from finops.lazy import lazy_import
+from finops.perf_panel import render_perf_panel
+
+# AWS, pandas and pyarrow are only loaded once the button is pressed
+cost_queries = lazy_import("finops.cost_queries")
+fanout = lazy_import("finops.fanout")
+
+st.set_page_config(page_title="Spend Anomalies", page_icon="📈", layout="centered", initial_sidebar_state="auto", menu_items=None)
+st.title('Spend Anomalies')
+st.write(
+    "Daily spend per service and usage type, compared with the four weeks before it after allowing for "
+    "the day of the week. Provide access keys with read permissions for the AWS Cost Explorer API."
+)
+
+aws_access_key_id = st.text_input("AWS Access Key ID", type="password")
+aws_secret_access_key = st.text_input("AWS Secret Access Key", type="password")
+region_name = st.text_input("AWS Region (optional)", "eu-west-2")
+
+# Cost Explorer is global, so only accounts are fanned out over
+with st.expander("Multiple accounts"):
+    accounts_text = st.text_input("Account IDs (comma-separated)")
+    role_name = st.text_input("Role to assume in each account", "FinOpsReadOnly")
+
+
+def show_anomalies(anomalies):
+    if anomalies is None or anomalies.empty:
+        st.success("No spend anomalies in the last week.")
+        return
+    st.metric(label="Extra spend on anomalous days", value=f"${anomalies['Increase'].sum():,.2f}",
+              delta=f"{len(anomalies)} anomalies", delta_color="off")
+    st.dataframe(anomalies, hide_index=True)
+
+
+if st.button("Find Anomalies"):
+    accounts = fanout.parse_list(accounts_text)
+    if aws_access_key_id and aws_secret_access_key and accounts:
+        scan = fanout.FanOut(
+            {"aws_access_key_id": aws_access_key_id, "aws_secret_access_key": aws_secret_access_key},
+            role_name=role_name,
+        )
+        with st.spinner("Scoring daily spend in every account..."):
+            anomalies = None
+            results = scan.run(scan.targets(accounts, [region_name]), fanout.spend_anomalies, services=("ce",))
+            for anomalies, result in fanout.merge_results(results):
+                if result.error:
+                    st.warning(f"{result.target.account_id}: {result.error}")
+        if anomalies is not None and not anomalies.empty:
+            anomalies = anomalies.drop(columns="Region").sort_values("Increase", ascending=False, ignore_index=True)
+        show_anomalies(anomalies)
+    elif aws_access_key_id and aws_secret_access_key:
+        with st.spinner("Scoring daily spend..."):
+            anomalies, message = cost_queries.get_spend_anomalies(aws_access_key_id, aws_secret_access_key, region_name)
+        if anomalies is not None or message == cost_queries.NO_ANOMALIES:
+            show_anomalies(anomalies)
+        elif message == cost_queries.NOT_ENOUGH_HISTORY:
+            st.info(message)
+        else:
+            st.warning(message)
+    else:
+        st.warning("Please provide both Access Key ID and Secret Access Key.")
+
+render_perf_panel()
@@ -1,6 +1,12 @@
-import boto3
+import time
+
 import streamlit as st
-from datetime import datetime, timedelta, timezone
+from finops.actions import TokenBucket, send_notifications, tag_resources
+from finops.aws_clients import get_client
+from finops.fanout import INACTIVE_COLUMNS, FanOut
+from finops.jobs import is_active, last_failure, start_job
+from finops.perf_panel import render_perf_panel
+from finops.snapshots import latest_snapshot
 
 # Collect AWS credentials from the user
 aws_access_key_id = st.secrets["AWS_ACCESS_KEY_ID"]
@@ -12,126 +18,89 @@ region_name = st.secrets["REGION_NAME"]
 #aws_secret_access_key = st.text_input("AWS Secret Access Key", type="password")
 #region_name = st.text_input("AWS Region (optional)", "eu-west-2")
 
-# Initialise boto3 clients
-rds_client = boto3.client(
-    'rds',
-    aws_access_key_id=aws_access_key_id,
-    aws_secret_access_key=aws_secret_access_key,
-    region_name=region_name)
-cloudwatch_client = boto3.client(
-    'cloudwatch',
-    aws_access_key_id=aws_access_key_id,
-    aws_secret_access_key=aws_secret_access_key,
-    region_name=region_name)
-ses_client = boto3.client(
-    'ses',
-    aws_access_key_id=aws_access_key_id,
-    aws_secret_access_key=aws_secret_access_key,
-    region_name=region_name
-    )  # Or ses_client if using SES
-
-
-# Function to find inactive RDS instances
-def find_inactive_rds_instances():
-    # Get the current time and time from 30 days ago (timezone aware)
-    current_time = datetime.now(timezone.utc)
-    past_time = current_time - timedelta(days=30)
-    
-    # Get all RDS instances
-    rds_instances = rds_client.describe_db_instances()
-    inactive_instances = []
-    
-    for instance in rds_instances['DBInstances']:
-        db_instance_id = instance['DBInstanceIdentifier']
-        master_username = instance['MasterUsername']
-        
-        # Get CloudWatch metrics for the DB instance
-        response = cloudwatch_client.get_metric_statistics(
-            Namespace='AWS/RDS',
-            MetricName='DatabaseConnections',
-            Dimensions=[
-                {
-                    'Name': 'DBInstanceIdentifier',
-                    'Value': db_instance_id
-                },
-            ],
-            StartTime=past_time,
-            EndTime=current_time,
-            Period=86400,  # 1 day interval
-            Statistics=['Sum']
-        )
-        
-        # Sum of connections over the last 30 days
-        total_connections = sum([datapoint['Sum'] for datapoint in response['Datapoints']])
-        
-        # If there are no connections, add to inactive instances list
-        if total_connections == 0:
-            inactive_instances.append((db_instance_id, master_username))
-    
-    return inactive_instances
-
-# Function to tag the instance for deletion
-def tag_instance_for_deletion(db_instance_id):
-    # Tag the instance as "for_deletion"
-    rds_client.add_tags_to_resource(
-        ResourceName=f'arn:aws:rds:region:account-id:db:{db_instance_id}',  # Replace with actual region/account
-        Tags=[
-            {
-                'Key': 'for_deletion',
-                'Value': 'true'
-            }
-        ]
-    )
-    print(f"Instance {db_instance_id} tagged for deletion.")
-    
-# Function to notify the DB creator
-def notify_db_creator(db_instance_id, master_username, notification_email):
-    # Message to notify the user of the impending deletion
-    subject = f"RDS Instance {db_instance_id} Scheduled for Deletion"
-    message = f"""
-    Dear {master_username},
-
-    Your RDS instance '{db_instance_id}' has not had any connections in the past 30 days.
-    It is has been tagged and scheduled for deletion in 7 days unless you remove the tag.
-
-    If you wish to keep this instance, please ensure the tag is removed before the deletion date.
-    """
-
-    # Alternatively, if using SES:
-    ses_client.send_email(
-        Source='your-email@example.com',  # Replace with an SES verified email.
-        Destination={'ToAddresses': [notification_email]},
-        Message={
-        'Subject': {'Data': subject},
-        'Body': {'Text': {'Data': message}}
-        }
-    )
+# Optional: scan several accounts and regions at once, configured in secrets
+#   SCAN_ACCOUNTS = ["111111111111", "222222222222"]
+#   SCAN_REGIONS = ["eu-west-1", "eu-west-2", "us-east-1"]
+#   SCAN_ROLE_NAME = "FinOpsReadOnly"  # assumed in each account
+# The scan itself runs as the rds_inactive job (finops/jobs.py), in the
+# background or from `python -m finops.jobs schedule`; this page shows its
+# latest snapshot
+fanout = FanOut(
+    {"aws_access_key_id": aws_access_key_id, "aws_secret_access_key": aws_secret_access_key},
+    role_name=st.secrets.get("SCAN_ROLE_NAME"),
+)
+
+# Shared client, created once per process rather than on every rerun
+ses_client = get_client('ses', aws_access_key_id, aws_secret_access_key, region_name)
+
+
+# SES allows MaxSendRate emails a second across the whole account, so every
+# session sends through the same bucket
+@st.cache_resource
+def send_bucket():
+    return TokenBucket(ses_client.get_send_quota()['MaxSendRate'])
+
+
+notification_source = st.secrets.get('NOTIFICATION_SOURCE', 'your-email@example.com')  # an SES verified email
 
 # Streamlit UI
 st.title('Inactive RDS Instances Finder')
 
-# Button to find inactive RDS instances
+# Start a scan in the background; the page never waits for it
 if st.button('Find Inactive RDS Instances'):
-    with st.spinner('Fetching inactive instances...'):
-        inactive_instances = find_inactive_rds_instances()
-    
-    if inactive_instances:
-        st.success(f'Found {len(inactive_instances)} inactive instances:')
-        for db_instance_id, master_username in inactive_instances:
-            st.write(f"DB Instance: {db_instance_id}, Master Username: {master_username}")
-            
-            # Fetch the notification email from tags or provide manually
-            # For demo purposes, assume email is stored in tags (replace with real logic)
-            db_tags = rds_client.list_tags_for_resource(ResourceName=f'arn:aws:rds:region:account-id:db:{db_instance_id}')
-            notification_email = None
-            for tag in db_tags['TagList']:
-                if tag['Key'] == 'CreatorEmail':
-                    notification_email = tag['Value']
-            
-            if notification_email:
-                notify_db_creator(db_instance_id, master_username, notification_email)
-                st.write(f'Notification sent to {notification_email}')
-            else:
-                st.write(f'No notification email found for {db_instance_id}')
-    else:
-        st.info('No inactive instances found.')
+    if not start_job('rds_inactive', st.secrets.to_dict(), force=True):
+        st.info('A scan is already running.')
+
+
+# While a scan runs, check for its snapshot every few seconds
+scan_polling = is_active('rds_inactive')
+
+
+@st.fragment(run_every=5 if scan_polling else None)
+def show_latest_scan():
+    running = is_active('rds_inactive')
+    if scan_polling and not running:
+        # The scan finished; rerun the page so the fragment stops polling
+        st.rerun()
+    if running:
+        st.info('Scanning every account and region in the background...')
+    if last_failure('rds_inactive'):
+        st.error(f"The last scan failed: {last_failure('rds_inactive')}")
+    snapshot = latest_snapshot('rds_inactive')
+    if snapshot is None:
+        st.info('No scan has run yet.')
+        return
+    st.caption(f'Scanned {(time.time() - snapshot.created_at) / 60:.0f} minutes ago in {snapshot.seconds:.0f}s')
+    for error in snapshot.errors:
+        st.warning(f"{error['account']} / {error['region']}: {error['error']}")
+    st.dataframe(snapshot.data)
+
+
+show_latest_scan()
+
+snapshot = latest_snapshot('rds_inactive')
+if snapshot is not None and len(snapshot.data):
+    st.success(f'Found {len(snapshot.data)} inactive instances.')
+    if not set(INACTIVE_COLUMNS) <= set(snapshot.data.columns):
+        st.info('This scan predates tagging from the page; run a new scan to act on these instances.')
+    elif not is_active('rds_inactive') and st.button('Tag for deletion and notify creators'):
+        instances = snapshot.data
+        with st.spinner('Tagging instances and notifying their creators...'):
+            tagged = tag_resources(fanout, instances)
+            # Owners hear about each instance once, when it's first tagged
+            newly_tagged = instances[
+                ~instances['Tagged for Deletion'] & ~instances['DB Instance ARN'].isin(tagged.failed)
+            ]
+            notified = send_notifications(ses_client, newly_tagged, notification_source, send_bucket())
+        st.write(f'Tagged {tagged.done} instances for deletion ({tagged.skipped} already were).')
+        st.write(f'Notified {notified.done} creators. {notified.skipped} instances have no CreatorEmail tag.')
+        for arn, error in tagged.failed.items():
+            st.warning(f'Could not tag {arn}: {error}')
+        for email, error in notified.failed.items():
+            st.warning(f'Could not notify {email}: {error}')
+        # Rescan so the snapshot shows the new tags
+        start_job('rds_inactive', st.secrets.to_dict())
+elif snapshot is not None:
+    st.info('No inactive instances found.')
+
+render_perf_panel()
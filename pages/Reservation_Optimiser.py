@@ -1,104 +1,12 @@
+import time
+
 import streamlit as st
-import boto3
-import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
-from botocore.exceptions import NoCredentialsError, PartialCredentialsError
-from streamlit_extras.metric_cards import style_metric_cards
-
-pricing_client = boto3.client('pricing', region_name='eu-west-2')
-
-# Connect to AWS Cost Explorer
-def get_top_rds_ec2_costs(aws_access_key_id, aws_secret_access_key, region_name):
-    try:
-        # Create a boto3 client for Cost Explorer
-        client = boto3.client(
-            'ce',
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key,
-            region_name=region_name
-        )
-
-        # Define the time period for the past month
-        end_date = datetime.now().date()
-        start_date = (end_date.replace(day=1) - timedelta(days=1)).replace(day=1)
-
-        # Query AWS Cost Explorer for RDS and EC2 On-Demand costs
-        response = client.get_cost_and_usage(
-            TimePeriod={
-                'Start': start_date.strftime('%Y-%m-%d'),
-                'End': end_date.strftime('%Y-%m-%d')
-            },
-            Granularity='MONTHLY',
-            Metrics=['UnblendedCost'],
-            GroupBy=[
-                {'Type': 'DIMENSION', 'Key': 'SERVICE'},
-                {'Type': 'DIMENSION', 'Key': 'INSTANCE_TYPE'}
-            ],
-            Filter={
-                'Dimensions': {
-                    'Key': 'SERVICE',
-                    'Values': ['Amazon Relational Database Service', 'Amazon Elastic Compute Cloud - Compute']
-                }
-            }
-        )
-
-        # Check if there are any results
-        if not response['ResultsByTime'][0]['Groups']:
-            return None, "No costs or instances found for the specified time period."
-
-        # Parse the response to find top 5 RDS and EC2 instances by cost
-        cost_data = []
-        for result in response['ResultsByTime'][0]['Groups']:
-            service = result['Keys'][0]
-            instance_type = result['Keys'][1]
-            amount = float(result['Metrics']['UnblendedCost']['Amount'])
-            reserved_cost = get_reserved_instance_pricing(instance_type, 'eu-west-2')
-            percentage_saving = 0
-            if reserved_cost:
-                saving_perc=(amount-reserved_cost)/amount
-                percentage_saving = saving_perc
-            cost_data.append([service, instance_type, amount, reserved_cost, percentage_saving])
-
-        # Create a DataFrame and sort by cost
-        df = pd.DataFrame(cost_data, columns=['Service', 'Instance Type', 'Cost', 'Reserved Cost', 'Percentage Saving'])
-        top_5 = df.sort_values(by='Cost', ascending=False).head(10)
-
-        return top_5, None
-    
-    except NoCredentialsError:
-        return None, "No credentials provided."
-    except PartialCredentialsError:
-        return None, "Incomplete credentials provided."
-    except Exception as e:
-        return None, str(e)
-    
-def get_reserved_instance_pricing(instance_type, region):
-    try:
-        response = pricing_client.get_products(
-            ServiceCode='AmazonRDS',
-            Filters=[
-                {'Type': 'TERM_MATCH', 'Field': 'instanceType', 'Value': instance_type},
-                {'Type': 'TERM_MATCH', 'Field': 'location', 'Value': region},
-                {'Type': 'TERM_MATCH', 'Field': 'termType', 'Value': 'Reserved'},
-                {'Type': 'TERM_MATCH', 'Field': 'tenancy', 'Value': 'Shared'},
-                {'Type': 'TERM_MATCH', 'Field': 'preInstalledSw', 'Value': 'NA'},
-                {'Type': 'TERM_MATCH', 'Field': 'capacitystatus', 'Value': 'Used'}
-            ],
-            MaxResults=1
-        )
-
-        # Extract the reserved instance price from the response
-        product = response['PriceList'][0]
-        product_data = eval(product)  # Convert JSON string to dictionary
-        price_dimensions = product_data['terms']['Reserved'].values()
-        for dimension in price_dimensions:
-            price_per_hour = dimension['priceDimensions'].values()[0]['pricePerUnit']['USD']
-            return float(price_per_hour)
-
-    except Exception as e:
-        print(f"Error fetching reserved pricing for {instance_type}: {e}")
-        return None
+from finops.jobs import is_active, last_failure, start_job
+from finops.lazy import lazy_import
+from finops.perf_panel import render_perf_panel
+from finops.snapshots import latest_snapshot
+
+forecast = lazy_import("finops.forecast")
 
 # Streamlit app interface
 st.set_page_config(page_title="Rate Reduction Genie", page_icon="🧞‍♂️", layout="centered", initial_sidebar_state="auto", menu_items=None)
@@ -112,24 +20,99 @@ aws_access_key_id = st.secrets["AWS_ACCESS_KEY_ID"]
 aws_secret_access_key = st.secrets["AWS_SECRET_ACCESS_KEY"]
 region_name = st.secrets["REGION_NAME"]
 
-# Submit button
-if aws_access_key_id and aws_secret_access_key:
-    # Fetch AWS cost data
-    top_5_instances, message = get_top_rds_ec2_costs(aws_access_key_id, aws_secret_access_key, region_name)
-    if top_5_instances is not None:
-        # Display the top 5 instances
-        st.write(top_5_instances)
-
-            # Plot the top 5 instances with Matplotlib
-            #plt.bar(top_5_instances['Instance Type'], top_5_instances['Cost'], color='skyblue')
-            #plt.figure(figsize=(10, 6))
-            #plt.title('Top 5 RDS and EC2 Instances by On-Demand Cost')
-            #plt.xlabel('Instance Type')
-            #plt.ylabel('Cost ($)')
-            #plt.xticks(rotation=45)
-            #st.pyplot(plt)
-
-    else:
-        st.warning(message)
+# Optional: cover several accounts and regions, configured as on the RDS page
+#   SCAN_ACCOUNTS, SCAN_REGIONS and SCAN_ROLE_NAME
+# The costs are synced and ranked by the cost_sync job, and the daily spend
+# per instance family collected by the usage_history job (finops/jobs.py);
+# this page shows their latest snapshots
+JOB_NAMES = ("cost_sync", "usage_history")
+
+if not (aws_access_key_id and aws_secret_access_key):
+    st.warning("Please provide both Access Key ID and Secret Access Key.")
 else:
-    st.warning("Please provide both Access Key ID and Secret Access Key.")
\ No newline at end of file
+    for name in JOB_NAMES:
+        if latest_snapshot(name) is None:
+            # Nothing to show yet: sync in the background rather than in this script run
+            start_job(name, st.secrets.to_dict())
+
+if st.button("Refresh costs"):
+    # The cost agent's remembered tool results would show the old numbers
+    st.session_state.pop("tool_results", None)
+    # Re-fetch from Cost Explorer, even if the warehouse was synced in the last few hours
+    if not [name for name in JOB_NAMES if start_job(name, st.secrets.to_dict(), force=True)]:
+        st.info("Costs are already being refreshed.")
+
+
+# While a sync runs, check for its snapshot every few seconds
+cost_sync_polling = is_active("cost_sync")
+
+
+@st.fragment(run_every=5 if cost_sync_polling else None)
+def show_top_instances():
+    running = is_active("cost_sync")
+    if cost_sync_polling and not running:
+        # The sync finished; rerun the page so the fragment stops polling
+        st.rerun()
+    if running:
+        st.info("Fetching costs for every account and region in the background...")
+    if last_failure("cost_sync"):
+        st.warning(last_failure("cost_sync"))
+    snapshot = latest_snapshot("cost_sync")
+    if snapshot is None:
+        return
+    st.caption(f"Updated {(time.time() - snapshot.created_at) / 60:.0f} minutes ago")
+    for error in snapshot.errors:
+        st.warning(f"{error['account']} / {error['region']}: {error['error']}")
+    # Display the top instances
+    st.write(snapshot.data)
+
+
+show_top_instances()
+
+st.subheader("Will the usage last?")
+st.write(
+    "Daily On-Demand spend per instance family is fitted with a trend and a weekly cycle and projected over "
+    "the term. The baseline commitment is the spend each family is expected to stay above for the whole term."
+)
+term_years = st.radio("Term", [1, 3], format_func=lambda years: f"{years} year{'s' if years > 1 else ''}",
+                      horizontal=True)
+coverage = st.slider("Prediction interval", 0.5, 0.99, 0.8)
+
+
+usage_history_polling = is_active("usage_history")
+
+
+@st.fragment(run_every=5 if usage_history_polling else None)
+def show_forecasts(horizon_days, coverage):
+    running = is_active("usage_history")
+    if usage_history_polling and not running:
+        st.rerun()
+    if running:
+        st.info("Fetching daily spend per instance family in the background...")
+    if last_failure("usage_history"):
+        st.warning(last_failure("usage_history"))
+    snapshot = latest_snapshot("usage_history")
+    if snapshot is None or snapshot.data.empty:
+        return
+    usage = snapshot.data
+    first_day, last_day = usage["date"].min(), usage["date"].max()
+    if (last_day - first_day).days + 1 < forecast.MIN_HISTORY:
+        st.info(f"Forecasts need at least {forecast.MIN_HISTORY} days of spend; "
+                f"there are {(last_day - first_day).days + 1} so far.")
+        return
+    keys = [column for column in ("Account", "Region", "Service", "Family") if column in usage.columns]
+    # Every family is fitted in one batch, so this reruns with each change of term or interval
+    forecasts = forecast.forecast_usage(usage, keys, horizon_days, coverage)
+    st.dataframe(forecasts, hide_index=True)
+
+    labels = forecasts[keys].astype(str).agg(" / ".join, axis=1)
+    row = st.selectbox("Instance family", forecasts.index, format_func=labels.__getitem__)
+    selected = (usage[keys] == forecasts.loc[row, keys]).all(axis=1)
+    daily = usage[selected].groupby("date")["cost"].sum()
+    # Recently launched families count as no spend before their first day
+    st.line_chart(forecast.forecast_series(daily, horizon_days, coverage, start=first_day, end=last_day))
+
+
+show_forecasts(365 * term_years, coverage)
+
+render_perf_panel()
@@ -1,13 +1,17 @@
 import streamlit as st
-import openai
 from llama_index.llms.openai import OpenAI
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings
-from llama_index.core.agent import ReActAgent
-from llama_index.core.tools import FunctionTool
-import boto3
-import pandas as pd
-from datetime import datetime, timedelta
-from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+from llama_index.core.memory import Memory
+import time
+from finops.agent import answer_tokens, build_agent, iter_agent_events
+from finops.agent_tools import cached_tool
+from finops.cur_store import query_cur_spend
+from finops.lazy import lazy_import
+from finops.llm_tracing import instrument_llama_index
+from finops.perf_panel import render_perf_panel
+from finops.tracing import span, time_to_first_token
+
+# Only loaded when the agent first calls the tool
+cost_queries = lazy_import("finops.cost_queries")
 
 
 st.set_page_config(page_title="AWS FinOps Agent", page_icon="", layout="centered", initial_sidebar_state="auto", menu_items=None)
@@ -17,71 +21,46 @@ aws_access_key_id = st.secrets["AWS_ACCESS_KEY_ID"]
 aws_secret_access_key = st.secrets["AWS_SECRET_ACCESS_KEY"]
 region_name = st.secrets["REGION_NAME"]
 
-def get_top_rds_ec2_costs(**kwargs):
-    """Search AWS account for top RDS and EC2 instances by cost and returns dataframe of top instances"""
-    try:
-        # Create a boto3 client for Cost Explorer
-        client = boto3.client(
-            'ce',
-            aws_access_key_id = aws_access_key_id,
-            aws_secret_access_key = aws_secret_access_key,
-            region_name = region_name
-        )
-
-        # Define the time period for the past month
-        end_date = datetime.now().date()
-        start_date = (end_date.replace(day=1) - timedelta(days=1)).replace(day=1)
-
-        # Query AWS Cost Explorer for RDS and EC2 On-Demand costs
-        response = client.get_cost_and_usage(
-            TimePeriod={
-                'Start': start_date.strftime('%Y-%m-%d'),
-                'End': end_date.strftime('%Y-%m-%d')
-            },
-            Granularity='MONTHLY',
-            Metrics=['UnblendedCost'],
-            GroupBy=[
-                {'Type': 'DIMENSION', 'Key': 'SERVICE'},
-                {'Type': 'DIMENSION', 'Key': 'INSTANCE_TYPE'}
-            ],
-            Filter={
-                'Dimensions': {
-                    'Key': 'SERVICE',
-                    'Values': ['Amazon Relational Database Service', 'Amazon Elastic Compute Cloud - Compute']
-                }
-            }
-        )
-
-        # Check if there are any results
-        if not response['ResultsByTime'][0]['Groups']:
-            return None, "No costs or instances found for the specified time period."
-
-        # Parse the response to find top 5 RDS and EC2 instances by cost
-        cost_data = []
-        for result in response['ResultsByTime'][0]['Groups']:
-            service = result['Keys'][0]
-            instance_type = result['Keys'][1]
-            amount = float(result['Metrics']['UnblendedCost']['Amount'])
-            cost_data.append([service, instance_type, amount])
-
-        # Create a DataFrame and sort by cost
-        df = pd.DataFrame(cost_data, columns=['Service', 'Instance Type', 'Cost'])
-        top_10 = df.sort_values(by='Cost', ascending=False).head(10)
-
-        return top_10, None
-    
-    except NoCredentialsError:
-        return None, "No credentials provided."
-    except PartialCredentialsError:
-        return None, "Incomplete credentials provided."
-    except Exception as e:
-        return None, str(e) 
-
-aws_top_instances_tool = FunctionTool.from_defaults(fn=get_top_rds_ec2_costs)
+def get_top_rds_ec2_costs(include_reserved: bool = False, limit: int = 10, region_only: bool = False):
+    """Return the RDS and EC2 instance types with the highest cost since the start of last month.
+
+    include_reserved: also estimate each one's reserved cost and saving.
+    limit: how many instance types to return.
+    region_only: only count spend in the configured region.
+    """
+    # Served from the shared cost-query cache, so the pages and the agent share results
+    return cost_queries.get_top_rds_ec2_costs(
+        aws_access_key_id, aws_secret_access_key, region_name,
+        include_reserved=include_reserved, limit=limit, region_only=region_only,
+    )
+
+def get_spend_anomalies(days: int = 7):
+    """Find what spiked in spend recently.
+
+    days: how many complete days to look back over.
+    Returns the days on which a service and usage type cost well above its usual
+    spend for that day of the week, largest increase first.
+    """
+    return cost_queries.get_spend_anomalies(aws_access_key_id, aws_secret_access_key, region_name, days=days)
+
+# Results are memoised per conversation and across sessions, keyed by account
+aws_top_instances_tool = cached_tool(get_top_rds_ec2_costs, scope=aws_access_key_id)
+spend_anomalies_tool = cached_tool(get_spend_anomalies, scope=aws_access_key_id, sort_by="Increase")
+# Answers arbitrary spend questions from the local Cost and Usage Report
+cur_spend_tool = cached_tool(query_cur_spend)
 
 openai_api_key = st.secrets["OPENAI_API_KEY"]
-llm = OpenAI(model="gpt-3.5-turbo", temperature=0)
-agent = ReActAgent.from_tools([aws_top_instances_tool], llm=llm, verbose=True)
+
+
+@st.cache_resource(show_spinner=False)
+def load_agent():
+    # Built once per process; each session keeps its own memory
+    llm = OpenAI(model="gpt-3.5-turbo", temperature=0)
+    return build_agent([aws_top_instances_tool, spend_anomalies_tool, cur_spend_tool], llm)
+
+
+instrument_llama_index()
+agent = load_agent()
 
 
 def chat_interface():
@@ -101,15 +80,31 @@ def chat_interface():
         with st.chat_message(message["role"]):
             st.write(message["content"])
 
+    # The agent is shared, so each session keeps its own conversation memory
+    if "agent_memory" not in st.session_state.keys():
+        st.session_state.agent_memory = Memory.from_defaults()
+    if "tool_results" not in st.session_state.keys():
+        st.session_state.tool_results = {}
+
     # If last message is not from assistant, generate a new response
     if st.session_state.messages[-1]["role"] != "assistant":
         with st.chat_message("assistant"):
-            response_stream = agent.chat(prompt)
-            #st.write(response_stream.sources)
-            # below will return only the response, switch to this when bugs resolved.
-            st.write(response_stream.response)
-            message = {"role": "assistant", "content": response_stream.response}
+            # Reasoning and tool activity go in a status box while the answer streams below it
+            status = st.status("Thinking...")
+            reasoning = status.empty()
+            started = time.perf_counter()
+            with span("agent.answer"):
+                events = iter_agent_events(agent, prompt, memory=st.session_state.agent_memory,
+                                           tool_results=st.session_state.tool_results)
+                answers = answer_tokens(events, reasoning.markdown, status.write)
+                # Each update is the whole answer so far, so text from an earlier step is replaced
+                placeholder, response = st.empty(), ""
+                for response in time_to_first_token(answers, started, "agent.first_token"):
+                    placeholder.markdown(response)
+            status.update(label="Done", state="complete", expanded=False)
+            message = {"role": "assistant", "content": response}
             # Add response to message history
             st.session_state.messages.append(message)
 
 chat_interface()
+render_perf_panel()
@@ -1,46 +1,62 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.drawing.image import Image
-import io
+from finops.lazy import lazy_import
 
-def calculate_optimal_reservation(data, discount_rate):
-    # Calculate the total hours by counting the entries (assuming each entry represents one hour)
-    total_hours = len(data)
-    
-    # Calculate total costs for each purchase option
-    total_reserved_cost = data['Reserved($)'].sum()
-    total_ondemand_cost = data['On Demand($)'].sum()
-    total_unused_reserved_cost = data['Unused Reserved($)'].sum()
+# Only needed once a file is uploaded, so the page itself opens straight away
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+breakeven = lazy_import("finops.breakeven")
+usage_ingest = lazy_import("finops.usage_ingest")
 
-     # Calculate average hourly usage
-    average_ondemand_cost = total_ondemand_cost / total_hours
-    optimal_hourly_reservation = avg_ondemand_cost * (1 - float(discount_rate))
-    
-    return optimal_hourly_reservation
+def calculate_optimal_reservation(usage, discount_rate):
+    # Usage is in On-Demand dollars per hour, so the on-demand rate is 1 and a
+    # commitment of c covers c dollars of On-Demand usage for c * (1 - discount)
+    result = breakeven.breakeven(usage.to_numpy(), float(discount_rate), dtype=np.float32)
+    optimal_hourly_reservation = result.optimal_commitment * (1 - float(discount_rate))
+    summary = pd.DataFrame({
+        'Instance Type': usage.columns,
+        'Average On-Demand ($/hour)': usage.mean().to_numpy(),
+        'Optimal reservation ($/hour)': optimal_hourly_reservation,
+        'On-Demand cost ($)': result.on_demand_cost,
+        'Optimised cost ($)': result.optimal_cost,
+        'Saving ($)': result.savings,
+    })
+    return summary
+
+
+def savings_curve(usage, column, discount_rate):
+    # Full curve for a single instance type, so it stays small however many types there are
+    result = breakeven.breakeven(usage.iloc[:, column].to_numpy(), float(discount_rate), return_curves=True)
+    return pd.DataFrame({
+        'Reservation ($/hour)': result.levels[0] * (1 - float(discount_rate)),
+        'Saving ($)': result.savings_curve[0],
+    })
 
 
 # Show title and description.
 st.title("Rate Reduction Genie")
 st.write(
-    "Upload a file with 7-day hourly usage data by purchase option for a given instance type and the rate reduction genie will calculate the optimal amount of reservations to reduce total spend."
+    "Upload a file with hourly usage data by purchase option (optionally with an 'Instance Type' column), or a Cost and Usage Report extract, and the rate reduction genie will calculate the optimal amount of reservations to reduce total spend."
+    " Files can be gzip-compressed and are read in chunks, so large exports are fine."
     " AWS Pricing data for RDS instances and reservation discounts can be found at https://aws.amazon.com/rds/pricing/"
 )
 
 # File upload
-uploaded_file = st.file_uploader('Upload a file', type='csv')
+uploaded_file = st.file_uploader('Upload a file', type=['csv', 'gz'])
 
+usage = None
 if uploaded_file:
-# Load the CSV file
-    global data 
-    data = pd.read_csv(uploaded_file)
-    total_ondemand_cost = data['On Demand($)'].sum()
-    total_hours = len(data)
-    global avg_ondemand_cost
-    avg_ondemand_cost = total_ondemand_cost / total_hours
+    # Read the file in chunks into hourly On-Demand spend per instance type.
+    # This is done once per upload; reruns reuse the aggregated usage.
+    if st.session_state.get('usage_file_id') != uploaded_file.file_id:
+        progress_bar = st.progress(0.0, text='Reading usage file...')
+        try:
+            st.session_state.usage = usage_ingest.ingest_usage(uploaded_file, progress=progress_bar.progress)
+            st.session_state.usage_file_id = uploaded_file.file_id
+        except ValueError as e:
+            st.session_state.usage = None
+            st.error(str(e))
+        progress_bar.empty()
+    usage = st.session_state.usage
 
 # Discount Rate
 percentage_discount_rate = st.text_input('Enter the percentage discount:', placeholder = "Don't include the percentage symbol")
@@ -48,22 +64,25 @@ percentage_discount_rate = st.text_input('Enter the percentage discount:', place
 result = []
 with st.form('myform', clear_on_submit=True):
     submitted = st.form_submit_button('Submit', disabled=not(uploaded_file, percentage_discount_rate))
-    if submitted:
+    if submitted and usage is not None:
         percentage_discount_rate = float(percentage_discount_rate)
         discount_rate = percentage_discount_rate / 100
-        response = calculate_optimal_reservation(data, discount_rate)
-        result.append(response)
+        summary = calculate_optimal_reservation(usage, discount_rate)
+        result.append(summary)
 
 if len(result):
-    st.bar_chart(
-        data,
-        x = "Purchase option",
-        y = ["Reserved($)", "On Demand($)", "Unused Reserved($)"],
-        )
-    rounded_avg = round(avg_ondemand_cost, 2)
-    rounded_response = round(response, 2)
+    st.line_chart(usage.sum(axis=1).rename('On Demand($)'))
+    rounded_avg = round(summary['Average On-Demand ($/hour)'].sum(), 2)
+    rounded_response = round(summary['Optimal reservation ($/hour)'].sum(), 2)
     with st.chat_message("user"):
         st.write("Hello 👋")
         st.write("The average On-Demand usage for this period is $", rounded_avg, "/hour")
-        st.write("To replace this with a reservation, we make a reservation for an amount which is lower than the On-Demand amount by the discount rate")
+        st.write("The reservation is sized against every hour of usage, so hours below the commitment waste some of it and hours above it are billed On-Demand. The optimum is the level where the two balance out.")
         st.write("The optimal hourly reservation value is $", rounded_response, "/hour")
+    st.dataframe(summary.round(2))
+
+    # Savings against reservation level for the instance type with the biggest saving
+    column = int(summary['Saving ($)'].to_numpy().argmax())
+    st.write("Savings curve for", summary['Instance Type'][column])
+    curve = savings_curve(usage, column, discount_rate)
+    st.line_chart(curve, x='Reservation ($/hour)', y='Saving ($)')
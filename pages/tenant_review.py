@@ -1,7 +1,3 @@
 import streamlit as st
-import boto3
-import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime
 
 st.write("New Page!")
\ No newline at end of file
@@ -1,7 +1,16 @@
+import time
 import streamlit as st
-import openai
 from llama_index.llms.openai import OpenAI
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings
+from llama_index.core import Settings
+from llama_index.core.llms import ChatMessage
+from finops.answer_cache import SemanticAnswerCache, describe_sources, replay_stream
+from finops.conversation import MAX_DISPLAYED_MESSAGES, RollingMemory, is_standalone
+from finops.embeddings import get_embed_model
+from finops.index_store import load_or_build_index, manifest_version
+from finops.llm_tracing import instrument_llama_index
+from finops.perf_panel import render_perf_panel
+from finops.retrieval import build_chat_engine, load_or_build_keyword_index
+from finops.tracing import span, time_to_first_token
 
 openai_api_key = st.secrets["OPENAI_API_KEY"]
 
@@ -18,8 +27,6 @@ if "messages" not in st.session_state.keys():  # Initialise the chat messages hi
 
 @st.cache_resource(show_spinner=False)
 def load_data():
-    reader = SimpleDirectoryReader(input_dir="pages/data", recursive=True)
-    docs = reader.load_data()
     Settings.llm = OpenAI(
         model="gpt-3.5-turbo",
         temperature=0.2,
@@ -31,31 +38,80 @@ def load_data():
         your answers technical and based on 
         facts – do not hallucinate features. Write in British English. Use paragraphs and good sentence structure to make your output easy to read""",
     )
-    index = VectorStoreIndex.from_documents(docs)
-    return index
+    # OpenAI, a local CPU model or the hashing embedder, behind the embedding cache
+    Settings.embed_model = get_embed_model()
+    # Loads the index from storage/ and only re-embeds files that changed
+    index = load_or_build_index("pages/data")
+    # The BM25 side of hybrid retrieval, rebuilt only when the corpus changed
+    keyword_index = load_or_build_keyword_index(index)
+    return index, keyword_index
 
 
-index = load_data()
+@st.cache_resource(show_spinner=False)
+def load_answer_cache():
+    # Shared by every session in this process
+    return SemanticAnswerCache(Settings.embed_model)
+
+
+instrument_llama_index()
+index, keyword_index = load_data()
+answer_cache = load_answer_cache()
+answer_cache.ensure_version(manifest_version())
 
 if "chat_engine" not in st.session_state.keys():  # Initialise the chat engine
-    st.session_state.chat_engine = index.as_chat_engine(
-        chat_mode="condense_question", verbose=True, streaming=True
+    # Memory is kept separately so cached answers can be added to it as well.
+    # It holds a summary plus the last few turns, so it stays the same size
+    st.session_state.chat_memory = RollingMemory.from_defaults()
+    # Hybrid BM25 and vector retrieval, packed into a fixed token budget
+    st.session_state.chat_engine = build_chat_engine(
+        index, keyword_index, st.session_state.chat_memory, verbose=True,
     )
 
 if prompt := st.chat_input(
     "Ask a question"
 ):  # Prompt for user input and save to chat history
     st.session_state.messages.append({"role": "user", "content": prompt})
+    del st.session_state.messages[:-MAX_DISPLAYED_MESSAGES]
 
 for message in st.session_state.messages:  # Write message history to UI
     with st.chat_message(message["role"]):
         st.write(message["content"])
+        if message.get("sources"):
+            st.caption("Sources: " + ", ".join(message["sources"]))
 
 # If last message is not from assistant, generate a new response
 if st.session_state.messages[-1]["role"] != "assistant":
     with st.chat_message("assistant"):
-        response_stream = st.session_state.chat_engine.stream_chat(prompt)
-        st.write_stream(response_stream.response_gen)
-        message = {"role": "assistant", "content": response_stream.response}
+        # Follow-ups that depend on the history always go to the engine; questions
+        # that stand on their own skip the condense step and can use the cache
+        standalone = is_standalone(prompt, st.session_state.chat_memory.get_all())
+        answer = sources = vector = None
+        if standalone:
+            with span("chat.cache_lookup"):
+                answer, sources, vector = answer_cache.lookup(prompt)
+
+        if answer is not None:
+            st.write_stream(replay_stream(answer))
+            # Keep the engine's memory in step so follow-ups condense correctly,
+            # off the critical path as the answer may push older turns into the summary
+            st.session_state.chat_memory.put_later([
+                ChatMessage(role="user", content=prompt), ChatMessage(role="assistant", content=answer),
+            ])
+        else:
+            started = time.perf_counter()
+            with span("chat.answer"):
+                # Condense and retrieval happen here, generation while streaming
+                response_stream = st.session_state.chat_engine.stream_chat(prompt)
+                st.write_stream(time_to_first_token(response_stream.response_gen, started))
+            answer = response_stream.response
+            sources = describe_sources(response_stream.source_nodes)
+            if standalone:
+                answer_cache.store(prompt, answer, sources, vector)
+
+        if sources:
+            st.caption("Sources: " + ", ".join(sources))
+        message = {"role": "assistant", "content": answer, "sources": sources}
         # Add response to message history
-        st.session_state.messages.append(message)
\ No newline at end of file
+        st.session_state.messages.append(message)
+
+render_perf_panel()
\ No newline at end of file
@@ -0,0 +1,22 @@
+import pytest
+
+
+class Clock:
+    """Stands in for the time module; sleeping moves the clock on"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    """A Clock; test modules patch it over the ``time`` of the module they test"""
+    return Clock()
@@ -0,0 +1,113 @@
+import pandas as pd
+import pytest
+from botocore.exceptions import ClientError
+
+from finops import actions
+from finops.actions import TokenBucket, owner_notifications, send_notifications, tag_resources
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(actions, "time", clock)
+    return clock
+
+
+def test_bucket_allows_a_burst_then_the_rate(clock):
+    bucket = TokenBucket(rate=10, capacity=5)
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.slept == []
+    bucket.acquire(2)
+    assert sum(clock.slept) == pytest.approx(0.2)
+
+
+def test_bucket_refills_up_to_its_capacity(clock):
+    bucket = TokenBucket(rate=2)
+    bucket.acquire(2)
+    clock.now += 60
+    bucket.acquire(2)
+    assert clock.slept == []
+    bucket.acquire(1)
+    assert sum(clock.slept) == pytest.approx(0.5)
+
+
+def test_bucket_rejects_more_than_its_capacity(clock):
+    with pytest.raises(ValueError, match="bucket of 3"):
+        TokenBucket(rate=1, capacity=3).acquire(4)
+
+
+def scan_rows():
+    return pd.DataFrame({
+        "DB Instance": ["db-1", "db-2", "db-3", "db-4"],
+        "Account": ["111", "111", "222", "222"],
+        "Region": ["eu-west-2"] * 4,
+        "Creator Email": ["a@example.com", "a@example.com", "b@example.com", None],
+    })
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": "Denied"}}, "Operation")
+
+
+class FakeSES:
+    def __init__(self, statuses, errors=()):
+        self.statuses = list(statuses)  # status per destination, in send order
+        self.errors = list(errors)  # error (or None) raised by each call, in order
+        self.sent = []
+
+    def get_template(self, TemplateName):
+        return {"Template": dict(actions.TEMPLATE)}
+
+    def send_bulk_templated_email(self, Destinations, **kwargs):
+        error = self.errors.pop(0) if self.errors else None
+        if error:
+            raise error
+        self.sent.append([d["Destination"]["ToAddresses"][0] for d in Destinations])
+        return {"Status": [{"Status": self.statuses.pop(0)} for _ in Destinations]}
+
+
+def test_each_owner_gets_one_message_listing_their_instances():
+    owners = owner_notifications(scan_rows())
+    assert sorted(owners) == ["a@example.com", "b@example.com"]
+    assert owners["a@example.com"]["count"] == 2
+    assert [i["id"] for i in owners["a@example.com"]["instances"]] == ["db-1", "db-2"]
+
+
+def test_transient_failures_are_sent_again(clock):
+    ses = FakeSES(["Success", "TransientFailure", "Success"])
+    result = send_notifications(ses, scan_rows(), "finops@example.com", TokenBucket(rate=10))
+    assert ses.sent == [["a@example.com", "b@example.com"], ["b@example.com"]]
+    assert result == actions.ActionResult(2, 1, {})
+
+
+def test_a_rejected_batch_doesnt_stop_the_others(clock):
+    ses = FakeSES(["Success"], errors=[client_error("MessageRejected"), client_error("AccountThrottled"), None])
+    result = send_notifications(ses, scan_rows(), "finops@example.com", TokenBucket(rate=1))
+    assert ses.sent == [["b@example.com"]]
+    assert result == actions.ActionResult(1, 1, {"a@example.com": "MessageRejected: Denied"})
+
+
+class FakeFanOut:
+    def __init__(self, denied_accounts):
+        self.denied_accounts = denied_accounts
+        self.tagged = []
+
+    def client(self, target, service):
+        if target.account_id in self.denied_accounts:
+            raise client_error("AccessDenied")
+        return self
+
+    def tag_resources(self, ResourceARNList, Tags):
+        self.tagged += ResourceARNList
+        return {}
+
+
+def test_tagging_reports_a_failed_account_and_tags_the_rest():
+    instances = scan_rows().assign(
+        **{"DB Instance ARN": lambda df: "arn:" + df["DB Instance"], "Tagged for Deletion": False}
+    )
+    fanout = FakeFanOut({"222"})
+    result = tag_resources(fanout, instances)
+    assert sorted(fanout.tagged) == ["arn:db-1", "arn:db-2"]
+    assert result.done == 2 and result.skipped == 0
+    assert result.failed == {"arn:db-3": "AccessDenied: Denied", "arn:db-4": "AccessDenied: Denied"}
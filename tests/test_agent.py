@@ -0,0 +1,45 @@
+from llama_index.core.agent.workflow import AgentOutput, AgentStream, ToolCall
+from llama_index.core.llms import ChatMessage
+
+from finops.agent import answer_tokens
+
+
+def stream(*responses):
+    return [AgentStream(delta="", response=response, current_agent_name="agent") for response in responses]
+
+
+def run(events):
+    reasoning, tools = [], []
+    answers = list(answer_tokens(events, reasoning.append, tools.append))
+    return answers, reasoning, tools
+
+
+def test_answer_grows_token_by_token():
+    answers, reasoning, _ = run(stream("The", "The top", "The top cost"))
+    assert answers == ["The", "The top", "The top cost"]
+    assert reasoning == []
+
+
+def test_new_step_replaces_what_the_last_one_said():
+    events = (
+        stream("Let me", "Let me check")
+        + [ToolCall(tool_name="top_costs", tool_kwargs={}, tool_id="1")]
+        + stream("EC2", "EC2 costs most")
+    )
+    answers, reasoning, tools = run(events)
+    assert answers[-1] == "EC2 costs most"
+    assert reasoning == ["Let me check"]
+    assert tools == ["🔧 Calling `top_costs` "]
+
+
+def test_react_answer_is_split_from_its_thought():
+    answers, reasoning, _ = run(stream(
+        "Thought: I know", "Thought: I know\nAnswer: Nothing", "Thought: I know\nAnswer: Nothing ran",
+    ))
+    assert reasoning == ["Thought: I know"]
+    assert answers == ["Nothing", "Nothing ran"]
+
+
+def test_final_output_is_used_when_nothing_streamed():
+    output = AgentOutput(response=ChatMessage(role="assistant", content="Done"), current_agent_name="agent")
+    assert run([output])[0] == ["Done"]
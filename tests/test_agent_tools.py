@@ -0,0 +1,115 @@
+import json
+
+import pandas as pd
+import pytest
+
+from finops import agent_tools
+from finops.agent_tools import cached_tool, render_result, render_table, use_session_results
+
+
+def costs(rows):
+    return pd.DataFrame({
+        "Service": ["EC2"] * rows,
+        "Instance Type": [f"m5.{size}xlarge" for size in range(rows)],
+        "Cost": [float(cost) for cost in range(rows, 0, -1)],
+    })
+
+
+def test_small_table_is_rendered_whole_with_its_total():
+    text = render_table(costs(3))
+    lines = text.splitlines()
+    assert lines[0] == "Service: EC2"
+    assert lines[1] == "Instance Type | Cost"
+    assert lines[2] == "m5.0xlarge | 3.00"
+    assert lines[-1] == "(total 6.00)"
+
+
+def test_cut_table_has_a_footer_with_the_rest_of_the_total():
+    df = costs(200)
+    text = render_table(df, max_tokens=100)
+    footer = text.splitlines()[-1]
+    shown = len(text.splitlines()) - 3  # constant column, header and footer
+    assert 0 < shown < 200
+    rest = df["Cost"].iloc[shown:].sum()
+    assert footer == f"({shown} of 200 rows shown; the other {200 - shown} total {rest:,.2f})"
+
+
+def test_rows_are_ranked_by_the_sort_column():
+    df = pd.DataFrame({"Name": ["a", "b", "c"], "Increase": [1.0, 9.0, 5.0]})
+    lines = render_table(df, sort_by="Increase").splitlines()
+    assert lines[1:4] == ["b | 9.00", "c | 5.00", "a | 1.00"]
+
+
+def test_error_results_are_not_cached():
+    with pytest.raises(agent_tools._Uncached, match="No credentials"):
+        render_result((None, "No credentials provided."))
+
+
+def test_credentials_are_hashed_out_of_cache_keys(monkeypatch):
+    monkeypatch.setattr(agent_tools, "_shared_results", agent_tools.TTLCache())
+    calls = []
+
+    def top_costs(aws_access_key_id: str, aws_secret_access_key: str, limit: int = 10):
+        """Top costs"""
+        calls.append(aws_secret_access_key)
+        return costs(2).head(limit)
+
+    tool = cached_tool(top_costs, scope="AKIA-SCOPE")
+    tool.call("AKIA1", "very-secret", limit=2)
+    tool.call("AKIA1", "very-secret", 2)
+    tool.call("AKIA1", "other-secret", 2)
+    assert calls == ["very-secret", "other-secret"]
+    keys = [repr(key) for key in agent_tools._shared_results._entries]
+    assert len(keys) == 2
+    assert not any("very-secret" in key or "AKIA" in key for key in keys)
+
+
+def test_session_results_are_reused_until_they_expire(monkeypatch):
+    monkeypatch.setattr(agent_tools, "_shared_results", agent_tools.TTLCache())
+    calls = []
+
+    def top_costs(limit: int = 10):
+        """Top costs"""
+        calls.append(limit)
+        return costs(2)
+
+    tool = cached_tool(top_costs)
+    session = {}
+    use_session_results(session)
+    try:
+        first = tool.call()
+        agent_tools._shared_results.invalidate()
+        assert tool.call(limit=10).content == first.content
+        assert calls == [10]
+
+        key = next(iter(session))
+        stored_at, generation, text = session[key]
+        session[key] = (stored_at - agent_tools.TOOL_RESULT_TTL, generation, text)
+        tool.call()
+        assert calls == [10, 10]
+
+        agent_tools.invalidate_tool_results()
+        tool.call()
+        assert calls == [10, 10, 10]
+    finally:
+        use_session_results(None)
+    assert len(session) == 1
+
+
+def test_session_keeps_only_the_latest_results(monkeypatch):
+    monkeypatch.setattr(agent_tools, "_shared_results", agent_tools.TTLCache())
+    monkeypatch.setattr(agent_tools, "MAX_SESSION_RESULTS", 3)
+
+    def top_costs(limit: int = 10):
+        """Top costs"""
+        return costs(limit)
+
+    tool = cached_tool(top_costs)
+    session = {}
+    use_session_results(session)
+    try:
+        for limit in range(1, 6):
+            tool.call(limit=limit)
+    finally:
+        use_session_results(None)
+    assert [json.loads(key[2])["limit"] for key in session] == [3, 4, 5]
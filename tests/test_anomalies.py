@@ -0,0 +1,62 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from finops.anomalies import SCORED_DAYS, WINDOW, detect_anomalies, score_matrix, to_matrix
+
+
+def daily_costs(services, days, first=date(2026, 1, 1)):
+    return pd.DataFrame([
+        {"service": service, "date": first + timedelta(days=day), "cost": cost}
+        for service, cost in services.items()
+        for day in range(days)
+    ])
+
+
+def test_days_without_rows_count_as_zero():
+    costs = daily_costs({"EC2": 5.0}, 3).drop(index=1)
+    series, dates, matrix = to_matrix(costs, ["service"])
+    assert list(series["service"]) == ["EC2"]
+    assert len(dates) == 3
+    assert matrix.tolist() == [[5.0, 0.0, 5.0]]
+
+
+def test_short_history_finds_no_anomalies():
+    costs = daily_costs({"EC2": 100.0, "RDS": 40.0, "S3": 3.0}, 10)
+    found = detect_anomalies(costs, ["service"])
+    assert found.empty
+    assert list(found.columns) == ["service", "date", "cost", "expected", "increase", "z_score"]
+
+
+def test_short_history_cannot_be_scored():
+    with pytest.raises(ValueError, match="days of history"):
+        score_matrix(np.ones((2, WINDOW + SCORED_DAYS - 1)))
+
+
+def test_spike_is_found_and_flat_series_are_not():
+    days = WINDOW + SCORED_DAYS
+    costs = daily_costs({"EC2": 100.0, "RDS": 40.0}, days)
+    spike = (costs["service"] == "EC2") & (costs["date"] == date(2026, 1, 1) + timedelta(days=days - 2))
+    costs.loc[spike, "cost"] = 400.0
+    found = detect_anomalies(costs, ["service"])
+    assert len(found) == 1
+    assert found.loc[0, "service"] == "EC2"
+    assert found.loc[0, "date"] == date(2026, 1, 1) + timedelta(days=days - 2)
+    assert found.loc[0, "increase"] == pytest.approx(300.0)
+
+
+def test_weekly_pattern_is_not_an_anomaly():
+    days = WINDOW + SCORED_DAYS
+    first = date(2026, 1, 5)  # a Monday
+    costs = pd.DataFrame([
+        {"service": "EC2", "date": first + timedelta(days=day), "cost": 20.0 if day % 7 >= 5 else 100.0}
+        for day in range(days)
+    ])
+    assert detect_anomalies(costs, ["service"]).empty
+
+
+def test_window_must_be_whole_weeks():
+    with pytest.raises(ValueError, match="whole number of weeks"):
+        score_matrix(np.ones((1, 40)), window=10, days=3)
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from finops.breakeven import breakeven
+
+
+def brute_force(usage, discount_rate, on_demand_rate=1.0):
+    """Cost of committing to each observed level, searched one by one"""
+    reserved_rate = on_demand_rate * (1 - discount_rate)
+    levels = np.concatenate([[0.0], np.sort(usage)])
+    costs = [len(usage) * c * reserved_rate + on_demand_rate * np.maximum(usage - c, 0).sum() for c in levels]
+    return levels[int(np.argmin(costs))], min(costs)
+
+
+def test_optimum_is_the_discount_quantile_of_usage():
+    usage = np.arange(1.0, 11.0)  # 10 hours using 1 to 10 units
+    result = breakeven(usage, 0.3)
+    # Committing past the 3rd lowest hour costs more than it saves
+    assert result.optimal_commitment[0] == 3.0
+    assert result.optimal_cost[0] == pytest.approx(brute_force(usage, 0.3)[1])
+    assert result.on_demand_cost[0] == pytest.approx(55.0)
+    assert result.savings[0] == pytest.approx(55.0 - result.optimal_cost[0])
+
+
+def test_matches_a_brute_force_search_for_every_column():
+    rng = np.random.default_rng(1)
+    usage = rng.gamma(2.0, 3.0, (200, 6))
+    discounts = np.array([0.0, 0.1, 0.35, 0.5, 0.72, 1.0])
+    rates = np.array([1.0, 0.5, 2.0, 1.0, 3.0, 1.0])
+    result = breakeven(usage, discounts, rates, chunk_columns=4)
+    for column in range(usage.shape[1]):
+        _, cost = brute_force(usage[:, column], discounts[column], rates[column])
+        assert result.optimal_cost[column] == pytest.approx(cost)
+
+
+def test_curves_agree_with_the_partial_sort():
+    rng = np.random.default_rng(2)
+    usage = rng.gamma(2.0, 3.0, (96, 5))
+    quick = breakeven(usage, 0.4)
+    full = breakeven(usage, 0.4, return_curves=True)
+    assert quick.levels is None and quick.savings_curve is None
+    np.testing.assert_allclose(full.optimal_commitment, quick.optimal_commitment)
+    np.testing.assert_allclose(full.optimal_cost, quick.optimal_cost)
+    assert full.savings_curve.shape == (5, 97)
+    np.testing.assert_allclose(full.savings_curve.max(axis=1), full.savings)
+
+
+def test_missing_hours_count_as_no_usage():
+    result = breakeven([np.nan, 4.0, 4.0, 4.0], 0.5)
+    assert result.on_demand_cost[0] == pytest.approx(12.0)
+    assert result.optimal_commitment[0] == 4.0
+
+
+def test_no_columns_gives_empty_results():
+    for usage in (np.zeros((10, 0)), np.zeros((0, 0))):
+        for return_curves in (False, True):
+            result = breakeven(usage, 0.3, return_curves=return_curves)
+            assert result.optimal_commitment.shape == (0,)
+            assert result.savings.shape == (0,)
+            if return_curves:
+                assert result.levels.shape == (0, usage.shape[0] + 1)
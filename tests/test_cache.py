@@ -0,0 +1,76 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from finops import cache
+from finops.cache import TTLCache
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+
+def test_entries_expire_after_the_ttl(clock):
+    results = TTLCache(ttl=60)
+    results.set("key", 1)
+    clock.now += 59
+    assert results.get("key") == 1
+    clock.now += 2
+    assert results.get("key") is None
+    assert len(results) == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    results = TTLCache(maxsize=2)
+    results.set("a", 1)
+    results.set("b", 2)
+    results.get("a")
+    results.set("c", 3)
+    assert results.get("b") is None
+    assert (results.get("a"), results.get("c")) == (1, 3)
+
+
+def test_invalidate_one_key_or_all(clock):
+    results = TTLCache()
+    results.set("a", 1)
+    results.set("b", 2)
+    results.invalidate("a")
+    assert results.get("a") is None and results.get("b") == 2
+    results.invalidate()
+    assert len(results) == 0
+
+
+def test_concurrent_misses_are_computed_once():
+    results = TTLCache()
+    started = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return "value"
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        first = executor.submit(results.get_or_compute, "key", compute)
+        started.wait(5)
+        others = [executor.submit(results.get_or_compute, "key", compute) for _ in range(7)]
+        values = [future.result() for future in [first] + others]
+    assert values == ["value"] * 8
+    assert calls == [1]
+    assert results.hits + results.misses == 8
+
+
+def test_a_failed_compute_is_not_cached():
+    results = TTLCache()
+
+    def fail():
+        raise RuntimeError("throttled")
+
+    with pytest.raises(RuntimeError):
+        results.get_or_compute("key", fail)
+    assert results.get_or_compute("key", lambda: "value") == "value"
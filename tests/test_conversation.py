@@ -0,0 +1,71 @@
+import threading
+from types import SimpleNamespace
+
+from llama_index.core.llms import ChatMessage
+
+from finops.conversation import RollingMemory, is_standalone
+
+
+class SlowLLM:
+    def __init__(self):
+        self.release = threading.Event()
+        self.prompts = []
+
+    def complete(self, prompt):
+        self.release.wait(10)
+        self.prompts.append(prompt)
+        return SimpleNamespace(text="They discussed reserved instances.")
+
+
+def turn(question, answer):
+    return [ChatMessage(role="user", content=question), ChatMessage(role="assistant", content=answer)]
+
+
+def test_standalone_questions_skip_the_history():
+    history = turn("What is a savings plan?", "A commitment to spend.")
+    assert is_standalone("What is a savings plan?", [])
+    assert is_standalone("How are reserved instances billed monthly?", history)
+    assert not is_standalone("And for RDS?", history)
+    assert not is_standalone("How much does it cost?", history)
+
+
+def test_old_turns_are_folded_into_the_summary():
+    llm = SlowLLM()
+    llm.release.set()
+    memory = RollingMemory.from_defaults(llm=llm, max_turns=2)
+    for number in range(5):
+        for message in turn(f"Question {number}", f"Answer {number}"):
+            memory.put(message)
+    assert memory.summary == "They discussed reserved instances."
+    assert len(memory.get_all()) <= 4
+    assert memory.get()[0].content.startswith("Earlier in the conversation")
+
+
+def test_put_later_returns_before_the_summary_call():
+    llm = SlowLLM()
+    memory = RollingMemory.from_defaults(llm=llm, max_turns=1)
+    for message in turn("Question 0", "Answer 0"):
+        memory.put(message)
+    thread = memory.put_later(turn("Question 1", "Answer 1"))
+    assert thread.is_alive()
+    # The new turn is there at once, and reading doesn't wait for the summary
+    assert [m.content for m in memory.get_all()] == ["Question 0", "Answer 0", "Question 1", "Answer 1"]
+    assert len(memory.get()) == 4
+    llm.release.set()
+    memory.flush(10)
+    assert not thread.is_alive()
+    assert [m.content for m in memory.get_all()] == ["Question 1", "Answer 1"]
+    assert memory.summary == "They discussed reserved instances."
+    assert "Question 0" in llm.prompts[0]
+
+
+def test_a_summary_of_turns_since_reset_is_dropped():
+    llm = SlowLLM()
+    memory = RollingMemory.from_defaults(llm=llm, max_turns=1)
+    memory.set(turn("Question 0", "Answer 0"))
+    memory.put_later(turn("Question 1", "Answer 1"))
+    memory.reset()
+    llm.release.set()
+    memory.flush(10)
+    assert memory.get_all() == []
+    assert memory.summary == ""
@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from finops.forecast import MIN_HISTORY, forecast_matrix, forecast_series, forecast_usage
+
+
+def daily_usage(families, days, first=date(2026, 1, 1)):
+    return pd.DataFrame([
+        {"Family": family, "date": first + timedelta(days=day), "cost": cost}
+        for family, cost in families.items()
+        for day in range(days)
+    ])
+
+
+def test_flat_weekly_series_commits_to_its_trough():
+    t = np.arange(70)
+    usage = np.where(t % 7 >= 5, 70.0, 100.0)
+    result = forecast_matrix(usage, 365)
+    assert result.commitment[0] == pytest.approx(70.0)
+    assert result.trend[0] == pytest.approx(0.0, abs=1e-9)
+
+
+def test_commitment_is_never_negative():
+    rng = np.random.default_rng(0)
+    usage = rng.gamma(1.0, 1.0, (5, 60))
+    result = forecast_matrix(usage, 3 * 365)
+    assert (result.commitment >= 0).all()
+    assert (result.lower <= result.mean).all() and (result.mean <= result.upper).all()
+
+
+def test_short_history_is_rejected():
+    with pytest.raises(ValueError, match="at least"):
+        forecast_matrix(np.ones(MIN_HISTORY - 1), 365)
+    with pytest.raises(ValueError):
+        forecast_usage(daily_usage({"m5": 10.0}, 5), ["Family"], 365)
+
+
+def test_recent_series_is_padded_over_the_full_range():
+    first = date(2026, 1, 1)
+    daily = pd.Series([24.0] * 5, index=[first + timedelta(days=25 + day) for day in range(5)])
+    chart = forecast_series(daily, 365, start=first, end=first + timedelta(days=29))
+    assert chart["History"].notna().sum() == 30
+    assert chart["History"].iloc[0] == 0
+    assert chart["Forecast"].notna().sum() == 365
+
+
+def test_forecast_usage_ranks_by_commitment():
+    forecasts = forecast_usage(daily_usage({"m5": 48.0, "r5": 240.0}, 28), ["Family"], 365)
+    assert list(forecasts["Family"]) == ["r5", "m5"]
+    assert forecasts["Baseline commitment ($/hour)"].iloc[0] == pytest.approx(10.0)
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+from llama_index.core import Settings
+
+from finops import index_store
+from finops.embeddings import HashEmbedding
+from finops.index_store import (
+    corpus_changed,
+    diff_corpus,
+    load_manifest,
+    load_or_build_index,
+    manifest_version,
+    scan_corpus,
+)
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.setattr(Settings, "_embed_model", HashEmbedding())
+    data_dir = tmp_path / "data"
+    write(str(data_dir / "a.txt"), "Reserved instances trade commitment for a discount.")
+    write(str(data_dir / "b.txt"), "Savings plans cover compute spend across families.")
+    write(str(data_dir / ".hidden"), "Not part of the corpus.")
+    return str(data_dir), str(tmp_path / "storage")
+
+
+def test_diff_finds_added_changed_and_removed_files():
+    manifest = {"same.txt": {"hash": "1"}, "changed.txt": {"hash": "2"}, "removed.txt": {"hash": "3"}}
+    current = {"same.txt": {"hash": "1"}, "changed.txt": {"hash": "9"}, "added.txt": {"hash": "4"}}
+    assert diff_corpus(current, manifest) == (["added.txt", "changed.txt"], ["removed.txt"])
+
+
+def test_unchanged_files_are_not_hashed_again(corpus, monkeypatch):
+    data_dir, _ = corpus
+    manifest = scan_corpus(data_dir)
+    assert sorted(manifest) == ["a.txt", "b.txt"]
+    monkeypatch.setattr(index_store, "file_hash", lambda path: pytest.fail(f"{path} was hashed"))
+    assert scan_corpus(data_dir, manifest) == manifest
+
+
+def test_index_follows_added_changed_and_deleted_files(corpus):
+    data_dir, persist_dir = corpus
+    index = load_or_build_index(data_dir, persist_dir, workers=1)
+    first = load_manifest(persist_dir)
+    assert sorted(first) == ["a.txt", "b.txt"]
+    assert set(index.ref_doc_info) == {doc_id for entry in first.values() for doc_id in entry["doc_ids"]}
+    version = manifest_version(persist_dir)
+    assert not corpus_changed(data_dir, persist_dir)
+
+    write(os.path.join(data_dir, "a.txt"), "Reserved instances are billed every hour of the term.")
+    os.remove(os.path.join(data_dir, "b.txt"))
+    write(os.path.join(data_dir, "c.txt"), "Spot instances can be interrupted.")
+    assert corpus_changed(data_dir, persist_dir)
+
+    index = load_or_build_index(data_dir, persist_dir, workers=1)
+    second = load_manifest(persist_dir)
+    assert sorted(second) == ["a.txt", "c.txt"]
+    assert second["a.txt"]["hash"] != first["a.txt"]["hash"]
+    assert set(index.ref_doc_info) == {doc_id for entry in second.values() for doc_id in entry["doc_ids"]}
+    texts = " ".join(node.get_content() for node in index.docstore.docs.values())
+    assert "billed every hour" in texts and "Savings plans" not in texts
+    assert manifest_version(persist_dir) != version
+
+
+def test_unchanged_corpus_is_loaded_without_parsing(corpus, monkeypatch):
+    data_dir, persist_dir = corpus
+    load_or_build_index(data_dir, persist_dir, workers=1)
+    monkeypatch.setattr(index_store, "parse_files", lambda *args: pytest.fail("files were parsed"))
+    index = load_or_build_index(data_dir, persist_dir, workers=1)
+    assert len(index.ref_doc_info) == 2
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+
+import pandas as pd
+
+from finops import jobs
+from finops.snapshots import latest_snapshot
+
+
+def add_job(monkeypatch, run):
+    monkeypatch.setitem(jobs.JOBS, "test_job", jobs.Job("test_job", run, 3600, "A job for the tests"))
+    monkeypatch.setattr(jobs, "_failures", {})
+
+
+def wait(name):
+    jobs._threads[name].join(timeout=10)
+
+
+def test_run_job_saves_a_snapshot_and_releases_its_lock(monkeypatch, tmp_path):
+    calls = []
+
+    def run(settings, force=False):
+        calls.append(force)
+        return pd.DataFrame({"cost": [1.0]}), []
+
+    add_job(monkeypatch, run)
+    assert jobs.run_job("test_job", {}, tmp_path, force=True)
+    assert calls == [True]
+    assert latest_snapshot("test_job", tmp_path).data["cost"].tolist() == [1.0]
+    assert not jobs.is_running("test_job", tmp_path)
+
+
+def test_a_held_lock_blocks_the_job_until_it_goes_stale(monkeypatch, tmp_path):
+    add_job(monkeypatch, lambda settings, force=False: (pd.DataFrame({"cost": [1.0]}), []))
+    lock = jobs._lock_path("test_job", tmp_path)
+    os.makedirs(os.path.dirname(lock))
+    open(lock, "w").close()
+    assert jobs.is_running("test_job", tmp_path)
+    assert jobs.run_job("test_job", {}, tmp_path) is None
+
+    stale = time.time() - jobs.LOCK_TIMEOUT - 1
+    os.utime(lock, (stale, stale))
+    assert not jobs.is_running("test_job", tmp_path)
+    assert jobs.run_job("test_job", {}, tmp_path)
+
+
+def test_a_running_job_keeps_its_lock_fresh(monkeypatch, tmp_path):
+    monkeypatch.setattr(jobs, "LOCK_HEARTBEAT", 0.01)
+    ages = []
+
+    def run(settings, force=False):
+        lock = jobs._lock_path("test_job", tmp_path)
+        stale = time.time() - jobs.LOCK_TIMEOUT - 1
+        os.utime(lock, (stale, stale))
+        time.sleep(0.2)
+        ages.append(time.time() - os.path.getmtime(lock))
+        return pd.DataFrame({"cost": [1.0]}), []
+
+    add_job(monkeypatch, run)
+    assert jobs.run_job("test_job", {}, tmp_path)
+    assert ages[0] < jobs.LOCK_TIMEOUT
+
+
+def test_a_failed_job_is_not_restarted_until_the_retry_interval(monkeypatch, tmp_path):
+    runs = []
+
+    def run(settings, force=False):
+        runs.append(force)
+        raise RuntimeError("no access")
+
+    add_job(monkeypatch, run)
+    assert jobs.start_job("test_job", {}, tmp_path)
+    wait("test_job")
+    assert jobs.last_failure("test_job") == "RuntimeError: no access"
+
+    assert not jobs.start_job("test_job", {}, tmp_path)
+    assert jobs.start_job("test_job", {}, tmp_path, force=True)
+    wait("test_job")
+    assert runs == [False, True]
+
+    failed_at, message = jobs._failures["test_job"]
+    jobs._failures["test_job"] = (failed_at - jobs.RETRY_INTERVAL, message)
+    assert jobs.start_job("test_job", {}, tmp_path)
+    wait("test_job")
+    assert runs == [False, True, False]
+
+
+def test_a_started_job_is_active_before_it_takes_its_lock(monkeypatch, tmp_path):
+    release = threading.Event()
+
+    def run(settings, force=False):
+        release.wait(10)
+        return pd.DataFrame({"cost": [1.0]}), []
+
+    acquire = jobs._acquire
+
+    def slow_acquire(name, root):
+        release.wait(10)
+        return acquire(name, root)
+
+    add_job(monkeypatch, run)
+    monkeypatch.setattr(jobs, "_acquire", slow_acquire)
+    assert jobs.start_job("test_job", {}, tmp_path)
+    assert jobs.is_active("test_job", tmp_path)
+    assert not jobs.is_running("test_job", tmp_path)
+    release.set()
+    wait("test_job")
+    assert not jobs.is_active("test_job", tmp_path)
+
+
+def test_breaking_a_stale_lock_keeps_a_lock_taken_meanwhile(tmp_path):
+    lock = jobs._lock_path("test_job", tmp_path)
+    os.makedirs(os.path.dirname(lock))
+    with open(lock, "w") as f:
+        f.write("1 dead")
+    stale = time.time() - jobs.LOCK_TIMEOUT - 1
+    os.utime(lock, (stale, stale))
+
+    # Another process saw the same stale lock, broke it and took its own
+    token = jobs._acquire("test_job", tmp_path)
+    assert token is not None
+    jobs._break_stale(lock, "1 dead")
+    assert jobs._read_lock(lock) == token
+    assert os.listdir(os.path.dirname(lock)) == [".lock"]
+
+    jobs._release(lock, "1 dead")
+    assert os.path.exists(lock)
+    jobs._release(lock, token)
+    assert not os.path.exists(lock)
+
+
+def test_the_scan_role_is_only_assumed_into_listed_accounts(monkeypatch):
+    monkeypatch.setattr(jobs.FanOut, "home_account", lambda self: "111111111111")
+    settings = {
+        "AWS_ACCESS_KEY_ID": "AKIA1", "AWS_SECRET_ACCESS_KEY": "secret",
+        "REGION_NAME": "eu-west-2", "SCAN_ROLE_NAME": "FinOpsScan",
+    }
+    fanout, targets = jobs.scan_fanout(settings)
+    assert [target.account_id for target in targets] == ["111111111111"]
+    assert fanout.credentials("111111111111") == fanout.base_credentials
+
+    fanout, targets = jobs.scan_fanout({**settings, "SCAN_ACCOUNTS": ["222222222222"]})
+    assert [target.account_id for target in targets] == ["222222222222"]
+    assert fanout.role_name == "FinOpsScan"
@@ -0,0 +1,29 @@
+from finops import pricing
+
+
+def test_a_failed_refresh_is_not_retried_until_the_retry_interval(monkeypatch, tmp_path):
+    attempts = []
+
+    def refresh_index(path, regions):
+        attempts.append(regions)
+        raise OSError("offline")
+
+    monkeypatch.setattr(pricing, "refresh_index", refresh_index)
+    monkeypatch.setattr(pricing, "_index", None)
+    monkeypatch.setattr(pricing, "_refresh_thread", None)
+    monkeypatch.setattr(pricing, "_refresh_failed_at", 0.0)
+    path = str(tmp_path / "pricing_index.json")
+
+    def lookup():
+        index = pricing.get_pricing_index(path)
+        if pricing._refresh_thread is not None:
+            pricing._refresh_thread.join(timeout=10)
+        return index
+
+    assert lookup().built_at == 0.0
+    assert lookup().built_at == 0.0
+    assert len(attempts) == 1
+
+    monkeypatch.setattr(pricing, "_refresh_failed_at", pricing._refresh_failed_at - pricing.RETRY_INTERVAL)
+    lookup()
+    assert len(attempts) == 2
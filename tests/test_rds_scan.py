@@ -0,0 +1,70 @@
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+from finops.rds_scan import AdaptiveBackoff, call_with_backoff, scan_inactive_instances
+
+
+class FakeRDS:
+    def __init__(self, pages, metrics_called):
+        self.pages = pages
+        self.metrics_called = metrics_called
+        self.listed = 0
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self):
+        for number, page in enumerate(self.pages):
+            if number == 2:
+                # Listing is slow enough for the first batch to finish meanwhile
+                self.metrics_called.wait(5)
+                time.sleep(0.2)
+            self.listed += 1
+            yield {"DBInstances": [{"DBInstanceIdentifier": name} for name in page]}
+
+
+class FakeCloudWatch:
+    def __init__(self, busy):
+        self.busy = busy
+        self.batches = []
+        self.called = threading.Event()
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime):
+        self.called.set()
+        names = [query["MetricStat"]["Metric"]["Dimensions"][0]["Value"] for query in MetricDataQueries]
+        self.batches.append(len(names))
+        return {"MetricDataResults": [
+            {"Id": query["Id"], "Values": [3.0] if name in self.busy else []}
+            for query, name in zip(MetricDataQueries, names)
+        ]}
+
+
+def test_batches_are_scanned_while_instances_are_listed():
+    names = [f"db-{number}" for number in range(900)]
+    busy = set(names[::2])
+    cloudwatch = FakeCloudWatch(busy)
+    rds = FakeRDS([names[:500], names[500:600], names[600:700], names[700:]], cloudwatch.called)
+    inactive, listed = [], []
+    for batch in scan_inactive_instances(rds, cloudwatch, batch_size=500):
+        listed.append(rds.listed)
+        inactive += [instance["DBInstanceIdentifier"] for instance in batch]
+    assert listed[0] < len(rds.pages)
+    assert sorted(cloudwatch.batches) == [400, 500]
+    assert sorted(inactive) == sorted(set(names) - busy)
+
+
+def test_throttled_calls_are_retried():
+    backoff = AdaptiveBackoff(base=0.001)
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ClientError({"Error": {"Code": "Throttling"}}, "GetMetricData")
+        return "ok"
+
+    assert call_with_backoff(call, backoff) == "ok"
+    assert len(attempts) == 3
+    assert backoff.delay < 0.004
@@ -0,0 +1,92 @@
+import math
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from finops.index_store import save_manifest
+from finops.llm_tracing import count_tokens
+from finops.retrieval import KeywordIndex, TokenBudget, load_or_build_keyword_index, tokenize
+
+TEXTS = [
+    "Reserved instances give a discount for a one or three year term.",
+    "Savings plans give a discount on compute spend.",
+    "Spot instances use spare capacity at a discount and can be interrupted. Spot spot spot.",
+]
+
+
+def nodes():
+    return [TextNode(id_=f"n{i}", text=text) for i, text in enumerate(TEXTS)]
+
+
+def bm25(query, texts, k1=1.5, b=0.75):
+    """Okapi BM25 written out term by term"""
+    docs = [tokenize(text) for text in texts]
+    average = sum(map(len, docs)) / len(docs)
+    scores = []
+    for doc in docs:
+        score = 0.0
+        for term in set(tokenize(query)):
+            containing = sum(term in other for other in docs)
+            if not containing:
+                continue
+            idf = math.log(1 + (len(docs) - containing + 0.5) / (containing + 0.5))
+            frequency = doc.count(term)
+            score += idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * len(doc) / average))
+        scores.append(score)
+    return scores
+
+
+def test_tokenize_keeps_instance_types_and_drops_stopwords():
+    assert tokenize("What is the price of an m5.large in eu-west-2?") == ["price", "m5.large", "eu-west-2"]
+
+
+def test_scores_match_okapi_bm25():
+    keywords = KeywordIndex.build(nodes())
+    for query in ("spot discount", "reserved term", "compute savings plans", "nothing matches"):
+        np.testing.assert_allclose(keywords.scores(query), bm25(query, TEXTS), rtol=1e-5)
+    scores = keywords.scores("spot interrupted")
+    assert scores.argmax() == 2 and scores[0] == scores[1] == 0
+
+
+def test_rare_terms_outweigh_common_ones():
+    scores = KeywordIndex.build(nodes()).scores("discount compute")
+    assert scores[1] > scores[0] > 0
+
+
+def test_saved_index_loads_with_the_same_scores(tmp_path):
+    keywords = KeywordIndex.build(nodes(), version="v1")
+    path = str(tmp_path / "bm25.json")
+    keywords.save(path)
+    loaded = KeywordIndex.load(path)
+    assert loaded.version == "v1" and loaded.node_ids == keywords.node_ids
+    np.testing.assert_allclose(loaded.scores("spot discount"), keywords.scores("spot discount"))
+
+
+def test_keyword_index_is_rebuilt_when_the_corpus_changes(tmp_path):
+    persist_dir = str(tmp_path)
+    index = SimpleNamespace(docstore=SimpleNamespace(docs={node.node_id: node for node in nodes()}))
+    first = load_or_build_keyword_index(index, persist_dir)
+    assert len(first.node_ids) == 3
+
+    index.docstore.docs.pop("n2")
+    assert len(load_or_build_keyword_index(index, persist_dir).node_ids) == 3  # loaded, corpus unchanged
+    save_manifest({"a.txt": {"hash": "new"}}, persist_dir)
+    rebuilt = load_or_build_keyword_index(index, persist_dir)
+    assert rebuilt.node_ids == ["n0", "n1"] and rebuilt.version != first.version
+
+
+def test_token_budget_packs_ranked_chunks_and_cuts_the_last():
+    long_text = " ".join(["reservation"] * 400)
+    ranked = [NodeWithScore(node=TextNode(id_=f"n{i}", text=long_text), score=1.0 - i / 10) for i in range(3)]
+    tokens = count_tokens(long_text)
+    packed = TokenBudget(max_tokens=tokens + 100).postprocess_nodes(ranked)
+    assert [item.node.node_id for item in packed] == ["n0", "n1"]
+    assert count_tokens(packed[1].node.get_content()) <= 100
+    assert len(TokenBudget(max_tokens=tokens + 10).postprocess_nodes(ranked)) == 1
+
+
+@pytest.mark.parametrize("query", ["", "the and of"])
+def test_empty_queries_score_nothing(query):
+    assert not KeywordIndex.build(nodes()).scores(query).any()
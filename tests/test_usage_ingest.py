@@ -0,0 +1,55 @@
+import io
+
+import pytest
+
+from finops.usage_ingest import SINGLE_SKU, ingest_usage
+
+
+def upload(text, name="usage.csv"):
+    data = io.BytesIO(text.encode())
+    data.name = name
+    data.size = len(text)
+    return data
+
+
+def test_cur_rows_are_summed_per_utc_hour_and_instance_type():
+    text = "\n".join([
+        "lineItem/UsageStartDate,product/instanceType,lineItem/UnblendedCost,pricing/term",
+        "2026-01-01T00:10:00Z,m5.large,1.0,OnDemand",
+        "2026-01-01T00:40:00Z,m5.large,2.0,OnDemand",
+        "2026-01-01T01:00:00+01:00,r5.large,4.0,OnDemand",
+        "2026-01-01T00:00:00Z,r5.large,100.0,Reserved",
+        "2026-01-01T03:00:00Z,m5.large,8.0,OnDemand",
+    ])
+    usage = ingest_usage(upload(text), chunk_rows=2)
+    assert usage.index.dtype.kind == "M" and usage.index.tz is None
+    assert len(usage) == 4  # 02:00 had no usage but still counts
+    assert usage.loc["2026-01-01 00:00", "m5.large"] == pytest.approx(3.0)
+    assert usage.loc["2026-01-01 00:00", "r5.large"] == pytest.approx(4.0)
+    assert usage.loc["2026-01-01 02:00"].sum() == 0
+    assert usage.loc["2026-01-01 03:00", "m5.large"] == pytest.approx(8.0)
+
+
+def test_sample_rows_are_hours_of_their_sku_across_chunks():
+    rows = [("m5.large", 1.0), ("r5.large", 10.0), ("m5.large", 2.0), ("m5.large", 3.0), ("r5.large", 20.0)]
+    text = "Instance Type,On Demand($)\n" + "\n".join(f"{sku},{cost}" for sku, cost in rows)
+    usage = ingest_usage(upload(text), chunk_rows=2)
+    assert usage["m5.large"].tolist() == [1.0, 2.0, 3.0]
+    assert usage["r5.large"].tolist() == [10.0, 20.0, 0.0]
+
+
+def test_single_series_sample_and_unknown_files():
+    usage = ingest_usage(upload("On Demand($)\n1.5\n2.5"))
+    assert usage[SINGLE_SKU].tolist() == [1.5, 2.5]
+    with pytest.raises(ValueError, match="Unrecognised file"):
+        ingest_usage(upload("a,b\n1,2"))
+
+
+@pytest.mark.parametrize("text", [
+    "lineItem/UsageStartDate,product/instanceType,lineItem/UnblendedCost,pricing/term",
+    "lineItem/UsageStartDate,product/instanceType,lineItem/UnblendedCost,pricing/term\n"
+    "2026-01-01T00:00:00Z,r5.large,100.0,Reserved",
+])
+def test_files_without_on_demand_usage_are_rejected(text):
+    with pytest.raises(ValueError, match="No On-Demand usage"):
+        ingest_usage(upload(text))
@@ -0,0 +1,26 @@
+from finops import warehouse
+
+
+class FakeSTS:
+    def __init__(self):
+        self.calls = 0
+
+    def get_caller_identity(self):
+        self.calls += 1
+        return {"Account": "123456789012"}
+
+
+def test_account_ids_are_cached_without_the_secret(monkeypatch):
+    sts = FakeSTS()
+    monkeypatch.setattr(warehouse, "get_client", lambda *args: sts)
+    monkeypatch.setattr(warehouse, "_account_ids", {})
+    assert warehouse.get_account_id("AKIA1", "very-secret") == "123456789012"
+    assert warehouse.get_account_id("AKIA1", "very-secret", "eu-west-2") == "123456789012"
+    assert sts.calls == 1
+    assert not any("very-secret" in repr(key) for key in warehouse._account_ids)
+
+    warehouse.get_account_id("AKIA1", "other-secret")
+    assert sts.calls == 2
+    warehouse.clear_account_ids()
+    warehouse.get_account_id("AKIA1", "very-secret")
+    assert sts.calls == 3